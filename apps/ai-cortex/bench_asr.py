@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark des moteurs ASR : vitesse, mémoire et précision sur des enregistrements de référence.
+
+Compare des modèles "moteur:nom" (whisper:small, faster-whisper:small...) sur un répertoire
+de fixtures : chaque enregistrement (<nom>.wav, .mp3, .m4a...) accompagné de sa transcription
+de référence (<nom>.txt). Chaque modèle tourne dans un sous-processus dédié (chargé via le
+registre, comme par /transcribe) pour isoler sa mémoire :
+- RTF (real-time factor) : temps de transcription / durée audio (< 1 : plus rapide que le
+  temps réel), chargement et décodage audio exclus,
+- RSS max : pic de mémoire résidente du sous-processus (modèle + inférence),
+- WER : erreurs mot (substitutions + insertions + suppressions) / mots de référence, sur le
+  texte normalisé (minuscules, sans ponctuation).
+
+Usage :
+    python bench_asr.py --fixtures fixtures/asr --language fr \\
+        --models whisper:small faster-whisper:small --threads 4
+"""
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+import unicodedata
+from pathlib import Path
+from typing import List, Tuple
+
+AUDIO_SUFFIXES = {".wav", ".flac", ".mp3", ".m4a", ".ogg", ".webm"}
+
+
+def fixtures(directory: str) -> List[Tuple[Path, str]]:
+    """Enregistrements ayant une référence <nom>.txt, triés par nom."""
+    pairs = []
+    for audio in sorted(Path(directory).iterdir()):
+        reference = audio.with_suffix(".txt")
+        if audio.suffix.lower() in AUDIO_SUFFIXES and reference.exists():
+            pairs.append((audio, reference.read_text(encoding="utf-8")))
+    return pairs
+
+
+def normalize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFC", text.lower())
+    # "l'otite" → "l otite" : apostrophes et tirets séparent les mots
+    return re.sub(r"[^\w\s]", " ", text).split()
+
+
+def word_errors(reference: List[str], hypothesis: List[str]) -> int:
+    """Distance d'édition en mots (Levenshtein)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+
+def worker(model_spec: str, directory: str, language: str) -> dict:
+    """Mesures d'un modèle (exécuté dans un sous-processus)."""
+    from services.audio_decode import decode_audio
+    from services.audio_stream import SAMPLE_RATE
+    from services.whisper_registry import get_whisper_registry
+
+    start = time.monotonic()
+    model = get_whisper_registry().get(model_spec)
+    load_seconds = time.monotonic() - start
+
+    rows = []
+    for audio, reference in fixtures(directory):
+        samples = decode_audio(str(audio))
+        start = time.monotonic()
+        result = model.transcribe(samples, language=language or None)
+        elapsed = time.monotonic() - start
+        ref_words = normalize(reference)
+        rows.append({
+            "file": audio.name,
+            "audio_s": len(samples) / SAMPLE_RATE,
+            "asr_s": elapsed,
+            "errors": word_errors(ref_words, normalize(result["text"])),
+            "words": len(ref_words),
+        })
+
+    audio_s = sum(r["audio_s"] for r in rows)
+    words = sum(r["words"] for r in rows)
+    return {
+        "model": model.key,
+        "load_s": load_seconds,
+        "audio_s": audio_s,
+        "asr_s": sum(r["asr_s"] for r in rows),
+        "rtf": sum(r["asr_s"] for r in rows) / audio_s if audio_s else 0.0,
+        # ru_maxrss : kilo-octets sous Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "wer": sum(r["errors"] for r in rows) / words if words else 0.0,
+        "files": rows,
+    }
+
+
+def run(model_spec: str, args: argparse.Namespace) -> dict:
+    env = dict(os.environ, WHISPER_PRELOAD="", WHISPER_TORCH_THREADS=str(args.threads), OMP_NUM_THREADS=str(args.threads))
+    cmd = [sys.executable, __file__, "--worker", model_spec, "--fixtures", args.fixtures, "--language", args.language]
+    process = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=Path(__file__).parent)
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        raise RuntimeError(f"{model_spec}: {error[-1] if error else 'échec'}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default="fixtures/asr", help="répertoire <nom>.wav + <nom>.txt")
+    parser.add_argument("--models", nargs="+", default=["whisper:small", "faster-whisper:small"])
+    parser.add_argument("--language", default="fr", help="vide : détection automatique")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="threads d'inférence")
+    parser.add_argument("--json", help="écrit aussi les résultats détaillés dans ce fichier")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.fixtures, args.language)))
+        return 0
+
+    pairs = fixtures(args.fixtures)
+    if not pairs:
+        print(f"Aucune fixture (<nom>.wav + <nom>.txt) dans {args.fixtures}", file=sys.stderr)
+        return 1
+    print(f"{len(pairs)} enregistrements de {args.fixtures} — {args.threads} threads\n")
+
+    results = []
+    for model_spec in args.models:
+        try:
+            result = run(model_spec, args)
+        except RuntimeError as e:
+            print(f"  {e}", file=sys.stderr)
+            continue
+        results.append(result)
+        for row in result["files"]:
+            wer = row["errors"] / row["words"] if row["words"] else 0.0
+            print(f"  {result['model']:24s} {row['file']:28s} RTF {row['asr_s'] / row['audio_s']:5.2f}  WER {100 * wer:5.1f} %")
+        print()
+
+    print(f"{'modèle':24s} {'RTF':>6s} {'chargement':>11s} {'RSS max':>9s} {'WER':>7s}")
+    for r in results:
+        print(f"{r['model']:24s} {r['rtf']:6.2f} {r['load_s']:9.1f} s {r['peak_rss_mb']:6.0f} MB {100 * r['wer']:5.1f} %")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark du préremplissage (prefill) Ollama selon la disposition du prompt.
+
+Compare PROMPT_LAYOUT=legacy (texte avant le schéma) et PROMPT_LAYOUT=prefix
+(contenu statique d'abord, texte en dernier) sur des textes différents avec le même schéma.
+Les messages sont construits exactement comme par /process-generic (prompt_builder, instructor
+en mode JSON sans sa copie du schéma), puis envoyés à l'API native /api/chat qui renvoie
+prompt_eval_count (tokens réellement préremplis, hors cache KV) et prompt_eval_duration.
+
+Usage :
+    python bench_prefill.py --host http://localhost:11434 --model llama3 --runs 6
+"""
+
+import argparse
+import statistics
+import sys
+
+import requests
+from instructor import Mode
+from instructor.process_response import handle_response_model
+
+from services.prompt_builder import (
+    PROMPT_SCHEMA_MODE,
+    compact_model,
+    generic_messages,
+    instructor_json_messages,
+    strip_instructor_schema,
+)
+from services.schema_compiler import json_schema_to_pydantic_model, schema_hash
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "patientId": {"type": "string", "description": "Identifiant du patient"},
+        "symptoms": {"type": "array", "items": {"type": "string"}, "description": "Symptômes rapportés"},
+        "diagnosis": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "code": {"type": "string", "description": "Code CIM-10"},
+                    "label": {"type": "string"},
+                    "confidence": {"type": "number"},
+                },
+                "required": ["code", "label", "confidence"],
+            },
+        },
+    },
+    "required": ["patientId", "symptoms", "diagnosis"],
+}
+
+SYSTEM_PROMPT = (
+    "Tu es un assistant IA qui extrait et structure des informations depuis du texte. "
+    "Tu réponds UNIQUEMENT avec un JSON valide selon le schéma fourni, "
+    "sans texte explicatif ni markdown."
+)
+
+TEXTS = [
+    "Patient de 45 ans, toux sèche depuis 5 jours, fièvre à 38,5. Suspicion de bronchite aiguë.",
+    "Douleur thoracique à l'effort, essoufflement. Antécédents d'hypertension. ECG demandé.",
+    "Enfant de 6 ans, otalgie droite et fièvre 39. Otite moyenne aiguë, amoxicilline 7 jours.",
+    "Céphalées matinales, vertiges, tension 16/10. Adaptation du traitement antihypertenseur.",
+    "Brûlures mictionnelles depuis 2 jours, pas de fièvre. Cystite simple, fosfomycine dose unique.",
+    "Lombalgie aiguë après port de charge, pas de signe neurologique. Repos relatif, paracétamol.",
+]
+
+
+def build_messages(layout: str, text: str):
+    model = json_schema_to_pydantic_model(SCHEMA, "StructuredResponse")
+    messages = generic_messages(SYSTEM_PROMPT, text, SCHEMA, schema_hash(SCHEMA), layout=layout)
+    messages = instructor_json_messages(messages, None if PROMPT_SCHEMA_MODE != "dedup" else model)
+    _, kwargs = handle_response_model(compact_model(model), Mode.JSON, messages=messages)
+    return strip_instructor_schema(kwargs["messages"])
+
+
+def run(host: str, model: str, layout: str, runs: int):
+    rows = []
+    for i in range(runs):
+        response = requests.post(
+            f"{host.rstrip('/')}/api/chat",
+            json={
+                "model": model,
+                "messages": build_messages(layout, TEXTS[i % len(TEXTS)]),
+                "stream": False,
+                "format": "json",
+                "keep_alive": "30m",
+                # Un seul token généré : on ne mesure que le prefill
+                "options": {"num_predict": 1, "temperature": 0},
+            },
+            timeout=300,
+        )
+        response.raise_for_status()
+        data = response.json()
+        rows.append((data.get("prompt_eval_count", 0), data.get("prompt_eval_duration", 0) / 1e6))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://localhost:11434")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--runs", type=int, default=6)
+    args = parser.parse_args()
+
+    print(f"Modèle {args.model} @ {args.host} — {args.runs} textes par disposition\n")
+    summary = {}
+    for layout in ("legacy", "prefix"):
+        rows = run(args.host, args.model, layout, args.runs)
+        # Premier appel exclu : il remplit le cache
+        warm = rows[1:] or rows
+        summary[layout] = (
+            statistics.mean(r[0] for r in warm),
+            statistics.mean(r[1] for r in warm),
+        )
+        for i, (tokens, ms) in enumerate(rows):
+            print(f"  {layout:7s} #{i}: {tokens:5d} tokens préremplis, {ms:8.1f} ms")
+        print()
+
+    print(f"{'disposition':12s} {'tokens':>8s} {'prefill ms':>11s}")
+    for layout, (tokens, ms) in summary.items():
+        print(f"{layout:12s} {tokens:8.0f} {ms:11.1f}")
+    legacy_ms, prefix_ms = summary["legacy"][1], summary["prefix"][1]
+    if legacy_ms:
+        print(f"\nGain prefill (prefix vs legacy) : {100 * (1 - prefix_ms / legacy_ms):.0f} %")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
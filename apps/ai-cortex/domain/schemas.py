@@ -67,3 +67,17 @@ class ConsultationModel(BaseModel):
         default=None,
         description="Alertes de vérification médicamenteuse (optionnel)",
     )
+
+
+class ConsultationChunkModel(BaseModel):
+    """
+    Extrait d'un morceau de longue consultation — sans transcript, listes éventuellement vides.
+
+    Le texte complet est posé sur la fusion (services.chunking), validée ensuite selon ConsultationModel.
+    """
+
+    patientId: str = Field(..., min_length=1, description="Identifiant du patient")
+    symptoms: List[str] = Field(default_factory=list, description="Symptômes rapportés dans ce morceau")
+    diagnosis: List[DiagnosisModel] = Field(default_factory=list, description="Diagnostics suggérés dans ce morceau")
+    medications: List[MedicationModel] = Field(default_factory=list, description="Médicaments prescrits dans ce morceau")
+    alerts: Optional[List[str]] = Field(default=None, description="Alertes de vérification médicamenteuse (optionnel)")
@@ -14,17 +14,63 @@ Law III: Universal Worker (Architecture Neuro-Symbiotique)
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
-from typing import Any, Dict, List, Literal, Optional
-
-import httpx
-from fastapi import FastAPI, HTTPException
-from openai import OpenAI
-from pydantic import BaseModel, Field, create_model
-
-from services.llm_processor import structure_text
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+from pydantic import BaseModel, Field, ValidationError
+from pydantic_core import to_json
+
+from services import llm_clients, metrics
+from services.admission import BackendSaturated, governors_state
+from services.chunking import map_chunks, merge_consultations, split_text
+from services.llm_router import (
+    LLM_CB_COOLDOWN,
+    Backend,
+    NoBackendAvailable,
+    Router,
+    configure_pool,
+    get_router,
+    get_single_router,
+    is_backend_failure,
+    parse_backends,
+    routers_state,
+    run_health_checks,
+)
+from services.llm_processor import CascadeDecision, structure_text_cascade, structure_text_with_usage
+from services.ollama_keepalive import keep_alive_enabled, keep_alive_state, run_keep_alive
+from services.grammar import LLM_DECODING, constrained_create, grammar_cache_stats
+from services.prompt_builder import (
+    PROMPT_SCHEMA_MODE,
+    compact_model,
+    generic_messages,
+    instructor_json_messages,
+    json_mode_client,
+    minify,
+    prompt_cache_stats,
+)
+from services.result_cache import close_result_cache, get_result_cache, make_key
+from services.schema_compiler import (
+    json_schema_to_pydantic_model,
+    model_cache_stats,
+    relaxed_model,
+    schema_hash,
+    schema_validator,
+    validator_cache_stats,
+)
+from services.streaming import STREAM_HEADERS, STREAM_MEDIA_TYPES, stream_event as _stream_event
+from services.usage_ledger import LLMUsage, get_usage_ledger
+from services.transcription_pool import get_transcription_pool
+from services.whisper_batcher import get_whisper_batcher
+from services.audio_decode import get_decode_cache
+from services.whisper_registry import get_whisper_registry
 
 # Import instructor avec fallback pour les deux versions
 try:
@@ -65,22 +111,60 @@ OLLAMA_BASE_URL = os.getenv(
 )
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 
-# 5 min pour tous les timeouts (Ollama lent en local) — connect, read, write, pool
-LLM_TIMEOUT = httpx.Timeout(
-    300.0,
-    connect=300.0,
-    read=300.0,
-    write=300.0,
-    pool=300.0,
+# Tentatives instructor par appel : une sortie qui viole le schéma (contraintes comprises)
+# est reposée au LLM avec les erreurs de validation
+INSTRUCTOR_MAX_RETRIES = int(os.getenv("INSTRUCTOR_MAX_RETRIES", "3"))
+
+# Usage en tokens aussi en en-têtes X-Usage-* (toujours présent dans le corps de /structure, /process-generic)
+USAGE_HEADERS = os.getenv("USAGE_HEADERS", "false").lower() in ("1", "true", "yes")
+# Réponses JSON sérialisées une seule fois (pydantic-core), sans revalidation par response_model
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Pool Ollama multi-nœuds : LLM_BACKENDS (JSON ou "url|modèle|poids,..."), défaut OLLAMA_BASE_URL seul
+OLLAMA_POOL = "ollama"
+configure_pool(
+    OLLAMA_POOL,
+    parse_backends(os.getenv("LLM_BACKENDS"), "ollama", OLLAMA_MODEL, "ollama")
+    or [Backend(OLLAMA_BASE_URL, OLLAMA_MODEL, provider="ollama", api_key="ollama")],
 )
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Cycle de vie : sondes de santé des pools LLM, épinglage des modèles Ollama (keep_alive),
+    préchargement des modèles Whisper (WHISPER_PRELOAD, en tâche de fond : /health répond
+    pendant le chargement) ; à l'arrêt, ferme clients poolés et cache.
+    """
+    tasks = [asyncio.create_task(run_health_checks())]
+    if LLM_DECODING != "instructor":
+        logger.info("LLM_DECODING=%s: streaming endpoints keep instructor (create_partial)", LLM_DECODING)
+    if TRANSCRIBE_ENABLED:
+        tasks.append(asyncio.create_task(preload_whisper_models()))
+    if DEFAULT_LLM_PROVIDER == "ollama" and keep_alive_enabled():
+        tasks.append(asyncio.create_task(run_keep_alive(get_router(OLLAMA_POOL).backends)))
+    yield
+    for task in tasks:
+        task.cancel()
+    await llm_clients.aclose_all()
+    close_result_cache()
+    get_transcription_pool().shutdown()
+
+
 app = FastAPI(
     title="AI Cortex - Universal Worker",
     description="Generic LLM structuration proxy - No business logic",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 
+class FewShotExample(BaseModel):
+    """Exemple few-shot : texte et sortie attendue (placés dans le préfixe statique du prompt)."""
+    text: str
+    output: Dict[str, Any]
+
+
 class ProcessGenericRequest(BaseModel):
     """Requête pour le traitement générique - Law III: Universal Worker"""
     text: str = Field(..., description="Texte à analyser et structurer")
@@ -105,11 +189,16 @@ class ProcessGenericRequest(BaseModel):
         default=None,
         description="URL de base du fournisseur LLM (si None, utilise la valeur par défaut)"
     )
+    examples: Optional[List[FewShotExample]] = Field(
+        default=None,
+        description="Exemples few-shot (texte → sortie), communs à tous les appels d'un même schéma"
+    )
 
 
 class ProcessGenericResponse(BaseModel):
     """Réponse structurée selon le schéma fourni"""
     data: Dict[str, Any] = Field(..., description="Données structurées selon schema")
+    usage: Optional[LLMUsage] = Field(default=None, description="Tokens consommés et retries")
 
 
 # -----------------------------------------------------------------------------
@@ -137,29 +226,31 @@ class ConsultationStructure(BaseModel):
     medications: List[MedicationStructure] = Field(default_factory=list, description="Médicaments prescrits")
 
 
+class ConsultationChunkStructure(BaseModel):
+    """Extrait d'un morceau de longue consultation : sans transcript, listes éventuellement vides (fusion ensuite)"""
+    patientId: str = Field(..., description="Identifiant du patient")
+    symptoms: List[str] = Field(default_factory=list, description="Symptômes rapportés")
+    diagnosis: List[DiagnosisStructure] = Field(default_factory=list, description="Diagnostics")
+    medications: List[MedicationStructure] = Field(default_factory=list, description="Médicaments prescrits")
+
+
 def get_openai_client(
     provider: str,
     base_url: Optional[str] = None,
     api_key: Optional[str] = None,
-) -> OpenAI:
+) -> AsyncOpenAI:
     """
-    Crée un client OpenAI compatible (OpenAI ou Ollama).
+    Retourne le client AsyncOpenAI compatible (OpenAI ou Ollama) partagé du registre.
 
     - Ollama: OLLAMA_BASE_URL (défaut host.docker.internal ou ollama en compose)
     - OpenAI: OPENAI_API_KEY requise
     - Timeout 300s (connect, read, write, pool) pour éviter APITimeoutError avec Ollama.
     - max_retries=0 : pas de retries automatiques (voir la lenteur tout de suite).
+    - Client réutilisé entre requêtes (keep-alive), voir services.llm_clients.
     """
     if provider == "ollama":
         url = base_url or OLLAMA_BASE_URL
-        logger.info("Using Ollama client at %s (timeout=300s, max_retries=0)", url)
-        http_client = httpx.Client(timeout=LLM_TIMEOUT)
-        return OpenAI(
-            base_url=url,
-            api_key="ollama",
-            http_client=http_client,
-            max_retries=0,
-        )
+        return llm_clients.get_async_client(provider, url, "ollama")
     url = base_url or DEFAULT_BASE_URL
     key = api_key or os.getenv("OPENAI_API_KEY")
     if not key and provider == "openai":
@@ -167,186 +258,21 @@ def get_openai_client(
             "OPENAI_API_KEY is required for provider 'openai'. "
             "Use LLM_PROVIDER=ollama for local LLM."
         )
-    return OpenAI(
-        base_url=url,
-        api_key=key,
-        timeout=LLM_TIMEOUT,
-        max_retries=0,
-    )
-
+    return llm_clients.get_async_client(provider, url, key)
 
-def json_schema_to_pydantic_model(
-    schema: Dict[str, Any],
-    model_name: str = "DynamicResponse"
-) -> type[BaseModel]:
-    """
-    Convertit un JSON Schema en modèle Pydantic dynamique.
-    
-    CRITIQUE: Pas de hardcoding - construction dynamique uniquement.
-    
-    Args:
-        schema: JSON Schema (format OpenAPI3 ou standard)
-        model_name: Nom du modèle Pydantic à créer
-    
-    Returns:
-        Classe Pydantic dynamique
-    """
-    fields: Dict[str, tuple] = {}
-    
-    # Gérer le format JSON Schema standard
-    if isinstance(schema, dict):
-        # Si c'est un schéma JSON Schema avec "properties"
-        if "properties" in schema:
-            props = schema.get("properties", {})
-            required_fields = set(schema.get("required", []))
-            
-            for field_name, field_def in props.items():
-                if not isinstance(field_def, dict):
-                    # Si ce n'est pas un dict, utiliser Any
-                    fields[field_name] = (Any, Field(...) if field_name in required_fields else Field(default=None))
-                    continue
-                
-                field_type = field_def.get("type")
-                is_required = field_name in required_fields
-                
-                # Gérer les différents types JSON Schema
-                if field_type == "string":
-                    fields[field_name] = (
-                        str,
-                        Field(...) if is_required else Field(default=None)
-                    )
-                elif field_type == "integer":
-                    fields[field_name] = (
-                        int,
-                        Field(...) if is_required else Field(default=None)
-                    )
-                elif field_type == "number":
-                    fields[field_name] = (
-                        float,
-                        Field(...) if is_required else Field(default=None)
-                    )
-                elif field_type == "boolean":
-                    fields[field_name] = (
-                        bool,
-                        Field(...) if is_required else Field(default=None)
-                    )
-                elif field_type == "array":
-                    # Gérer les arrays
-                    items_schema = field_def.get("items", {})
-                    if isinstance(items_schema, dict):
-                        items_type = items_schema.get("type", "string")
-                        
-                        if items_type == "string":
-                            fields[field_name] = (
-                                List[str],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                        elif items_type == "integer":
-                            fields[field_name] = (
-                                List[int],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                        elif items_type == "number":
-                            fields[field_name] = (
-                                List[float],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                        elif items_type == "boolean":
-                            fields[field_name] = (
-                                List[bool],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                        elif items_type == "object":
-                            # Array d'objets - créer un sous-modèle dynamique
-                            sub_model = json_schema_to_pydantic_model(
-                                items_schema,
-                                f"{model_name}_{field_name}Item"
-                            )
-                            fields[field_name] = (
-                                List[sub_model],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                        else:
-                            # Array générique
-                            fields[field_name] = (
-                                List[Any],
-                                Field(...) if is_required else Field(default_factory=list)
-                            )
-                    else:
-                        # Array sans items défini - liste générique
-                        fields[field_name] = (
-                            List[Any],
-                            Field(...) if is_required else Field(default_factory=list)
-                        )
-                elif field_type == "object":
-                    # Objet imbriqué - créer un sous-modèle récursivement
-                    sub_model = json_schema_to_pydantic_model(
-                        field_def,
-                        f"{model_name}_{field_name}"
-                    )
-                    fields[field_name] = (
-                        sub_model,
-                        Field(...) if is_required else Field(default=None)
-                    )
-                else:
-                    # Type inconnu - utiliser Any
-                    fields[field_name] = (
-                        Any,
-                        Field(...) if is_required else Field(default=None)
-                    )
-        
-        # Si c'est un objet simple sans "properties" (format alternatif)
-        elif all(isinstance(v, (dict, list, str, int, float, bool, type(None))) for v in schema.values()):
-            # Traiter comme un objet simple
-            for field_name, field_value in schema.items():
-                if field_value is None:
-                    fields[field_name] = (Optional[Any], Field(default=None))
-                elif isinstance(field_value, str):
-                    fields[field_name] = (str, Field(...))
-                elif isinstance(field_value, int):
-                    fields[field_name] = (int, Field(...))
-                elif isinstance(field_value, float):
-                    fields[field_name] = (float, Field(...))
-                elif isinstance(field_value, bool):
-                    fields[field_name] = (bool, Field(...))
-                elif isinstance(field_value, list):
-                    # Déterminer le type des éléments
-                    if field_value and isinstance(field_value[0], dict):
-                        # Liste d'objets
-                        sub_model = json_schema_to_pydantic_model(
-                            field_value[0],
-                            f"{model_name}_{field_name}Item"
-                        )
-                        fields[field_name] = (List[sub_model], Field(default_factory=list))
-                    else:
-                        # Liste simple
-                        fields[field_name] = (List[Any], Field(default_factory=list))
-                elif isinstance(field_value, dict):
-                    # Objet imbriqué
-                    sub_model = json_schema_to_pydantic_model(
-                        field_value,
-                        f"{model_name}_{field_name}"
-                    )
-                    fields[field_name] = (sub_model, Field(...))
-                else:
-                    fields[field_name] = (Any, Field(...))
-    
-    # Si aucun champ n'a été créé, créer un modèle générique
-    if not fields:
-        fields["data"] = (Dict[str, Any], Field(...))
-    
-    return create_model(model_name, **fields)
 
+def _patched_client(client: AsyncOpenAI, provider: str = "openai"):
+    """Patch AsyncOpenAI client with instructor (mode JSON pour Ollama).
 
-def _patched_client(client: OpenAI, provider: str = "openai"):
-    """Patch OpenAI client with instructor (mode JSON pour Ollama)."""
+    from_openai() sur un AsyncOpenAI retourne un AsyncInstructor : create() est awaitable.
+    """
     if INSTRUCTOR_NEW_API:
         # Instructor 1.0.0+ : utiliser from_openai() avec mode JSON pour Ollama
         # Ollama ne supporte pas les tools, donc on force le mode JSON
         if provider == "ollama":
             try:
-                # Utiliser Mode.JSON pour éviter les tools
-                return instructor.from_openai(client, mode=instructor.Mode.JSON)
+                # Utiliser Mode.JSON pour éviter les tools ; schéma envoyé une seule fois (minifié)
+                return json_mode_client(client)
             except (AttributeError, TypeError):
                 # Fallback si Mode.JSON n'existe pas
                 return instructor.from_openai(client)
@@ -362,90 +288,279 @@ def _patched_client(client: OpenAI, provider: str = "openai"):
             return patch(client, mode="json")
 
 
-@app.post("/process-generic", response_model=ProcessGenericResponse)
-async def process_generic(request: ProcessGenericRequest) -> ProcessGenericResponse:
-    """
-    Universal Worker: structure text according to a JSON Schema via a local LLM (Ollama).
+@dataclass
+class _LLMCall:
+    """Appel de structuration résolu (provider, modèle, messages, cache) — partagé sync/stream/batch."""
+    endpoint: str
+    provider: str
+    model: str
+    base_url: Optional[str]
+    messages: List[Dict[str, str]]
+    response_model: type[BaseModel]
+    temperature: float
+    cache_key: str
+    # Pool de routage (None : base_url explicite, pool d'un seul nœud)
+    pool: Optional[str] = None
+    # Modèle imposé par la requête (sinon celui du nœud choisi)
+    explicit_model: bool = False
+    # Label "mode" des métriques
+    mode: str = "default"
+    # Hash du schéma de sortie (registre d'usage)
+    schema_id: Optional[str] = None
+    # Schéma déjà écrit dans les messages (décodage contraint : pas de seconde injection)
+    schema_in_messages: bool = False
+
+    def router(self) -> Router:
+        if self.pool is not None:
+            return get_router(self.pool)
+        base_url = self.base_url or DEFAULT_BASE_URL
+        return get_single_router(self.provider, base_url, self.model, None)
+
+    def on_backend(self, backend: Backend) -> "_LLMCall":
+        """Appel ciblé sur un nœud du pool."""
+        model = self.model if self.explicit_model else backend.model
+        return replace(self, base_url=backend.base_url, model=model)
+
+    def create_params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            "model": self.model,
+            # Copie profonde : instructor ajoute les messages de reask à la liste reçue
+            # et concatène son schéma au contenu du message système
+            "messages": [dict(m) for m in self.messages],
+            # Schéma compact (en TOOLS, envoyé par instructor dans `tools`)
+            "response_model": compact_model(self.response_model),
+            "temperature": self.temperature,
+            "max_retries": INSTRUCTOR_MAX_RETRIES,
+        }
+        # Pour Ollama, forcer JSON object format (évite les tools)
+        if self.provider == "ollama":
+            params["response_format"] = {"type": "json_object"}
+            # Schéma minifié une seule fois, copie indentée d'instructor retirée (services.prompt_builder)
+            params["messages"] = instructor_json_messages(
+                self.messages, None if self.schema_in_messages else self.response_model,
+            )
+        return params
 
-    - Input: { "text": str, "schema": dict } (standard JSON Schema)
-    - Uses instructor on OpenAI client to constrain LLM output to schema
-    - Output: validated structured JSON
-    """
-    provider = request.llm_provider or DEFAULT_LLM_PROVIDER
-    model = request.llm_model or (OLLAMA_MODEL if provider == "ollama" else DEFAULT_LLM_MODEL)
-    base_url = request.base_url or (OLLAMA_BASE_URL if provider == "ollama" else None)
 
+def _client_for(call: _LLMCall) -> AsyncOpenAI:
+    """Client AsyncOpenAI pour l'appel ; erreur de configuration → HTTP 400."""
     try:
-        client = get_openai_client(
-            provider=provider,
-            base_url=base_url,
-            api_key=os.getenv("OPENAI_API_KEY") if provider == "openai" else None,
+        return get_openai_client(
+            provider=call.provider,
+            base_url=call.base_url,
+            api_key=os.getenv("OPENAI_API_KEY") if call.provider == "openai" else None,
         )
     except ValueError as e:
-        logger.warning("Config error: %s", e)
+        logger.warning("[/%s] Config error: %s", call.endpoint, e)
         raise HTTPException(status_code=400, detail=str(e)) from e
 
+
+def _patched_for(call: _LLMCall):
+    """Client instructor pour l'appel ; erreur de configuration → HTTP 400."""
     # Patcher le client avec instructor (passer le provider pour le mode JSON avec Ollama)
-    patched = _patched_client(client, provider=provider)
-    
+    return _patched_client(_client_for(call), provider=call.provider)
+
+
+def _saturated_http(exc: BackendSaturated) -> HTTPException:
+    """Backend saturé → 429 (file pleine) / 503 (attente trop longue) avec Retry-After."""
+    logger.warning("Admission rejected: %s", exc)
+    return HTTPException(
+        status_code=exc.status_code,
+        detail=f"LLM saturé ({exc.reason}). Réessayez dans {exc.retry_after}s.",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _unavailable_http(exc: NoBackendAvailable) -> HTTPException:
+    """Aucun nœud disponible (circuits ouverts) → 503 avec Retry-After = cooldown du circuit."""
+    logger.warning("Routing failed: %s", exc)
+    return HTTPException(
+        status_code=503,
+        detail="Aucun backend LLM disponible (circuit ouvert). Réessayez plus tard.",
+        headers={"Retry-After": str(int(LLM_CB_COOLDOWN))},
+    )
+
+
+def _to_dict(result: Any) -> Dict[str, Any]:
+    """Sortie instructor → dict (Pydantic v2 / v1 / objet)."""
+    if hasattr(result, "model_dump"):
+        return result.model_dump()
+    if hasattr(result, "dict"):
+        return result.dict()
+    return dict(result) if hasattr(result, "__dict__") else {}
+
+
+def _normalize_generic(structured_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliser billingCodes / prescription (ConsultationSchema) pour compatibilité Zod."""
+    if not isinstance(structured_data.get("billingCodes"), list):
+        structured_data["billingCodes"] = []
+    if not isinstance(structured_data.get("prescription"), list):
+        structured_data["prescription"] = []
+    return structured_data
+
+
+def _plan_process_generic(request: ProcessGenericRequest) -> _LLMCall:
+    """Résout provider/modèle, prompt et modèle Pydantic dynamique pour /process-generic."""
+    provider = request.llm_provider or DEFAULT_LLM_PROVIDER
+    model = request.llm_model or (OLLAMA_MODEL if provider == "ollama" else DEFAULT_LLM_MODEL)
+    base_url = request.base_url or (OLLAMA_BASE_URL if provider == "ollama" else None)
+
     system_message = request.system_prompt or (
         "Tu es un assistant IA qui extrait et structure des informations depuis du texte. "
         "Tu réponds UNIQUEMENT avec un JSON valide selon le schéma fourni, "
         "sans texte explicatif ni markdown."
     )
-    schema_str = json.dumps(request.schema, indent=2, ensure_ascii=False)
-    user_message = (
-        f"Analyse le texte suivant et extrais les infos structurées selon le schéma JSON.\n\n"
-        f"Texte:\n{request.text}\n\n"
-        f"Schéma à respecter:\n{schema_str}\n\n"
-        f"Réponds UNIQUEMENT par un JSON valide selon ce schéma."
+    request_schema_hash = schema_hash(request.schema)
+    examples = [(e.text, e.output) for e in request.examples or ()]
+    if examples:
+        validator = schema_validator(request.schema)
+        for i, (_, output) in enumerate(examples):
+            try:
+                validator.validate_python(output)
+            except ValidationError as e:
+                # Un exemple non conforme apprendrait au LLM une sortie que la validation rejette
+                raise HTTPException(status_code=422, detail=f"examples[{i}].output non conforme au schéma: {e!s}") from e
+    messages = generic_messages(system_message, request.text, request.schema, request_schema_hash, examples)
+    build_start = time.perf_counter()
+    try:
+        DynamicModel = json_schema_to_pydantic_model(request.schema, "StructuredResponse")
+    except Exception as e:  # noqa: BLE001
+        _handle_llm_error(e, provider, model, endpoint="process-generic")
+    metrics.observe_schema_build("process-generic", time.perf_counter() - build_start)
+
+    return _LLMCall(
+        endpoint="process-generic",
+        provider=provider,
+        model=model,
+        base_url=base_url,
+        messages=messages,
+        response_model=DynamicModel,
+        temperature=0.3,
+        pool=OLLAMA_POOL if provider == "ollama" and not request.base_url else None,
+        explicit_model=bool(request.llm_model),
+        schema_id=request_schema_hash,
+        schema_in_messages=PROMPT_SCHEMA_MODE != "dedup",
+        cache_key=make_key(
+            "process-generic", f"{provider}:{model}", None, 0.3,
+            system_message + (minify(examples) if examples else ""), request_schema_hash, request.text,
+        ),
     )
 
+
+async def _run_llm_call(call: _LLMCall) -> Tuple[Dict[str, Any], Optional[str], LLMUsage]:
+    """
+    Exécute un appel de structuration, avec cache de résultats.
+
+    Retourne (données structurées, statut cache "HIT"/"MISS" ou None si cache désactivé, usage).
+    L'usage (nul sur un HIT) est ajouté au registre d'usage.
+    Lève HTTPException en cas d'erreur de configuration ou d'appel LLM.
+    """
+    cache = get_result_cache()
+    if cache.enabled:
+        cached = await cache.aget(call.cache_key)
+        if cached is not None:
+            return cached, "HIT", LLMUsage()
+
+    async def attempt(backend: Backend) -> Any:
+        routed = call.on_backend(backend)
+        if LLM_DECODING != "instructor":
+            # Sortie contrainte par grammaire : forme garantie, reask seulement hors grammaire (services.grammar)
+            return await constrained_create(
+                _client_for(routed),
+                model=routed.model,
+                messages=routed.messages,
+                response_model=routed.response_model,
+                temperature=routed.temperature,
+                inject_schema=not routed.schema_in_messages,
+                max_retries=INSTRUCTOR_MAX_RETRIES,
+            )
+        patched = _patched_for(routed)
+        return await patched.chat.completions.create(**routed.create_params())
+
     try:
-        DynamicModel = json_schema_to_pydantic_model(request.schema, "StructuredResponse")
-        
-        # Utiliser l'API appropriée selon la version d'instructor
-        # Pour Ollama, ajouter response_format="json_object" pour éviter les tools
-        create_params = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message},
-            ],
-            "response_model": DynamicModel,
-            "temperature": 0.3,
-        }
-        
-        # Pour Ollama, forcer JSON object format (évite les tools)
-        if provider == "ollama":
-            create_params["response_format"] = {"type": "json_object"}
-        
-        response = patched.chat.completions.create(**create_params)
+        with metrics.llm_call(
+            call.endpoint, call.provider, call.model, call.mode, decoding=LLM_DECODING,
+        ) as stats:
+            result = await call.router().execute(attempt)
+            stats.record_result(result)
+    except HTTPException:
+        raise
+    except BackendSaturated as e:
+        raise _saturated_http(e) from e
+    except NoBackendAvailable as e:
+        raise _unavailable_http(e) from e
     except Exception as e:  # noqa: BLE001
-        _handle_llm_error(e, provider, model)
+        _handle_llm_error(e, call.provider, call.model, endpoint=call.endpoint)
 
-    if hasattr(response, "model_dump"):
-        structured_data = response.model_dump()
-    elif hasattr(response, "dict"):
-        structured_data = response.dict()
-    else:
-        structured_data = dict(response) if hasattr(response, "__dict__") else {}
+    usage = LLMUsage.from_stats(stats)
+    get_usage_ledger().record(call.endpoint, call.provider, call.model, call.mode, call.schema_id, usage)
 
-    # Normaliser billingCodes / prescription (ConsultationSchema) pour compatibilité Zod
-    if not isinstance(structured_data.get("billingCodes"), list):
-        structured_data["billingCodes"] = []
-    if not isinstance(structured_data.get("prescription"), list):
-        structured_data["prescription"] = []
+    structured_data = _to_dict(result)
+    if call.endpoint == "process-generic":
+        structured_data = _normalize_generic(structured_data)
+
+    if cache.enabled:
+        await cache.aset(call.cache_key, structured_data)
+        return structured_data, "MISS", usage
+    return structured_data, None, usage
+
+
+def _json_response(payload: Any, response: Response) -> Response:
+    """
+    Corps JSON sérialisé directement (model_dump_json / pydantic_core.to_json).
+
+    FastAPI revalide puis resérialise sinon la valeur de retour via response_model
+    (jsonable_encoder puis json.dumps). Les en-têtes posés sur `response` sont repris.
+    """
+    body = payload.model_dump_json() if isinstance(payload, BaseModel) else to_json(payload)
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _respond(response: Response, model: type[BaseModel], **fields: Any) -> Any:
+    """Réponse `model(**fields)` : construite sans validation et sérialisée une fois si FAST_JSON_RESPONSES."""
+    if not FAST_JSON_RESPONSES:
+        return model(**fields)
+    return _json_response(model.model_construct(**fields), response)
 
-    return ProcessGenericResponse(data=structured_data)
 
+def _set_usage_headers(response: Response, usage: LLMUsage, force: bool = False) -> None:
+    """En-têtes X-Usage-* si USAGE_HEADERS (ou force)."""
+    if USAGE_HEADERS or force:
+        response.headers.update(usage.headers())
 
-def _handle_llm_error(exc: Exception, provider: str, model: str) -> None:
-    """Log and raise HTTPException for LLM/client errors."""
-    err_msg = str(exc).lower()
+
+async def _run_process_generic(
+    request: ProcessGenericRequest,
+) -> Tuple[Dict[str, Any], Optional[str], LLMUsage]:
+    """Cœur de /process-generic (partagé avec /process-generic/batch)."""
+    return await _run_llm_call(_plan_process_generic(request))
+
+
+@app.post("/process-generic", response_model=ProcessGenericResponse)
+async def process_generic(request: ProcessGenericRequest, response: Response) -> ProcessGenericResponse:
+    """
+    Universal Worker: structure text according to a JSON Schema via a local LLM (Ollama).
+
+    - Input: { "text": str, "schema": dict } (standard JSON Schema)
+    - Uses instructor on OpenAI client to constrain LLM output to schema
+    - Output: validated structured JSON
+    - Cache de résultats opt-in (RESULT_CACHE_BACKEND), en-tête X-Cache: HIT|MISS
+    - usage : tokens prompt/completion/total et retries (en-têtes X-Usage-* si USAGE_HEADERS)
+    """
+    structured_data, cache_status, usage = await _run_process_generic(request)
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    _set_usage_headers(response, usage)
+    return _respond(response, ProcessGenericResponse, data=structured_data, usage=usage)
+
+
+def _handle_llm_error(exc: Exception, provider: str, model: str, endpoint: str = "process-generic") -> None:
+    """Log and raise HTTPException for LLM/client errors (compteur aicortex_llm_errors_total)."""
+    error_class = metrics.count_error(endpoint, provider, model, exc)
     logger.exception("LLM request failed [provider=%s model=%s]: %s", provider, model, exc)
 
-    if "connection" in err_msg or "connect" in err_msg or "refused" in err_msg:
+    if error_class == "connection":
         raise HTTPException(
             status_code=503,
             detail=(
@@ -454,16 +569,21 @@ def _handle_llm_error(exc: Exception, provider: str, model: str) -> None:
                 "et qu'Ollama tourne."
             ),
         ) from exc
-    if "timeout" in err_msg or "timed out" in err_msg:
+    if error_class == "timeout":
         raise HTTPException(
             status_code=504,
             detail="Timeout lors de l'appel au LLM. Réessayez ou augmentez le timeout.",
         ) from exc
-    if "api_key" in err_msg or "openai_api_key" in err_msg:
+    if error_class == "api_key":
         raise HTTPException(
             status_code=400,
             detail="OPENAI_API_KEY manquante ou invalide. Utilisez LLM_PROVIDER=ollama pour un LLM local.",
         ) from exc
+    if error_class == "validation":
+        raise HTTPException(
+            status_code=502,
+            detail=f"Sortie LLM invalide après {INSTRUCTOR_MAX_RETRIES} tentatives: {exc!s}",
+        ) from exc
 
     raise HTTPException(
         status_code=500,
@@ -483,6 +603,7 @@ class StructureRequest(BaseModel):
 class StructureResponse(BaseModel):
     """Réponse structurée conforme ConsultationSchema"""
     data: Dict[str, Any] = Field(..., description="Consultation structurée (patientId, symptoms, diagnosis, medications)")
+    usage: Optional[LLMUsage] = Field(default=None, description="Tokens consommés et retries")
 
 
 STRUCTURE_SYSTEM_PROMPT = (
@@ -493,89 +614,270 @@ STRUCTURE_SYSTEM_PROMPT = (
     "sans markdown ni texte explicatif."
 )
 
+# Morceau d'une longue transcription : pas de transcript à recopier (texte complet posé sur la fusion)
+STRUCTURE_CHUNK_SYSTEM_PROMPT = (
+    "Tu es un assistant médical expert. Analyse cet extrait de consultation (transcription ou dictée) "
+    "et extrais les entités structurées : patientId (génère un id court si absent, ex. pat-001), "
+    "symptoms (liste de chaînes, vide si aucun), diagnosis (code, label, confidence 0–1, vide si aucun), "
+    "medications (name, dosage, duration). Réponds UNIQUEMENT par un JSON valide selon le schéma attendu, "
+    "sans markdown ni texte explicatif."
+)
+
+# Hash du schéma de sortie de /structure (clé du cache de résultats)
+CONSULTATION_STRUCTURE_SCHEMA_HASH = schema_hash(ConsultationStructure.model_json_schema())
+CONSULTATION_CHUNK_SCHEMA_HASH = schema_hash(ConsultationChunkStructure.model_json_schema())
+
+
+def _plan_structure(text: str, chunked: bool = False) -> _LLMCall:
+    """Résout provider/modèle et prompt pour /structure (ConsultationStructure, ou un morceau)."""
+    provider = os.getenv("LLM_PROVIDER", DEFAULT_LLM_PROVIDER)
+    model = OLLAMA_MODEL if provider == "ollama" else (os.getenv("LLM_MODEL") or DEFAULT_LLM_MODEL)
+    base_url = OLLAMA_BASE_URL if provider == "ollama" else None
+    user_message = (
+        f"Analyse ce texte de consultation et extrais les entités structurées.\n\nTexte:\n{text}"
+    )
+    structure_hash = CONSULTATION_CHUNK_SCHEMA_HASH if chunked else CONSULTATION_STRUCTURE_SCHEMA_HASH
+    system_prompt = STRUCTURE_CHUNK_SYSTEM_PROMPT if chunked else STRUCTURE_SYSTEM_PROMPT
+    return _LLMCall(
+        endpoint="structure",
+        provider=provider,
+        model=model,
+        base_url=base_url,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message},
+        ],
+        response_model=ConsultationChunkStructure if chunked else ConsultationStructure,
+        temperature=0.3,
+        pool=OLLAMA_POOL if provider == "ollama" else None,
+        schema_id=structure_hash,
+        cache_key=make_key(
+            "structure", f"{provider}:{model}", None, 0.3,
+            system_prompt, structure_hash, text,
+        ),
+    )
+
+
+async def _run_structure(text: str) -> Tuple[Dict[str, Any], Optional[str], LLMUsage, int]:
+    """
+    Cœur de /structure : un appel, ou map-reduce par morceaux pour une longue transcription.
+
+    Retourne (données, statut cache, usage cumulé, nombre de morceaux).
+    """
+    chunks = split_text(text)
+    if len(chunks) == 1:
+        data, cache_status, usage = await _run_llm_call(_plan_structure(text))
+        return data, cache_status, usage, 1
+
+    results = await map_chunks(chunks, lambda chunk: _run_llm_call(_plan_structure(chunk, chunked=True)))
+    # Seule la fusion est validée selon ConsultationStructure, transcript = texte d'origine
+    merged = merge_consultations([data for data, _, _ in results], transcript=text)
+    try:
+        data = ConsultationStructure.model_validate(merged).model_dump()
+    except ValidationError as e:
+        logger.warning("[/structure] Invalid merged consultation (%d chunks): %s", len(chunks), e)
+        raise HTTPException(status_code=502, detail=f"Sortie LLM invalide: {e!s}") from e
+    statuses = {cache_status for _, cache_status, _ in results}
+    cache_status = None if None in statuses else ("HIT" if statuses == {"HIT"} else "MISS")
+    logger.info("[/structure] %d chars structured in %d chunks", len(text), len(chunks))
+    return data, cache_status, LLMUsage.total(usage for _, _, usage in results), len(chunks)
+
 
 @app.post("/structure", response_model=StructureResponse)
-async def structure(request: StructureRequest) -> StructureResponse:
+async def structure(request: StructureRequest, response: Response) -> StructureResponse:
     """
     Cerveau Réel – Structuration consultation via LLM (Ollama/OpenAI).
 
     - Input: { "text": str }
     - Utilise instructor + ConsultationStructure (miroir Zod)
     - Output: { "data": { patientId, transcript, symptoms, diagnosis, medications } }
+    - Cache de résultats opt-in (RESULT_CACHE_BACKEND), en-tête X-Cache: HIT|MISS
+    - usage : tokens prompt/completion/total et retries (en-têtes X-Usage-* si USAGE_HEADERS)
+    - Texte long (> CHUNK_MAX_CHARS) : structuré par morceaux puis fusionné, en-tête X-Chunks
     """
-    provider = os.getenv("LLM_PROVIDER", DEFAULT_LLM_PROVIDER)
-    model = OLLAMA_MODEL if provider == "ollama" else (os.getenv("LLM_MODEL") or DEFAULT_LLM_MODEL)
-    base_url = OLLAMA_BASE_URL if provider == "ollama" else None
+    structured_data, cache_status, usage, n_chunks = await _run_structure(request.text)
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    if n_chunks > 1:
+        response.headers["X-Chunks"] = str(n_chunks)
+    _set_usage_headers(response, usage)
 
+    logger.info("[/structure] Consultation structurée (symptoms=%d, diagnosis=%d)",
+                len(structured_data.get("symptoms", [])), len(structured_data.get("diagnosis", [])))
+    return _respond(response, StructureResponse, data=structured_data, usage=usage)
+
+
+# -----------------------------------------------------------------------------
+# Streaming – POST /structure/stream et POST /process-generic/stream
+# Objets partiels (instructor Partial[...]) émis au fil de la génération,
+# en NDJSON (défaut) ou Server-Sent Events (?format=sse).
+# Événements : partial (objet en cours), final (objet validé), error.
+# -----------------------------------------------------------------------------
+async def _stream_llm_call(call: _LLMCall, fmt: str, router: Router) -> AsyncIterator[str]:
+    """
+    Génère les événements de stream d'un appel de structuration.
+
+    Le nœud (et son slot d'admission) est réservé au démarrage du flux et rendu à la fin
+    (ou à la déconnexion) : un flux jamais démarré ne réserve rien. Pas de failover en
+    cours de flux. Le dernier objet partiel est revalidé contre le modèle complet avant
+    l'événement final (mis en cache comme la réponse non streamée). Les erreurs arrivent
+    en événement error, le statut HTTP étant déjà envoyé.
+    Toujours instructor (create_partial), quel que soit LLM_DECODING : les objets partiels
+    viennent du parsing incrémental d'instructor, pas d'une sortie contrainte par grammaire.
+    """
     try:
-        client = get_openai_client(
-            provider=provider,
-            base_url=base_url,
-            api_key=os.getenv("OPENAI_API_KEY") if provider == "openai" else None,
-        )
-    except ValueError as e:
-        logger.warning("[/structure] Config error: %s", e)
-        raise HTTPException(status_code=400, detail=str(e)) from e
+        lease = await router.lease()
+    except (BackendSaturated, NoBackendAvailable) as e:
+        # Saturation apparue depuis le contrôle d'admission (attente trop longue, file pleine)
+        error = _saturated_http(e) if isinstance(e, BackendSaturated) else _unavailable_http(e)
+        yield _stream_event(fmt, "error", {"status_code": error.status_code, "detail": str(error.detail)})
+        return
+
+    start = time.monotonic()
+    # None tant que le flux n'a pas abouti : une déconnexion n'est imputée ni en succès ni en échec
+    backend_failed: Optional[bool] = None
+    try:
+        routed = call.on_backend(lease.backend)
+        params = routed.create_params()
+        # Modèle sans contraintes pour les objets partiels ; contraintes vérifiées sur l'objet final
+        params["response_model"] = compact_model(relaxed_model(routed.response_model))
+        # Une seule tentative : un retry relancerait le flux partiel depuis le début
+        params["max_retries"] = 1
+        last_payload: Optional[Dict[str, Any]] = None
+        labels = (routed.endpoint, routed.provider, routed.model, routed.mode)
+        try:
+            patched = _patched_for(routed)
+            with metrics.llm_call(*labels, streaming=True):
+                async for partial in patched.chat.completions.create_partial(**params):
+                    payload = partial.model_dump(exclude_unset=True)
+                    if payload != last_payload:
+                        last_payload = payload
+                        yield _stream_event(fmt, "partial", {"data": payload})
+            backend_failed = False
+        except HTTPException:
+            backend_failed = False
+            raise
+        except Exception as e:  # noqa: BLE001
+            backend_failed = is_backend_failure(e)
+            _handle_llm_error(e, routed.provider, routed.model, endpoint=routed.endpoint)
+        validation_start = time.perf_counter()
+        try:
+            final = routed.response_model.model_validate(last_payload or {})
+            metrics.observe_validation(*labels, time.perf_counter() - validation_start)
+        except ValidationError as e:
+            logger.warning("[/%s/stream] Invalid final object: %s", routed.endpoint, e)
+            raise HTTPException(status_code=502, detail=f"Sortie LLM invalide: {e!s}") from e
+    except HTTPException as e:
+        yield _stream_event(fmt, "error", {"status_code": e.status_code, "detail": str(e.detail)})
+        return
+    finally:
+        router.release(lease, time.monotonic() - start, backend_failed)
+
+    structured_data = _to_dict(final)
+    if routed.endpoint == "process-generic":
+        structured_data = _normalize_generic(structured_data)
+    cache = get_result_cache()
+    if cache.enabled:
+        await cache.aset(routed.cache_key, structured_data)
+    yield _stream_event(fmt, "final", {"data": structured_data})
+
+
+async def _single_event(fmt: str, event: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+    yield _stream_event(fmt, event, payload)
+
+
+async def _streaming_response(call: _LLMCall, fmt: str) -> StreamingResponse:
+    """
+    Ouvre le flux d'un appel de structuration.
 
-    patched = _patched_client(client, provider=provider)
-    user_message = (
-        f"Analyse ce texte de consultation et extrais les entités structurées.\n\nTexte:\n{request.text}"
+    Cache, configuration et admission sont vérifiés avant le flux : un résultat en cache
+    est renvoyé directement, une erreur de config reste un HTTP 400 et une saturation
+    un 429/503 avec Retry-After. Le slot n'est réservé qu'au démarrage du flux : un client
+    parti avant l'envoi du corps ne laisse aucun slot occupé.
+    """
+    headers = dict(STREAM_HEADERS)
+    cache = get_result_cache()
+    if cache.enabled:
+        cached = await cache.aget(call.cache_key)
+        if cached is not None:
+            return StreamingResponse(
+                _single_event(fmt, "final", {"data": cached, "cache": "HIT"}),
+                media_type=STREAM_MEDIA_TYPES[fmt],
+                headers=headers,
+            )
+
+    router = call.router()
+    try:
+        backend = router.check_admission()
+    except BackendSaturated as e:
+        raise _saturated_http(e) from e
+    except NoBackendAvailable as e:
+        raise _unavailable_http(e) from e
+    # Erreur de configuration (clé API manquante...) → HTTP 400 avant le flux
+    _patched_for(call.on_backend(backend))
+    return StreamingResponse(
+        _stream_llm_call(call, fmt, router),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers=headers,
     )
 
-    try:
-        create_params = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": STRUCTURE_SYSTEM_PROMPT},
-                {"role": "user", "content": user_message},
-            ],
-            "response_model": ConsultationStructure,
-            "temperature": 0.3,
-        }
-        if provider == "ollama":
-            create_params["response_format"] = {"type": "json_object"}
 
-        response = patched.chat.completions.create(**create_params)
-    except Exception as e:  # noqa: BLE001
-        _handle_llm_error(e, provider, model)
+@app.post("/structure/stream")
+async def structure_stream(
+    request: StructureRequest,
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+) -> StreamingResponse:
+    """
+    /structure en streaming : ConsultationStructure partielle au fil de la génération.
 
-    if hasattr(response, "model_dump"):
-        structured_data = response.model_dump()
-    elif hasattr(response, "dict"):
-        structured_data = response.dict()
-    else:
-        structured_data = dict(response) if hasattr(response, "__dict__") else {}
+    - Input: { "text": str } ; ?format=ndjson|sse
+    - Output: événements partial { data } ..., puis final { data } ou error { status_code, detail }
+    """
+    return await _streaming_response(_plan_structure(request.text), stream_format)
 
-    logger.info("[/structure] Consultation structurée (symptoms=%d, diagnosis=%d)",
-                len(structured_data.get("symptoms", [])), len(structured_data.get("diagnosis", [])))
-    return StructureResponse(data=structured_data)
+
+@app.post("/process-generic/stream")
+async def process_generic_stream(
+    request: ProcessGenericRequest,
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+) -> StreamingResponse:
+    """
+    /process-generic en streaming : objet partiel selon le schéma au fil de la génération.
+
+    - Input: identique à /process-generic ; ?format=ndjson|sse
+    - Output: événements partial { data } ..., puis final { data } ou error { status_code, detail }
+    """
+    return await _streaming_response(_plan_process_generic(request), stream_format)
 
 
 # -----------------------------------------------------------------------------
 # POST /process – Cerveau structurant (OpenAI + instructor, retries)
-# Input: { "text": str, "mode": "FAST" | "PRECISE" }. Output: JSON structuré (ConsultationModel).
+# Input: { "text": str, "mode": "FAST" | "PRECISE" | "CASCADE" }. Output: JSON structuré (ConsultationModel).
 # -----------------------------------------------------------------------------
 class ProcessRequest(BaseModel):
     """Requête pour POST /process."""
     text: str = Field(..., min_length=1, description="Texte à structurer")
-    mode: Literal["FAST", "PRECISE"] = Field(
+    mode: Literal["FAST", "PRECISE", "CASCADE"] = Field(
         default="FAST",
-        description="FAST = rapidité, PRECISE = focus CIM-10 et précision",
+        description=(
+            "FAST = rapidité, PRECISE = focus CIM-10 et précision, "
+            "CASCADE = petit modèle d'abord, escalade vers PRECISE si besoin"
+        ),
     )
 
 
-@app.post("/process")
-def process(request: ProcessRequest):
-    """
-    Cerveau structurant — extraction d'entités cliniques via OpenAI + instructor.
-
-    - Input: { "text": str, "mode": "FAST" | "PRECISE" }
-    - Output: JSON structuré (patientId, transcript, symptoms, diagnosis, medications).
-    - OPENAI_API_KEY requis (.env). Instructor gère les retries sur JSON malformé.
-    """
+async def _run_process(text: str, mode: str) -> Tuple[Dict[str, Any], LLMUsage, Optional[CascadeDecision]]:
+    """Cœur de /process (partagé avec /process/batch) : erreurs traduites en HTTPException."""
     try:
-        consultation = structure_text(request.text, mode=request.mode)
-        return consultation.model_dump()
+        if mode == "CASCADE":
+            consultation, usage, decision = await structure_text_cascade(text)
+            return consultation.model_dump(), usage, decision
+        consultation, usage = await structure_text_with_usage(text, mode=mode)
+        return consultation.model_dump(), usage, None
+    except BackendSaturated as e:
+        raise _saturated_http(e) from e
+    except NoBackendAvailable as e:
+        raise _unavailable_http(e) from e
     except ValueError as e:
         logger.warning("[/process] Config: %s", e)
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -587,6 +889,257 @@ def process(request: ProcessRequest):
         ) from e
 
 
+@app.post("/process")
+async def process(request: ProcessRequest, response: Response):
+    """
+    Cerveau structurant — extraction d'entités cliniques via OpenAI + instructor.
+
+    - Input: { "text": str, "mode": "FAST" | "PRECISE" | "CASCADE" }
+    - Output: JSON structuré (patientId, transcript, symptoms, diagnosis, medications).
+    - OPENAI_API_KEY requis (.env). Instructor gère les retries sur JSON malformé.
+    - Usage en en-têtes X-Usage-* (le corps reste la Consultation seule).
+    - CASCADE : niveau retenu en en-têtes X-Cascade-Tier (fast | precise), X-Cascade-Model
+      et X-Cascade-Reasons (raisons d'escalade, séparées par des virgules).
+    """
+    data, usage, decision = await _run_process(request.text, request.mode)
+    _set_usage_headers(response, usage, force=True)
+    if decision is not None:
+        response.headers["X-Cascade-Tier"] = decision.tier
+        response.headers["X-Cascade-Model"] = decision.model
+        response.headers["X-Cascade-Reasons"] = ",".join(decision.reasons)
+    return _json_response(data, response) if FAST_JSON_RESPONSES else data
+
+
+# -----------------------------------------------------------------------------
+# Batch – POST /process-generic/batch et POST /process/batch
+# N textes partageant le même schéma, traités en parallèle (plafond de concurrence).
+# Résultats dans l'ordre d'entrée, erreurs par item (un échec n'annule pas le lot).
+# -----------------------------------------------------------------------------
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+
+class BatchItem(BaseModel):
+    """Un texte du lot, avec identifiant optionnel renvoyé tel quel."""
+    id: Optional[str] = Field(default=None, description="Identifiant client (écho dans le résultat)")
+    text: str = Field(..., min_length=1, description="Texte à structurer")
+
+
+class BatchItemError(BaseModel):
+    """Erreur d'un item (même forme qu'une HTTPException)."""
+    status_code: int
+    detail: str
+
+
+class BatchItemResult(BaseModel):
+    """Résultat d'un item : data OU error."""
+    index: int = Field(..., description="Position de l'item dans la requête")
+    id: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    usage: Optional[LLMUsage] = None
+    cascade: Optional[CascadeDecision] = Field(default=None, description="Décision de cascade (mode CASCADE)")
+    error: Optional[BatchItemError] = None
+
+
+class BatchResponse(BaseModel):
+    """Résultats dans l'ordre d'entrée."""
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    usage: LLMUsage = Field(default_factory=LLMUsage, description="Usage cumulé du lot")
+
+
+class ProcessGenericBatchRequest(BaseModel):
+    """Requête batch /process-generic : schéma et options LLM communs à tous les items."""
+    items: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    schema: Dict[str, Any] = Field(..., alias="schema", description="Schéma JSON commun")
+    system_prompt: Optional[str] = Field(default=None)
+    llm_provider: Optional[str] = Field(default=DEFAULT_LLM_PROVIDER)
+    llm_model: Optional[str] = Field(default=None)
+    base_url: Optional[str] = Field(default=None)
+    examples: Optional[List[FewShotExample]] = Field(default=None)
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=f"Parallélisme vers le LLM (plafonné à BATCH_MAX_CONCURRENCY={BATCH_MAX_CONCURRENCY})",
+    )
+
+
+class ProcessBatchRequest(BaseModel):
+    """Requête batch /process : ConsultationModel, mode commun."""
+    items: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    mode: Literal["FAST", "PRECISE", "CASCADE"] = Field(default="FAST")
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+BatchWorker = Callable[[BatchItem], Awaitable[Tuple[Dict[str, Any], LLMUsage, Optional[CascadeDecision]]]]
+
+
+def _batch_tasks(
+    items: List[BatchItem],
+    worker: BatchWorker,
+    max_concurrency: Optional[int],
+) -> Tuple[List["asyncio.Task[BatchItemResult]"], int]:
+    """Lance worker sur chaque item en parallèle (sémaphore) ; tâches dans l'ordre d'entrée."""
+    limit = min(max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(index: int, item: BatchItem) -> BatchItemResult:
+        async with semaphore:
+            try:
+                data, usage, cascade = await worker(item)
+                return BatchItemResult(index=index, id=item.id, data=data, usage=usage, cascade=cascade)
+            except HTTPException as e:
+                error = BatchItemError(status_code=e.status_code, detail=str(e.detail))
+            except Exception as e:  # noqa: BLE001
+                logger.exception("[batch] item %d failed: %s", index, e)
+                error = BatchItemError(status_code=500, detail=str(e))
+            return BatchItemResult(index=index, id=item.id, error=error)
+
+    return [asyncio.ensure_future(run_one(i, item)) for i, item in enumerate(items)], limit
+
+
+def _batch_summary(results: List[BatchItemResult], limit: int) -> Tuple[int, LLMUsage]:
+    failed = sum(1 for r in results if r.error is not None)
+    total = LLMUsage.total(r.usage for r in results if r.usage is not None)
+    logger.info("[batch] %d items (concurrency=%d, failed=%d, tokens=%d)",
+                len(results), limit, failed, total.total_tokens)
+    return failed, total
+
+
+async def _run_batch(
+    items: List[BatchItem],
+    worker: BatchWorker,
+    max_concurrency: Optional[int],
+) -> BatchResponse:
+    """Exécute worker sur chaque item en parallèle (sémaphore), résultats dans l'ordre d'entrée."""
+    tasks, limit = _batch_tasks(items, worker, max_concurrency)
+    results = list(await asyncio.gather(*tasks))
+    failed, total = _batch_summary(results, limit)
+    return BatchResponse.model_construct(
+        results=results, succeeded=len(results) - failed, failed=failed, usage=total,
+    )
+
+
+async def _stream_batch(
+    items: List[BatchItem],
+    worker: BatchWorker,
+    max_concurrency: Optional[int],
+    fmt: str,
+) -> AsyncIterator[str]:
+    """
+    Événements result (un par item, dans l'ordre de fin — champ index) puis summary.
+
+    Rien n'est retenu côté serveur : chaque résultat part dès qu'il est prêt.
+    Déconnexion du client : les items restants sont annulés.
+    """
+    tasks, limit = _batch_tasks(items, worker, max_concurrency)
+    results: List[BatchItemResult] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            results.append(result)
+            yield _stream_event(fmt, "result", result.model_dump())
+    finally:
+        for task in tasks:
+            task.cancel()
+    failed, total = _batch_summary(results, limit)
+    yield _stream_event(fmt, "summary", {"succeeded": len(results) - failed, "failed": failed, "usage": total})
+
+
+async def _batch_response(
+    request: ProcessGenericBatchRequest | ProcessBatchRequest,
+    worker: BatchWorker,
+    stream_format: Optional[str],
+) -> Any:
+    """Lot complet en un corps JSON, ou flux NDJSON / SSE si ?format=ndjson|sse."""
+    if stream_format is not None:
+        return StreamingResponse(
+            _stream_batch(request.items, worker, request.max_concurrency, stream_format),
+            media_type=STREAM_MEDIA_TYPES[stream_format],
+        )
+    batch = await _run_batch(request.items, worker, request.max_concurrency)
+    return _json_response(batch, Response()) if FAST_JSON_RESPONSES else batch
+
+
+@app.post("/process-generic/batch", response_model=BatchResponse)
+async def process_generic_batch(
+    request: ProcessGenericBatchRequest,
+    stream_format: Optional[Literal["ndjson", "sse"]] = Query(None, alias="format"),
+) -> BatchResponse:
+    """
+    Universal Worker en lot : N textes, un schéma commun.
+
+    - Input: { "items": [{ "id"?, "text" }], "schema": dict, ...options /process-generic }
+    - Output: { "results": [{ index, id, data, usage | error }], succeeded, failed, usage }
+    - ?format=ndjson|sse : résultats streamés au fil de l'eau (événements result puis summary)
+    """
+    shared = request.model_dump(by_alias=True, exclude={"items", "max_concurrency"})
+
+    async def worker(item: BatchItem) -> Tuple[Dict[str, Any], LLMUsage, None]:
+        data, _, usage = await _run_process_generic(ProcessGenericRequest(text=item.text, **shared))
+        return data, usage, None
+
+    return await _batch_response(request, worker, stream_format)
+
+
+@app.post("/process/batch", response_model=BatchResponse)
+async def process_batch(
+    request: ProcessBatchRequest,
+    stream_format: Optional[Literal["ndjson", "sse"]] = Query(None, alias="format"),
+) -> BatchResponse:
+    """
+    Cerveau structurant en lot : N textes → ConsultationModel.
+
+    - Input: { "items": [{ "id"?, "text" }], "mode": "FAST" | "PRECISE" | "CASCADE" }
+    - Output: { "results": [{ index, id, data, usage, cascade? | error }], succeeded, failed, usage }
+    - ?format=ndjson|sse : résultats streamés au fil de l'eau (événements result puis summary)
+    """
+    async def worker(item: BatchItem) -> Tuple[Dict[str, Any], LLMUsage, Optional[CascadeDecision]]:
+        return await _run_process(item.text, request.mode)
+
+    return await _batch_response(request, worker, stream_format)
+
+
+# -----------------------------------------------------------------------------
+# Métriques Prometheus – GET /metrics
+# Latence de bout en bout par route (middleware), métriques LLM dans services.metrics.
+# -----------------------------------------------------------------------------
+@app.middleware("http")
+async def observe_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Gabarit de la route (pas le chemin brut) : cardinalité bornée
+    route = request.scope.get("route")
+    endpoint = request.scope.get("root_path", "") + route.path if route is not None else "unmatched"
+    metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """Exposition Prometheus (503 si prometheus_client n'est pas installé)."""
+    try:
+        body, content_type = metrics.render()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
+@app.get("/usage")
+async def usage_ledger(reset: bool = Query(False, description="Remet le registre à zéro après lecture")):
+    """
+    Registre d'usage : tokens et retries cumulés par modèle, détail par endpoint / mode / schéma.
+
+    Coût estimé (cost_usd) pour les modèles présents dans LLM_PRICING.
+    """
+    ledger = get_usage_ledger()
+    snapshot = ledger.snapshot()
+    if reset:
+        ledger.reset()
+    return snapshot
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint."""
@@ -598,23 +1151,80 @@ async def health():
             "provider": DEFAULT_LLM_PROVIDER,
             "ollama_base_url": OLLAMA_BASE_URL,
             "ollama_model": OLLAMA_MODEL,
+            "pool": llm_clients.pool_stats(),
         },
+        "admission": governors_state(),
+        "routing": routers_state(),
+        "schema_model_cache": model_cache_stats(),
+        "schema_validator_cache": validator_cache_stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "decoding": grammar_cache_stats(),
+        "ollama_keep_alive": keep_alive_state(),
+        "result_cache": get_result_cache().stats(),
+        "whisper": get_whisper_registry().state(),
+        "transcription": get_transcription_pool().state(),
+        "whisper_batching": get_whisper_batcher().state(),
+        "audio_decode": get_decode_cache().state(),
         "endpoints": {
-            "process": "/process (text, mode FAST|PRECISE)",
+            "process": "/process (text, mode FAST|PRECISE|CASCADE)",
             "process-generic": "/process-generic",
             "structure": "/structure (Consultation)",
+            "stream": "/structure/stream, /process-generic/stream (?format=ndjson|sse)",
+            "batch": "/process-generic/batch, /process/batch",
             "health": "/health",
+            "metrics": "/metrics",
+            "usage": "/usage",
+            "transcribe": "/transcribe (JSON base64, multipart, audio brut), /transcribe/stream",
+            "live": "WS /transcribe/live (dictée : transcription + structuration au fil de l'eau)",
         },
     }
 
 
 # Importer et inclure les routes de transcription si disponibles
+# (POST /transcribe : chemin appelé par l'API NestJS ; 503 sans openai-whisper)
 try:
-    from transcribe import app as transcribe_app
-    app.mount("/transcribe", transcribe_app)
+    from transcribe import live_dictation, preload_whisper_models, router as transcribe_router
+    app.include_router(transcribe_router)
+    TRANSCRIBE_ENABLED = True
 except ImportError:
     # Si le module n'est pas disponible, on continue sans
-    pass
+    TRANSCRIBE_ENABLED = False
+
+
+# -----------------------------------------------------------------------------
+# Dictée en direct – WS /transcribe/live
+# Transcription glissante (transcribe.live_dictation) + structuration /structure de la
+# transcription validée, relancée après chaque pause de WHISPER_LIVE_DEBOUNCE_S.
+# -----------------------------------------------------------------------------
+async def _structure_live(text: str) -> Dict[str, Any]:
+    data, _, _, _ = await _run_structure(text)
+    return data
+
+
+if TRANSCRIBE_ENABLED:
+    @app.websocket("/transcribe/live")
+    async def transcribe_live(
+        websocket: WebSocket,
+        model: Optional[str] = Query(None, description="Modèle Whisper (défaut : WHISPER_MODEL)"),
+        language: Optional[str] = Query("fr", description="Langue (vide : détection sur la première fenêtre)"),
+        sample_rate: int = Query(16000, ge=8000, le=48000),
+        encoding: Literal["pcm_s16le", "pcm_f32le"] = Query("pcm_s16le"),
+        structure: bool = Query(True, description="Structuration ConsultationStructure au fil de la dictée"),
+    ) -> None:
+        """
+        Dictée en direct : trames PCM mono en binaire, {"type": "stop"} pour terminer.
+
+        Renvoie partial / segment (transcription) et structure (ConsultationStructure
+        de la transcription validée jusque-là), puis done.
+        """
+        await live_dictation(
+            websocket,
+            structure=_structure_live if structure else None,
+            model=model,
+            language=language,
+            sample_rate=sample_rate,
+            encoding=encoding,
+        )
 
 
 if __name__ == "__main__":
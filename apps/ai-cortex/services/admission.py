@@ -0,0 +1,158 @@
+"""
+Contrôle d'admission — limiteur de concurrence par backend LLM.
+
+Sans limite, une rafale de requêtes arrive d'un coup sur Ollama : le GPU sature et
+toutes les requêtes finissent en timeout (300 s). Chaque backend (base_url) a donc :
+- un sémaphore borné (LLM_MAX_CONCURRENCY appels simultanés),
+- une file d'attente bornée (LLM_MAX_QUEUE) avec temps d'attente max (LLM_MAX_QUEUE_TIME),
+- un rejet rapide quand il est saturé (429 file pleine, 503 attente trop longue) avec Retry-After.
+État (in_flight, queued, rejected) exposé sur /health.
+Registre borné à LLM_REGISTRY_SIZE governors (base_url pouvant venir de la requête) : le moins
+récemment utilisé sans appel en cours ni en attente est retiré.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Literal
+
+logger = logging.getLogger("ai-cortex.admission")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_TIME = float(os.getenv("LLM_MAX_QUEUE_TIME", "30"))
+LLM_REGISTRY_SIZE = int(os.getenv("LLM_REGISTRY_SIZE", "64"))
+
+# Lissage de la durée moyenne d'un appel (estimation du Retry-After)
+_EWMA_ALPHA = 0.2
+
+
+class BackendSaturated(Exception):
+    """Backend saturé : requête rejetée sans appeler le LLM."""
+
+    def __init__(self, backend: str, reason: Literal["queue_full", "queue_timeout"], retry_after: int) -> None:
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+        # 429 : file pleine (le client doit ralentir) ; 503 : attente max dépassée
+        self.status_code = 429 if reason == "queue_full" else 503
+        super().__init__(f"LLM backend {backend} saturated ({reason}), retry after {retry_after}s")
+
+
+class BackendGovernor:
+    """Sémaphore borné + file d'attente bornée pour un backend LLM."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_queue_time: float) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_queue_timeout = 0
+        self.avg_call_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Estimation (s) du temps avant qu'un slot se libère pour un nouvel arrivant."""
+        waves = (self.queued + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(waves * (self.avg_call_seconds or 1.0)))
+
+    def check(self) -> None:
+        """Lève BackendSaturated (file pleine) sans réserver de slot."""
+        # Compteurs plutôt que semaphore.locked() : les acquisitions en cours de planification
+        # ne sont pas encore visibles sur le sémaphore lors d'une rafale.
+        if self.in_flight + self.queued >= self.max_concurrency + self.max_queue:
+            self.rejected_queue_full += 1
+            raise BackendSaturated(self.name, "queue_full", self.retry_after())
+
+    async def acquire(self) -> None:
+        """Attend un slot ; lève BackendSaturated si la file est pleine ou l'attente trop longue."""
+        self.check()
+        self.queued += 1
+        try:
+            # asyncio.timeout plutôt que wait_for : wait_for (3.11) avale une annulation arrivée
+            # au moment où le slot est obtenu, et l'appelant annulé garderait le slot
+            async with asyncio.timeout(self.max_queue_time):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.rejected_queue_timeout += 1
+            raise BackendSaturated(self.name, "queue_timeout", self.retry_after()) from None
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, elapsed: float) -> None:
+        """Libère le slot et met à jour la durée moyenne d'appel."""
+        self.in_flight -= 1
+        self._semaphore.release()
+        if self.avg_call_seconds:
+            self.avg_call_seconds += _EWMA_ALPHA * (elapsed - self.avg_call_seconds)
+        else:
+            self.avg_call_seconds = elapsed
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def state(self) -> Dict[str, object]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected_queue_full + self.rejected_queue_timeout,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_queue_timeout": self.rejected_queue_timeout,
+            "admitted": self.admitted,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_queue_time": self.max_queue_time,
+            "avg_call_seconds": round(self.avg_call_seconds, 3),
+        }
+
+
+_governors: "OrderedDict[str, BackendGovernor]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _evict_idle(keep: str) -> None:
+    """Retire les governors inactifs les moins récemment utilisés au-delà de LLM_REGISTRY_SIZE (sous _lock)."""
+    excess = len(_governors) - LLM_REGISTRY_SIZE
+    if excess <= 0:
+        return
+    # Un governor occupé reste : ses slots sont rendus par les appels en cours
+    idle = [name for name, g in _governors.items() if name != keep and g.in_flight == 0 and g.queued == 0]
+    for name in idle[:excess]:
+        del _governors[name]
+
+
+def get_governor(backend: str) -> BackendGovernor:
+    """Governor du backend (clé : base_url), créé à la première utilisation."""
+    with _lock:
+        governor = _governors.get(backend)
+        if governor is not None:
+            _governors.move_to_end(backend)
+        else:
+            governor = BackendGovernor(backend, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_MAX_QUEUE_TIME)
+            _governors[backend] = governor
+            _evict_idle(keep=backend)
+    return governor
+
+
+def governors_state() -> Dict[str, Dict[str, object]]:
+    """État de tous les backends (exposé sur /health)."""
+    return {name: governor.state() for name, governor in list(_governors.items())}
@@ -0,0 +1,198 @@
+"""
+Moteurs ASR — openai-whisper (torch) ou faster-whisper (CTranslate2, int8) derrière /transcribe.
+
+openai-whisper en float32 sur CPU est lent ; faster-whisper réimplémente Whisper sur
+CTranslate2 avec des poids quantifiés int8 (même sortie, plusieurs fois plus rapide, moins
+de mémoire sur nos nœuds sans GPU).
+
+Sélection :
+- par requête : champ / paramètre `model` préfixé par le moteur — "faster-whisper:small",
+  "whisper:base" ; un nom seul ("small") utilise WHISPER_ENGINE,
+- par défaut : WHISPER_ENGINE=whisper | faster-whisper.
+Chaque moteur est une dépendance optionnelle ; indisponible → 503.
+Tous les moteurs rendent le format de whisper.transcribe : {text, segments, language}.
+Annulation (client déconnecté, services.transcription_pool) : faster-whisper décode segment par
+segment et s'arrête au segment suivant ; openai-whisper ne rend la main qu'à la fin de l'appel.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.transcription_pool import TranscriptionCancelled
+
+logger = logging.getLogger("ai-cortex.asr_engines")
+
+WHISPER_ENGINE = os.getenv("WHISPER_ENGINE", "whisper").lower()
+# faster-whisper : int8 (CPU), int8_float16 / float16 (GPU), float32
+FASTER_WHISPER_COMPUTE_TYPE = os.getenv("FASTER_WHISPER_COMPUTE_TYPE", "int8")
+FASTER_WHISPER_BEAM_SIZE = int(os.getenv("FASTER_WHISPER_BEAM_SIZE", "5"))
+# Modèles faster-whisper acceptés en plus des noms officiels : dépôts Hugging Face convertis
+# ("org/modele-ct2") ou répertoires locaux, liste fermée (virgules) — jamais le nom libre d'une requête
+FASTER_WHISPER_EXTRA_MODELS = [
+    m.strip() for m in os.getenv("FASTER_WHISPER_EXTRA_MODELS", "").split(",") if m.strip()
+]
+
+
+class UnknownEngine(ValueError):
+    """Moteur ASR inconnu (préfixe de `model`)."""
+
+
+class WhisperEngine:
+    """openai-whisper (torch) : supporte le micro-batching (services.whisper_batcher)."""
+
+    name = "whisper"
+    batching = True
+
+    def __init__(self) -> None:
+        try:
+            import whisper
+        except ImportError:  # pragma: no cover - dépendance optionnelle
+            whisper = None
+        self._whisper = whisper
+
+    @property
+    def available(self) -> bool:
+        return self._whisper is not None
+
+    def model_names(self) -> List[str]:
+        return list(self._whisper.available_models())
+
+    def accepts(self, name: str) -> bool:
+        return name in self.model_names()
+
+    def load(self, name: str, device: Optional[str], download_root: Optional[str], threads: int) -> Any:
+        return self._whisper.load_model(name, device=device, download_root=download_root)
+
+    def size_bytes(self, model: Any, name: str) -> int:
+        """Taille résidente (paramètres + buffers)."""
+        tensors = [*model.parameters(), *model.buffers()]
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def transcribe(
+        self, model: Any, audio: Any, language: Optional[str], initial_prompt: Optional[str],
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        # Un seul appel, sans point de contrôle : `cancel` n'est consulté qu'avant
+        if cancel is not None and cancel.is_set():
+            raise TranscriptionCancelled()
+        return model.transcribe(audio, language=language, task="transcribe", initial_prompt=initial_prompt)
+
+
+class FasterWhisperEngine:
+    """faster-whisper (CTranslate2), poids quantifiés FASTER_WHISPER_COMPUTE_TYPE."""
+
+    name = "faster-whisper"
+    batching = False
+
+    def __init__(self) -> None:
+        try:
+            import faster_whisper
+        except ImportError:  # pragma: no cover - dépendance optionnelle
+            faster_whisper = None
+        self._fw = faster_whisper
+        self._paths: Dict[str, str] = {}
+
+    @property
+    def available(self) -> bool:
+        return self._fw is not None
+
+    def model_names(self) -> List[str]:
+        return [*self._fw.available_models(), *FASTER_WHISPER_EXTRA_MODELS]
+
+    def accepts(self, name: str) -> bool:
+        # Dépôt ou répertoire arbitraire refusé : téléchargement et budget mémoire à la main du client
+        return name in self.model_names()
+
+    def load(self, name: str, device: Optional[str], download_root: Optional[str], threads: int) -> Any:
+        # Nom connu ou dépôt de FASTER_WHISPER_EXTRA_MODELS : téléchargé une fois dans download_root
+        path = name if os.path.isdir(name) else self._fw.download_model(name, cache_dir=download_root)
+        self._paths[name] = path
+        return self._fw.WhisperModel(
+            path,
+            device=device or "auto",
+            compute_type=FASTER_WHISPER_COMPUTE_TYPE,
+            cpu_threads=threads,
+        )
+
+    def size_bytes(self, model: Any, name: str) -> int:
+        """
+        Estimation : poids sur disque (model.bin, float16), divisés par deux en int8
+        (CTranslate2 n'expose pas sa mémoire).
+        """
+        weights = os.path.join(self._paths.get(name, name), "model.bin")
+        size = os.path.getsize(weights) if os.path.exists(weights) else 0
+        return size // 2 if FASTER_WHISPER_COMPUTE_TYPE.startswith("int8") else size
+
+    def transcribe(
+        self, model: Any, audio: Any, language: Optional[str], initial_prompt: Optional[str],
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        decoded, info = model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",
+            beam_size=FASTER_WHISPER_BEAM_SIZE,
+            initial_prompt=initial_prompt,
+        )
+        # Générateur paresseux : le décodage a lieu ici, segment par segment (point d'annulation)
+        segments = []
+        for s in decoded:
+            if cancel is not None and cancel.is_set():
+                raise TranscriptionCancelled()
+            segments.append({"start": s.start, "end": s.end, "text": s.text})
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "segments": segments,
+            "language": info.language,
+        }
+
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine(), FasterWhisperEngine())}
+# Alias courts acceptés dans `model`
+_ALIASES = {"openai-whisper": "whisper", "fw": "faster-whisper", "ct2": "faster-whisper"}
+
+if WHISPER_ENGINE not in ENGINES:
+    logger.warning("Unknown WHISPER_ENGINE=%s, using whisper", WHISPER_ENGINE)
+    WHISPER_ENGINE = "whisper"
+
+
+def parse_model_spec(spec: str) -> Tuple[str, str]:
+    """"faster-whisper:small" → ("faster-whisper", "small") ; "small" → (WHISPER_ENGINE, "small")."""
+    engine, sep, name = spec.partition(":")
+    if not sep:
+        return WHISPER_ENGINE, spec
+    engine = _ALIASES.get(engine.lower(), engine.lower())
+    if engine not in ENGINES:
+        raise UnknownEngine(f"Moteur ASR inconnu: {engine} (disponibles: {', '.join(ENGINES)})")
+    return engine, name
+
+
+def model_key(spec: str) -> str:
+    """Clé canonique "moteur:nom" (cache du registre, lots, métriques)."""
+    engine, name = parse_model_spec(spec)
+    return f"{engine}:{name}"
+
+
+@dataclass(frozen=True)
+class ASRModel:
+    """Modèle chargé et son moteur."""
+
+    key: str
+    engine: Any
+    model: Any
+
+    def transcribe(
+        self, audio: Any, language: Optional[str] = None, initial_prompt: Optional[str] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        return self.engine.transcribe(self.model, audio, language, initial_prompt, cancel)
+
+
+def engines_state() -> Dict[str, bool]:
+    """Moteurs installés (exposé sur /health)."""
+    return {name: engine.available for name, engine in ENGINES.items()}
@@ -0,0 +1,300 @@
+"""
+Décodage audio en processus — float32 mono 16 kHz sans sous-processus ffmpeg, avec cache.
+
+Chaque /transcribe lançait ffmpeg : fork, copie du PCM par pipe, rééchantillonnage, à chaque
+requête (y compris un nouvel essai du même fichier). Ici, décodeurs essayés dans l'ordre :
+- WAV PCM 16 bits à 16 kHz (module wave) et PCM brut (.pcm / .raw : s16le mono 16 kHz) :
+  lecture directe, sans conversion de fréquence,
+- soundfile (libsndfile : WAV, FLAC, OGG/Vorbis/Opus, MP3) quand le fichier est déjà à 16 kHz,
+- PyAV (bibliothèques ffmpeg liées en processus : M4A/AAC, WebM/Opus, MP3...) avec son
+  rééchantillonneur,
+- soundfile + rééchantillonnage numpy (passe-bas + interpolation), si PyAV est absent,
+- ffmpeg en sous-processus (services.audio_stream) en dernier recours.
+soundfile et PyAV sont des dépendances optionnelles ; les décodeurs disponibles sont sur /health.
+
+Cache LRU par empreinte du contenu (BLAKE2b), borné à WHISPER_DECODE_CACHE_MB : un nouvel
+essai, ou la même note retranscrite avec un autre modèle, ne redécode pas.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import wave
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+
+from services.audio_stream import SAMPLE_RATE, AudioDecodeError, iter_pcm
+
+try:
+    import soundfile
+except (ImportError, OSError):  # pragma: no cover - dépendance optionnelle (OSError : libsndfile absente)
+    soundfile = None
+
+try:
+    import av
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    av = None
+
+logger = logging.getLogger("ai-cortex.audio_decode")
+
+# 0 : cache désactivé (256 MB ≈ 70 min d'audio en float32 16 kHz)
+WHISPER_DECODE_CACHE_MB = float(os.getenv("WHISPER_DECODE_CACHE_MB", "256"))
+
+# Extensions lues comme PCM brut s16le mono 16 kHz (même format que /transcribe/live)
+RAW_PCM_SUFFIXES = (".pcm", ".raw")
+
+# Blocs d'une seconde en lecture par flux
+_BLOCK = SAMPLE_RATE
+_HASH_CHUNK = 1 << 20
+# Demi-longueur du filtre passe-bas du rééchantillonnage numpy
+_RESAMPLE_HALF_TAPS = 32
+
+
+class _Unsupported(Exception):
+    """Format non pris en charge par ce décodeur : essayer le suivant."""
+
+
+def _is_raw(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in RAW_PCM_SUFFIXES
+
+
+def _pcm16(data: bytes, channels: int = 1) -> np.ndarray:
+    samples = np.frombuffer(data[: len(data) - len(data) % (2 * channels)], "<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def resample(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Rééchantillonnage vers 16 kHz : passe-bas anti-repliement (sinc fenêtré) puis interpolation."""
+    if rate == SAMPLE_RATE or not len(samples):
+        return samples.astype(np.float32, copy=False)
+    if rate > SAMPLE_RATE:
+        cutoff = 0.45 * SAMPLE_RATE / rate  # en fraction de la fréquence d'origine
+        taps = np.arange(-_RESAMPLE_HALF_TAPS, _RESAMPLE_HALF_TAPS + 1)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    count = int(round(len(samples) * SAMPLE_RATE / rate))
+    positions = np.arange(count) * (rate / SAMPLE_RATE)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+# -----------------------------------------------------------------------------
+# Décodeurs : générateurs de blocs float32 16 kHz ; _Unsupported (ou toute erreur
+# avant le premier bloc) → décodeur suivant.
+# -----------------------------------------------------------------------------
+def _wav_blocks(path: str) -> Iterator[np.ndarray]:
+    """WAV PCM 16 bits à 16 kHz, sans conversion (stéréo moyenné)."""
+    try:
+        wav = wave.open(path, "rb")
+    except (wave.Error, EOFError) as e:
+        raise _Unsupported(str(e)) from e
+    with wav:
+        if wav.getsampwidth() != 2 or wav.getframerate() != SAMPLE_RATE:
+            raise _Unsupported("WAV non PCM 16 bits / 16 kHz")
+        channels = wav.getnchannels()
+        while True:
+            data = wav.readframes(_BLOCK)
+            if not data:
+                return
+            yield _pcm16(data, channels)
+
+
+def _raw_blocks(path: str) -> Iterator[np.ndarray]:
+    """PCM brut s16le mono 16 kHz (.pcm / .raw)."""
+    if not _is_raw(path):
+        raise _Unsupported("pas de PCM brut")
+    with open(path, "rb") as f:
+        pending = b""
+        while True:
+            data = f.read(_BLOCK * 2)
+            if not data:
+                return
+            data = pending + data
+            cut = len(data) - len(data) % 2
+            pending = data[cut:]
+            yield _pcm16(data[:cut])
+
+
+def _soundfile_blocks(path: str) -> Iterator[np.ndarray]:
+    """soundfile, fichiers déjà à 16 kHz."""
+    if soundfile is None:
+        raise _Unsupported("soundfile non installé")
+    with soundfile.SoundFile(path) as f:
+        if f.samplerate != SAMPLE_RATE:
+            raise _Unsupported(f"{f.samplerate} Hz")
+        for block in f.blocks(blocksize=_BLOCK, dtype="float32", always_2d=True):
+            yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+
+def _soundfile_resampled(path: str) -> Iterator[np.ndarray]:
+    """soundfile + rééchantillonnage numpy (fichier complet : le filtre ne se découpe pas en blocs)."""
+    if soundfile is None:
+        raise _Unsupported("soundfile non installé")
+    data, rate = soundfile.read(path, dtype="float32", always_2d=True)
+    yield resample(data.mean(axis=1) if data.shape[1] > 1 else data[:, 0], rate)
+
+
+def _av_blocks(path: str) -> Iterator[np.ndarray]:
+    """PyAV : tout format lu par les bibliothèques ffmpeg, rééchantillonné en processus."""
+    if av is None:
+        raise _Unsupported("PyAV non installé")
+    with av.open(path) as container:
+        if not container.streams.audio:
+            raise AudioDecodeError("Aucune piste audio")
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                yield out.to_ndarray().reshape(-1)
+        # Vidange du rééchantillonneur
+        for out in resampler.resample(None):
+            yield out.to_ndarray().reshape(-1)
+
+
+def _ffmpeg_blocks(path: str) -> Iterator[np.ndarray]:
+    """ffmpeg en sous-processus (dernier recours)."""
+    if shutil.which("ffmpeg") is None:
+        raise _Unsupported("ffmpeg non installé")
+    yield from iter_pcm(path)
+
+
+Decoder = Callable[[str], Iterator[np.ndarray]]
+
+# Fichier complet (/transcribe) : tout format, conversion de fréquence comprise
+_DECODERS: List[Decoder] = [_wav_blocks, _raw_blocks, _soundfile_blocks, _av_blocks, _soundfile_resampled, _ffmpeg_blocks]
+# Flux (/transcribe/stream) : mémoire bornée, pas de décodeur qui lit tout le fichier
+_STREAM_DECODERS: List[Decoder] = [_wav_blocks, _raw_blocks, _soundfile_blocks, _av_blocks, _ffmpeg_blocks]
+
+
+def _first_decoder(path: str, decoders: List[Decoder]) -> Iterator[np.ndarray]:
+    """Blocs du premier décodeur qui produit une sortie ; AudioDecodeError si aucun."""
+    errors = []
+    for decoder in decoders:
+        blocks = decoder(path)
+        try:
+            first = next(blocks)
+        except StopIteration:
+            logger.debug("Decoded %s with %s (empty)", path, decoder.__name__)
+            return
+        except Exception as e:  # noqa: BLE001 - format non pris en charge ou illisible pour ce décodeur
+            errors.append(f"{decoder.__name__.strip('_')}: {e}")
+            continue
+        logger.debug("Decoding %s with %s", path, decoder.__name__)
+        yield first
+        # Erreur en cours de lecture : propagée (des blocs ont déjà été rendus)
+        yield from blocks
+        return
+    raise AudioDecodeError(f"Audio illisible ({'; '.join(errors[-2:]) or 'aucun décodeur'})")
+
+
+def iter_audio(path: str) -> Iterator[np.ndarray]:
+    """Échantillons float32 mono 16 kHz de `path`, par blocs (mémoire bornée)."""
+    return _first_decoder(path, _STREAM_DECODERS)
+
+
+def decode_audio(path: str) -> np.ndarray:
+    """Enregistrement complet en float32 mono 16 kHz (sans cache)."""
+    chunks = list(_first_decoder(path, _DECODERS))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def decoders_state() -> Dict[str, bool]:
+    """Décodeurs disponibles (exposé sur /health)."""
+    return {
+        "wav": True,
+        "soundfile": soundfile is not None,
+        "pyav": av is not None,
+        "ffmpeg": shutil.which("ffmpeg") is not None,
+    }
+
+
+# -----------------------------------------------------------------------------
+# Cache par contenu
+# -----------------------------------------------------------------------------
+def content_key(path: str) -> str:
+    """Empreinte BLAKE2b du contenu (et du mode PCM brut, qui change l'interprétation)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest() + (":raw" if _is_raw(path) else "")
+
+
+class DecodeCache:
+    """Audio décodé, par empreinte du contenu, avec éviction LRU sous budget mémoire."""
+
+    def __init__(self, budget_mb: float) -> None:
+        self.budget_bytes = int(budget_mb * 2**20)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.decode_seconds = 0.0
+
+    def load(self, path: str) -> np.ndarray:
+        """
+        Audio de `path` en float32 mono 16 kHz (bloquant : à appeler hors boucle asyncio).
+
+        Le tableau rendu peut être partagé entre requêtes : ne pas le modifier en place.
+        """
+        if self.budget_bytes <= 0:
+            return self._decode(path)
+        key = content_key(path)
+        with self._lock:
+            samples = self._entries.get(key)
+            if samples is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return samples
+        samples = self._decode(path)
+        with self._lock:
+            if samples.nbytes <= self.budget_bytes:
+                self._entries[key] = samples
+                while self.resident_bytes() > self.budget_bytes:
+                    self._entries.popitem(last=False)
+        return samples
+
+    def _decode(self, path: str) -> np.ndarray:
+        start = time.monotonic()
+        samples = decode_audio(path)
+        with self._lock:
+            self.misses += 1
+            self.decode_seconds += time.monotonic() - start
+        return samples
+
+    def resident_bytes(self) -> int:
+        return sum(s.nbytes for s in self._entries.values())
+
+    def state(self) -> Dict[str, Any]:
+        """État (exposé sur /health)."""
+        with self._lock:
+            entries = len(self._entries)
+            resident = self.resident_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "decoders": decoders_state(),
+            "budget_mb": round(self.budget_bytes / 2**20, 1),
+            "resident_mb": round(resident / 2**20, 1),
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "avg_decode_ms": round(1000 * self.decode_seconds / self.misses, 1) if self.misses else 0.0,
+        }
+
+
+_cache = DecodeCache(WHISPER_DECODE_CACHE_MB)
+
+
+def get_decode_cache() -> DecodeCache:
+    return _cache
@@ -0,0 +1,120 @@
+"""
+Entrée audio de /transcribe — corps de requête écrit en flux dans un fichier temporaire.
+
+Le JSON base64 historique coûte ~33 % de taille en plus, le parsing d'une chaîne énorme,
+b64decode puis une copie BytesIO : plusieurs copies complètes de l'enregistrement en mémoire.
+Les corps binaires (application/octet-stream, audio/*) et multipart sont écrits par morceaux
+dans un fichier temporaire nommé, décodé directement (services.audio_decode) :
+mémoire de pointe bornée à un morceau, quelle que soit la durée de l'enregistrement.
+Taille max : WHISPER_MAX_UPLOAD_MB (413 au-delà).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import logging
+import os
+import shutil
+import tempfile
+from typing import AsyncIterator, BinaryIO, Optional
+
+logger = logging.getLogger("ai-cortex.audio_input")
+
+WHISPER_MAX_UPLOAD_MB = float(os.getenv("WHISPER_MAX_UPLOAD_MB", "500"))
+# Répertoire des fichiers temporaires (défaut : tempfile.gettempdir())
+WHISPER_UPLOAD_DIR = os.getenv("WHISPER_UPLOAD_DIR") or None
+
+_COPY_CHUNK = 1 << 20
+
+
+class UploadTooLarge(ValueError):
+    """Audio au-delà de WHISPER_MAX_UPLOAD_MB."""
+
+    def __init__(self, limit_bytes: int) -> None:
+        self.limit_bytes = limit_bytes
+        super().__init__(f"Audio trop volumineux (max {limit_bytes / 2**20:.0f} MB)")
+
+
+def _max_bytes() -> int:
+    return int(WHISPER_MAX_UPLOAD_MB * 2**20)
+
+
+def _suffix(filename: Optional[str]) -> str:
+    # Extension conservée : aide le décodeur pour les conteneurs mal détectés ; .pcm / .raw = PCM brut
+    ext = os.path.splitext(filename or "")[1]
+    return ext if ext.isascii() and len(ext) <= 8 else ""
+
+
+def _temp_file(filename: Optional[str]) -> BinaryIO:
+    return tempfile.NamedTemporaryFile(
+        prefix="aicortex-audio-", suffix=_suffix(filename), dir=WHISPER_UPLOAD_DIR, delete=False,
+    )
+
+
+def discard(path: Optional[str]) -> None:
+    """Supprime un fichier audio temporaire (ignoré s'il n'existe plus)."""
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_stream(chunks: AsyncIterator[bytes], filename: Optional[str] = None) -> str:
+    """Écrit un corps de requête en flux dans un fichier temporaire ; retourne son chemin."""
+    limit = _max_bytes()
+    out = _temp_file(filename)
+    size = 0
+    try:
+        with out:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(limit)
+                out.write(chunk)
+    except BaseException:
+        discard(out.name)
+        raise
+    logger.debug("Spooled %d bytes to %s", size, out.name)
+    return out.name
+
+
+async def spool_file(source: BinaryIO, filename: Optional[str] = None) -> str:
+    """Copie un fichier déjà reçu (UploadFile multipart) dans un fichier temporaire nommé."""
+    limit = _max_bytes()
+
+    def copy() -> str:
+        out = _temp_file(filename)
+        try:
+            with out:
+                source.seek(0)
+                shutil.copyfileobj(source, out, _COPY_CHUNK)
+                if out.tell() > limit:
+                    raise UploadTooLarge(limit)
+        except BaseException:
+            discard(out.name)
+            raise
+        return out.name
+
+    return await asyncio.to_thread(copy)
+
+
+async def spool_base64(data: str, filename: Optional[str] = None) -> str:
+    """Audio base64 (JSON historique) décodé dans un fichier temporaire."""
+    limit = _max_bytes()
+    # 4 caractères base64 → 3 octets
+    if len(data) * 3 // 4 > limit:
+        raise UploadTooLarge(limit)
+
+    def write() -> str:
+        out = _temp_file(filename)
+        try:
+            with out:
+                out.write(base64.b64decode(data))
+        except BaseException:
+            discard(out.name)
+            raise
+        return out.name
+
+    return await asyncio.to_thread(write)
@@ -0,0 +1,155 @@
+"""
+Audio en flux — PCM 16 kHz lu au fil de l'eau et découpé en fenêtres aux pauses (VAD).
+
+whisper.load_audio décode tout l'enregistrement d'un coup (30 min ≈ 115 Mo en float32)
+et model.transcribe ne rend la main qu'à la fin. Ici, l'audio est décodé en flux
+(services.audio_decode, ou ffmpeg vers un pipe en dernier recours) ; les échantillons sont regroupés en fenêtres de WHISPER_STREAM_MIN_WINDOW_S à
+WHISPER_STREAM_WINDOW_S secondes (≤ 30 s, le contexte de Whisper), coupées au passage
+le plus calme (énergie RMS lissée sur WHISPER_VAD_SILENCE_MS) pour ne pas couper un mot.
+Les fenêtres entièrement silencieuses (< WHISPER_VAD_SILENCE_DB) sont signalées : inutile
+de les transcrire (Whisper y hallucine du texte).
+Mémoire bornée à une fenêtre + un morceau de lecture, quelle que soit la durée.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
+
+logger = logging.getLogger("ai-cortex.audio_stream")
+
+SAMPLE_RATE = 16000
+
+WHISPER_STREAM_WINDOW_S = min(float(os.getenv("WHISPER_STREAM_WINDOW_S", "25")), 30.0)
+WHISPER_STREAM_MIN_WINDOW_S = min(float(os.getenv("WHISPER_STREAM_MIN_WINDOW_S", "10")), WHISPER_STREAM_WINDOW_S)
+# Fenêtres transcrites en parallèle par flux (0 : une par worker du pool, 1 : séquentiel avec le
+# texte de la fenêtre précédente en amorce)
+WHISPER_STREAM_PARALLEL = int(os.getenv("WHISPER_STREAM_PARALLEL", "0"))
+WHISPER_VAD_FRAME_MS = int(os.getenv("WHISPER_VAD_FRAME_MS", "30"))
+WHISPER_VAD_SILENCE_MS = int(os.getenv("WHISPER_VAD_SILENCE_MS", "300"))
+WHISPER_VAD_SILENCE_DB = float(os.getenv("WHISPER_VAD_SILENCE_DB", "-45"))
+
+# Lecture du pipe ffmpeg par blocs d'une seconde (int16)
+_READ_BYTES = SAMPLE_RATE * 2
+# Reliquat final plus court : ignoré (bruit de fin de fichier)
+_MIN_TAIL_S = 0.1
+
+
+class AudioDecodeError(ValueError):
+    """Audio illisible (format inconnu, fichier corrompu)."""
+
+
+@dataclass
+class AudioWindow:
+    """Fenêtre d'audio à transcrire ; start en secondes depuis le début de l'enregistrement."""
+
+    index: int
+    start: float
+    samples: np.ndarray
+    silent: bool
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / SAMPLE_RATE
+
+
+def iter_pcm(path: str) -> Iterator[np.ndarray]:
+    """Échantillons float32 mono 16 kHz de `path`, décodés en flux par ffmpeg."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-",
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        pending = b""
+        while True:
+            data = process.stdout.read(_READ_BYTES)
+            if not data:
+                break
+            data = pending + data
+            # Un échantillon int16 ne doit pas être coupé entre deux lectures
+            cut = len(data) - len(data) % 2
+            pending = data[cut:]
+            yield np.frombuffer(data[:cut], np.int16).astype(np.float32) / 32768.0
+        if process.wait() != 0:
+            error = process.stderr.read().decode(errors="replace").strip().splitlines()
+            raise AudioDecodeError(f"ffmpeg: {error[-1] if error else 'échec du décodage'}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def frame_db(samples: np.ndarray, frame: int) -> np.ndarray:
+    """Énergie RMS (dBFS) par trame de `frame` échantillons."""
+    count = len(samples) // frame
+    if count == 0:
+        return np.full(1, -120.0, dtype=np.float32)
+    frames = samples[: count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+
+def is_silent(samples: np.ndarray) -> bool:
+    frame = SAMPLE_RATE * WHISPER_VAD_FRAME_MS // 1000
+    return bool(frame_db(samples, frame).max() < WHISPER_VAD_SILENCE_DB)
+
+
+def quietest_cut(samples: np.ndarray, lo: int, hi: int) -> int:
+    """
+    Indice de coupe dans [lo, hi] : centre du passage le plus calme
+    (énergie moyenne minimale sur WHISPER_VAD_SILENCE_MS, à 1 dB près : le plus tardif,
+    pour des fenêtres longues — moins d'appels, plus de contexte).
+    """
+    frame = SAMPLE_RATE * WHISPER_VAD_FRAME_MS // 1000
+    energies = frame_db(samples[lo:hi], frame)
+    span = max(1, WHISPER_VAD_SILENCE_MS // WHISPER_VAD_FRAME_MS)
+    if len(energies) <= span:
+        return hi
+    smoothed = np.convolve(energies, np.ones(span) / span, mode="valid")
+    best = int(np.flatnonzero(smoothed <= smoothed.min() + 1.0)[-1])
+    return lo + (best + span // 2) * frame
+
+
+def vad_windows(
+    chunks: Iterable[np.ndarray],
+    window_s: float = WHISPER_STREAM_WINDOW_S,
+    min_window_s: float = WHISPER_STREAM_MIN_WINDOW_S,
+) -> Iterator[AudioWindow]:
+    """Regroupe un flux d'échantillons en fenêtres coupées aux pauses ; horodatage stable."""
+    max_len = int(window_s * SAMPLE_RATE)
+    min_len = int(min_window_s * SAMPLE_RATE)
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+    index = 0
+    for chunk in chunks:
+        buffer = np.concatenate((buffer, chunk))
+        while len(buffer) >= max_len:
+            cut = quietest_cut(buffer, min_len, max_len)
+            window = buffer[:cut]
+            yield AudioWindow(index, offset / SAMPLE_RATE, window, is_silent(window))
+            index += 1
+            offset += cut
+            buffer = buffer[cut:]
+    if len(buffer) >= _MIN_TAIL_S * SAMPLE_RATE:
+        yield AudioWindow(index, offset / SAMPLE_RATE, buffer, is_silent(buffer))
+
+
+def shift_segments(result: dict, window: AudioWindow) -> list:
+    """Segments Whisper d'une fenêtre, horodatés depuis le début de l'enregistrement."""
+    return [
+        {
+            "start": round(window.start + seg["start"], 2),
+            "end": round(window.start + min(seg["end"], window.duration), 2),
+            "text": seg["text"].strip(),
+        }
+        for seg in result.get("segments", [])
+        if seg["text"].strip()
+    ]
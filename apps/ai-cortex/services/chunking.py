@@ -0,0 +1,171 @@
+"""
+Découpage des longues transcriptions — structuration map-reduce.
+
+Une consultation d'une heure dépasse le contexte des modèles locaux et la latence
+du prefill croît plus que linéairement avec la taille du prompt. Au-delà de
+CHUNK_MAX_CHARS, le texte est :
+- découpé aux frontières de segments / phrases, avec recouvrement (CHUNK_OVERLAP_CHARS)
+  pour ne pas couper une entité entre deux morceaux,
+- structuré morceau par morceau en parallèle (CHUNK_MAX_CONCURRENCY),
+- fusionné : symptômes dédoublonnés, diagnostics par code CIM-10 (confiance max),
+  médicaments par nom.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "6000"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "400"))
+CHUNK_MAX_CONCURRENCY = int(os.getenv("CHUNK_MAX_CONCURRENCY", "4"))
+
+# Fin de phrase (ponctuation suivie d'espace) ou saut de ligne (tour de parole, segment)
+_BOUNDARY_RE = re.compile(r"(?<=[.!?…])\s+|\s*\n+\s*")
+
+T = TypeVar("T")
+
+
+def _units(text: str, max_chars: int) -> List[str]:
+    """Phrases / segments ; une phrase plus longue que max_chars est coupée entre deux mots."""
+    units: List[str] = []
+    for unit in _BOUNDARY_RE.split(text):
+        unit = unit.strip()
+        if not unit:
+            continue
+        while len(unit) > max_chars:
+            cut = unit.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            units.append(unit[:cut].strip())
+            unit = unit[cut:].strip()
+        if unit:
+            units.append(unit)
+    return units
+
+
+def split_text(
+    text: str,
+    max_chars: int = CHUNK_MAX_CHARS,
+    overlap: int = CHUNK_OVERLAP_CHARS,
+) -> List[str]:
+    """
+    Découpe `text` en morceaux d'au plus max_chars caractères.
+
+    Un texte assez court est renvoyé tel quel (un seul morceau, prompt inchangé).
+    Chaque morceau reprend les dernières phrases du précédent (≤ overlap caractères).
+    """
+    if len(text) <= max_chars:
+        return [text]
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for unit in _units(text, max_chars):
+        if current and size + len(unit) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            tail: List[str] = []
+            tail_size = 0
+            for previous in reversed(current):
+                if tail_size + len(previous) + 1 > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_size += len(previous) + 1
+            current, size = tail, tail_size
+            while current and size + len(unit) + 1 > max_chars:
+                size -= len(current.pop(0)) + 1
+        current.append(unit)
+        size += len(unit) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+async def map_chunks(
+    chunks: List[str],
+    worker: Callable[[str], Awaitable[T]],
+    max_concurrency: int = CHUNK_MAX_CONCURRENCY,
+) -> List[T]:
+    """
+    Applique worker à chaque morceau en parallèle (sémaphore), résultats dans l'ordre.
+
+    Le premier échec annule les morceaux restants (le résultat fusionné serait incomplet) ;
+    leurs slots d'admission sont rendus (Router.execute) avant que l'erreur ne remonte.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(chunk: str) -> T:
+        async with semaphore:
+            return await worker(chunk)
+
+    tasks = [asyncio.ensure_future(run_one(c)) for c in chunks]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Attendre la fin des annulations : nettoyage terminé avant la réponse d'erreur
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _norm_text(value: Any) -> str:
+    return " ".join(str(value or "").split()).strip(" .;,").casefold()
+
+
+def _norm_code(value: Any) -> str:
+    """Code CIM-10 normalisé : J11.1, j111, "J11 .1" → J111."""
+    return re.sub(r"[\s.]", "", str(value or "")).upper()
+
+
+def merge_consultations(parts: List[Dict[str, Any]], transcript: str) -> Dict[str, Any]:
+    """
+    Fusionne les consultations structurées des morceaux (dicts ConsultationModel / Structure).
+
+    - patientId : premier non vide,
+    - transcript : le texte complet,
+    - symptoms : union dédoublonnée (casse / espaces), ordre d'apparition,
+    - diagnosis : un par code CIM-10 (à défaut par libellé), confiance maximale retenue,
+    - medications : une par nom, l'entrée la plus complète (dosage / durée) retenue,
+    - alerts : union dédoublonnée si présentes.
+    """
+    merged: Dict[str, Any] = {
+        "patientId": next((p.get("patientId") for p in parts if p.get("patientId")), ""),
+        "transcript": transcript,
+    }
+
+    symptoms: Dict[str, str] = {}
+    for part in parts:
+        for symptom in part.get("symptoms") or []:
+            symptoms.setdefault(_norm_text(symptom), symptom)
+    merged["symptoms"] = [s for key, s in symptoms.items() if key]
+
+    diagnoses: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        for diagnosis in part.get("diagnosis") or []:
+            key = _norm_code(diagnosis.get("code")) or _norm_text(diagnosis.get("label"))
+            best = diagnoses.get(key)
+            if best is None or (diagnosis.get("confidence") or 0) > (best.get("confidence") or 0):
+                diagnoses[key] = diagnosis
+    merged["diagnosis"] = list(diagnoses.values())
+
+    medications: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        for medication in part.get("medications") or []:
+            key = _norm_text(medication.get("name"))
+            best = medications.get(key)
+            filled = sum(1 for f in ("dosage", "duration") if medication.get(f))
+            if best is None or filled > sum(1 for f in ("dosage", "duration") if best.get(f)):
+                medications[key] = medication
+    merged["medications"] = list(medications.values())
+
+    alerts: Optional[Dict[str, str]] = None
+    for part in parts:
+        if part.get("alerts"):
+            alerts = alerts or {}
+            for alert in part["alerts"]:
+                alerts.setdefault(_norm_text(alert), alert)
+    if alerts is not None:
+        merged["alerts"] = list(alerts.values())
+    return merged
@@ -0,0 +1,264 @@
+"""
+Décodage contraint — sortie JSON valide par construction, sans boucle de retries.
+
+Avec instructor, un JSON malformé ou non conforme coûte un appel LLM complet de plus
+(reask, jusqu'à INSTRUCTOR_MAX_RETRIES). Les backends locaux savent contraindre
+l'échantillonnage à une grammaire dérivée du schéma du response_model :
+- "json_schema" : response_format {"type": "json_schema", ...} (Ollama ≥ 0.5 — équivalent
+  de `format` de l'API native —, llama.cpp server, vLLM),
+- "gbnf" : grammaire GBNF envoyée dans le corps (`grammar`, llama.cpp server).
+
+LLM_DECODING : instructor (défaut) | json_schema | gbnf.
+La sortie est validée contre le response_model ; seules les contraintes non exprimables
+dans la grammaire (bornes, longueurs, motifs) peuvent encore déclencher un reask.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+from pydantic import BaseModel, ValidationError
+
+from services.prompt_builder import PROMPT_CACHE_SIZE, LRUCache, compact_model, with_schema
+
+logger = logging.getLogger("ai-cortex.grammar")
+
+LLM_DECODING = os.getenv("LLM_DECODING", "instructor").lower()
+DECODINGS = ("instructor", "json_schema", "gbnf")
+if LLM_DECODING not in DECODINGS:
+    logger.warning("Unknown LLM_DECODING=%s, using instructor", LLM_DECODING)
+    LLM_DECODING = "instructor"
+
+_PRIMITIVES = {
+    # Espaces bornés à une ligne : une grammaire à espaces libres laisse le modèle boucler
+    "ws": r'( " " | "\n" [ \t]* )?',
+    "string": r'"\"" ( [^"\\\x7F\x00-\x1F] | "\\" ( ["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\"" ws',
+    "number": r'"-"? ( [0-9] | [1-9] [0-9]* ) ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )? ws',
+    "integer": r'"-"? ( [0-9] | [1-9] [0-9]* ) ws',
+    "boolean": r'( "true" | "false" ) ws',
+    "null": r'"null" ws',
+    "value": r"object | array | string | number | boolean | null",
+    "object": r'"{" ws ( string ":" ws value ( "," ws string ":" ws value )* )? "}" ws',
+    "array": r'"[" ws ( value ( "," ws value )* )? "]" ws',
+}
+
+_grammars = LRUCache(PROMPT_CACHE_SIZE)
+
+
+def _literal(value: str) -> str:
+    """Littéral GBNF (chaîne entre guillemets, échappée)."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    return f'"{escaped}"'
+
+
+def _json_literal(value: Any) -> str:
+    """Valeur JSON exacte (enum / const) suivie d'espaces optionnels."""
+    return f"{_literal(json.dumps(value, ensure_ascii=False))} ws"
+
+
+class _GBNFBuilder:
+    """Convertit un JSON Schema (sous-ensemble Pydantic) en règles GBNF."""
+
+    def __init__(self, schema: Dict[str, Any]) -> None:
+        self.defs: Dict[str, Any] = {**schema.get("definitions", {}), **schema.get("$defs", {})}
+        self.rules: Dict[str, str] = {}
+        self.used_primitives: set = {"ws"}
+
+    def _name(self, hint: str) -> str:
+        base = re.sub(r"[^a-zA-Z0-9-]+", "-", hint).strip("-").lower() or "rule"
+        name, i = base, 1
+        while name in self.rules or name in _PRIMITIVES or name == "root":
+            i += 1
+            name = f"{base}{i}"
+        return name
+
+    def _primitive(self, name: str) -> str:
+        self.used_primitives.add(name)
+        if name in ("value", "object", "array"):
+            self.used_primitives.update(("value", "object", "array", "string", "number", "boolean", "null"))
+        return name
+
+    def _ref(self, ref: str) -> str:
+        name = "def-" + re.sub(r"[^a-zA-Z0-9-]+", "-", ref.rsplit("/", 1)[-1]).lower()
+        if name not in self.rules:
+            self.rules[name] = ""  # réservé : références récursives
+            body = self.expr(self.defs.get(ref.rsplit("/", 1)[-1], {}), name)
+            if body != name:
+                self.rules[name] = body
+        return name
+
+    def expr(self, schema: Any, hint: str) -> str:
+        """Expression GBNF d'un sous-schéma."""
+        if not isinstance(schema, dict) or not schema:
+            return self._primitive("value")
+        if "$ref" in schema:
+            return self._ref(schema["$ref"])
+        if "const" in schema:
+            return _json_literal(schema["const"])
+        if "enum" in schema:
+            return "( " + " | ".join(_json_literal(v) for v in schema["enum"]) + " )"
+        for key in ("anyOf", "oneOf"):
+            if key in schema:
+                return "( " + " | ".join(self.expr(s, f"{hint}-{i}") for i, s in enumerate(schema[key])) + " )"
+        if "allOf" in schema and len(schema["allOf"]) == 1:
+            return self.expr(schema["allOf"][0], hint)
+
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            return "( " + " | ".join(self.expr({**schema, "type": t}, hint) for t in schema_type) + " )"
+        if schema_type == "object" or "properties" in schema:
+            return self._object(schema, hint)
+        if schema_type == "array":
+            return self._array(schema, hint)
+        if schema_type in ("string", "number", "integer", "boolean", "null"):
+            return self._primitive(schema_type)
+        return self._primitive("value")
+
+    def _rule(self, hint: str, body: str) -> str:
+        if self.rules.get(hint) == "":  # nom réservé par _ref
+            self.rules[hint] = body
+            return hint
+        name = self._name(hint)
+        self.rules[name] = body
+        return name
+
+    def _object(self, schema: Dict[str, Any], hint: str) -> str:
+        properties: Dict[str, Any] = schema.get("properties") or {}
+        if not properties:
+            return self._primitive("object")
+        required = set(schema.get("required") or [])
+        pairs = {
+            name: f'{_literal(json.dumps(name))} ws ":" ws {self.expr(sub, f"{hint}-{name}")}'
+            for name, sub in properties.items()
+        }
+        mandatory = [pairs[n] for n in properties if n in required]
+        optional = [pairs[n] for n in properties if n not in required]
+
+        # Ordre des propriétés figé (celui du schéma) : requises puis optionnelles
+        if mandatory:
+            body = ' "," ws '.join(mandatory) + "".join(f' ( "," ws {p} )?' for p in optional)
+        elif optional:
+            # Aucune requise : la première présente ne prend pas de virgule
+            alternatives = [
+                optional[i] + "".join(f' ( "," ws {p} )?' for p in optional[i + 1:])
+                for i in range(len(optional))
+            ]
+            body = "( " + " | ".join(alternatives) + " )?"
+        else:
+            body = ""
+        return self._rule(hint, f'"{{" ws {body} "}}" ws')
+
+    def _array(self, schema: Dict[str, Any], hint: str) -> str:
+        item = self.expr(schema.get("items") or {}, f"{hint}-item")
+        if (schema.get("minItems") or 0) > 0:
+            body = f'"[" ws {item} ( "," ws {item} )* "]" ws'
+        else:
+            body = f'"[" ws ( {item} ( "," ws {item} )* )? "]" ws'
+        return self._rule(hint, body)
+
+    def render(self, root: str) -> str:
+        lines = [f"root ::= {root}"]
+        lines += [f"{name} ::= {body}" for name, body in self.rules.items()]
+        lines += [f"{name} ::= {_PRIMITIVES[name]}" for name in _PRIMITIVES if name in self.used_primitives]
+        return "\n".join(lines) + "\n"
+
+
+def schema_to_gbnf(schema: Dict[str, Any]) -> str:
+    """
+    Grammaire GBNF acceptant exactement les JSON conformes (structure, types, enum / const,
+    $ref / $defs, anyOf, propriétés requises) ; propriétés dans l'ordre du schéma.
+    """
+    builder = _GBNFBuilder(schema)
+    root = builder.expr(schema, "root-object")
+    return builder.render(root)
+
+
+def grammar_for(model: type[BaseModel]) -> str:
+    """Grammaire GBNF du response_model, mise en cache par modèle."""
+    grammar = _grammars.get(model)
+    if grammar is None:
+        grammar = schema_to_gbnf(model.model_json_schema())
+        _grammars.put(model, grammar)
+    return grammar
+
+
+def _schema_params(model: type[BaseModel], decoding: str) -> Dict[str, Any]:
+    if decoding == "gbnf":
+        return {"extra_body": {"grammar": grammar_for(model)}}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": model.__name__, "schema": model.model_json_schema()},
+        }
+    }
+
+
+async def constrained_create(
+    client: AsyncOpenAI,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    response_model: type[BaseModel],
+    temperature: float,
+    decoding: Optional[str] = None,
+    inject_schema: bool = True,
+    max_retries: int = 1,
+) -> BaseModel:
+    """
+    Sortie contrainte par la grammaire du response_model, validée contre le modèle.
+
+    La forme (JSON, types, enum, champs requis) est garantie : seules les contraintes
+    non exprimées dans la grammaire (bornes, longueurs, motifs) peuvent échouer. La sortie
+    est alors reposée avec les erreurs, dans la limite de max_retries tentatives au total ;
+    ValidationError au-delà.
+    Retourne une instance de response_model ; `_raw_response` porte la dernière complétion
+    avec l'usage cumulé sur les tentatives (comme instructor).
+    inject_schema=False : le schéma est déjà dans les messages (PROMPT_SCHEMA_MODE inline / full).
+    """
+    decoding = decoding or LLM_DECODING
+    compact = compact_model(response_model)
+    # La grammaire garantit la forme, le schéma dans le prompt guide le contenu
+    conversation = with_schema(messages, compact.model_json_schema()) if inject_schema else list(messages)
+    prompt_tokens = completion_tokens = attempt = 0
+    while True:
+        attempt += 1
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=conversation,
+            temperature=temperature,
+            **_schema_params(compact, decoding),
+        )
+        if completion.usage is not None:
+            prompt_tokens += completion.usage.prompt_tokens or 0
+            completion_tokens += completion.usage.completion_tokens or 0
+            completion.usage = CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            )
+        content = completion.choices[0].message.content or ""
+        try:
+            result = response_model.model_validate_json(content)
+        except ValidationError as e:
+            if attempt >= max_retries:
+                raise
+            logger.info("constrained output rejected (attempt %d/%d): %s", attempt, max_retries, e)
+            conversation = [
+                *conversation,
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": f"Corrige ces erreurs de validation et renvoie le JSON complet :\n{e!s}"},
+            ]
+            continue
+        result._raw_response = completion
+        return result
+
+
+def grammar_cache_stats() -> Dict[str, Any]:
+    """État (exposé sur /health) ; les flux restent sur instructor (create_partial)."""
+    return {"decoding": LLM_DECODING, "streaming": "instructor", "grammars": len(_grammars)}
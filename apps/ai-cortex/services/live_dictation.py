@@ -0,0 +1,182 @@
+"""
+Dictée en direct — audio reçu par trames, transcription glissante, structuration différée.
+
+Le pipeline historique est séquentiel : upload complet, /transcribe, puis /structure sur
+le texte entier. En dictée, l'audio arrive en continu (WebSocket /transcribe/live) :
+- LiveAudioBuffer accumule les trames PCM et valide une fenêtre dès qu'une pause suit au
+  moins WHISPER_STREAM_MIN_WINDOW_S secondes de parole (ou au plus tard à WHISPER_STREAM_WINDOW_S,
+  coupée au passage le plus calme) ; le reliquat non validé est retranscrit à titre
+  provisoire toutes les WHISPER_LIVE_STEP_S secondes d'audio nouveau,
+- Debouncer relance la structuration de la transcription validée WHISPER_LIVE_DEBOUNCE_S
+  secondes après le dernier segment, une seule à la fois, jamais deux fois sur le même texte.
+Mémoire bornée : seul l'audio non validé (≤ une fenêtre) est conservé.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Literal, Optional
+
+import numpy as np
+
+from services.audio_stream import (
+    SAMPLE_RATE,
+    WHISPER_STREAM_MIN_WINDOW_S,
+    WHISPER_STREAM_WINDOW_S,
+    WHISPER_VAD_FRAME_MS,
+    WHISPER_VAD_SILENCE_DB,
+    AudioWindow,
+    frame_db,
+    is_silent,
+    quietest_cut,
+)
+
+logger = logging.getLogger("ai-cortex.live_dictation")
+
+# Transcription provisoire du reliquat toutes les N secondes d'audio nouveau
+WHISPER_LIVE_STEP_S = float(os.getenv("WHISPER_LIVE_STEP_S", "2"))
+# Pause (ms) qui valide la fenêtre en cours (une fois WHISPER_STREAM_MIN_WINDOW_S atteint)
+WHISPER_LIVE_PAUSE_MS = int(os.getenv("WHISPER_LIVE_PAUSE_MS", "600"))
+# Délai sans nouveau segment avant de relancer la structuration
+WHISPER_LIVE_DEBOUNCE_S = float(os.getenv("WHISPER_LIVE_DEBOUNCE_S", "3"))
+
+Encoding = Literal["pcm_s16le", "pcm_f32le"]
+
+
+def to_float32(frame: bytes, encoding: Encoding, sample_rate: int) -> np.ndarray:
+    """Trame PCM mono → float32 16 kHz (rééchantillonnage linéaire si besoin)."""
+    if encoding == "pcm_f32le":
+        samples = np.frombuffer(frame[: len(frame) - len(frame) % 4], "<f4").astype(np.float32)
+    else:
+        samples = np.frombuffer(frame[: len(frame) - len(frame) % 2], "<i2").astype(np.float32) / 32768.0
+    if sample_rate != SAMPLE_RATE and len(samples):
+        count = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+        positions = np.linspace(0, len(samples) - 1, count)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+class LiveAudioBuffer:
+    """Audio reçu en direct : fenêtres validées (horodatage stable) et reliquat provisoire."""
+
+    def __init__(
+        self,
+        window_s: float = WHISPER_STREAM_WINDOW_S,
+        min_window_s: float = WHISPER_STREAM_MIN_WINDOW_S,
+        step_s: float = WHISPER_LIVE_STEP_S,
+        pause_ms: int = WHISPER_LIVE_PAUSE_MS,
+    ) -> None:
+        self.max_len = int(window_s * SAMPLE_RATE)
+        self.min_len = int(min_window_s * SAMPLE_RATE)
+        self.step_len = int(step_s * SAMPLE_RATE)
+        self.pause_frames = max(1, pause_ms // WHISPER_VAD_FRAME_MS)
+        self._frame = SAMPLE_RATE * WHISPER_VAD_FRAME_MS // 1000
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0  # échantillons déjà validés
+        self._index = 0
+        self._since_partial = 0
+
+    @property
+    def duration(self) -> float:
+        return (self._offset + len(self._buffer)) / SAMPLE_RATE
+
+    def feed(self, samples: np.ndarray) -> List[AudioWindow]:
+        """Ajoute des échantillons ; retourne les fenêtres validées (dans l'ordre)."""
+        self._buffer = np.concatenate((self._buffer, samples))
+        self._since_partial += len(samples)
+        windows = []
+        while True:
+            cut = self._commit_point()
+            if cut is None:
+                return windows
+            windows.append(self._take(cut))
+
+    def _commit_point(self) -> Optional[int]:
+        if len(self._buffer) >= self.max_len:
+            return quietest_cut(self._buffer, self.min_len, self.max_len)
+        if len(self._buffer) >= self.min_len:
+            # Fin de phrase : la pause finale valide toute la fenêtre
+            tail = frame_db(self._buffer[-self.pause_frames * self._frame:], self._frame)
+            if len(tail) >= self.pause_frames and tail.max() < WHISPER_VAD_SILENCE_DB:
+                return len(self._buffer)
+        return None
+
+    def _take(self, cut: int) -> AudioWindow:
+        samples = self._buffer[:cut]
+        window = AudioWindow(self._index, self._offset / SAMPLE_RATE, samples, is_silent(samples))
+        self._index += 1
+        self._offset += cut
+        self._buffer = self._buffer[cut:]
+        return window
+
+    def partial_due(self) -> bool:
+        """Assez d'audio nouveau depuis la dernière transcription provisoire."""
+        return self._since_partial >= self.step_len and len(self._buffer) > 0
+
+    def partial(self) -> Optional[AudioWindow]:
+        """Reliquat non validé (copie), à transcrire à titre provisoire ; None s'il est silencieux."""
+        self._since_partial = 0
+        if not len(self._buffer) or is_silent(self._buffer):
+            return None
+        return AudioWindow(self._index, self._offset / SAMPLE_RATE, self._buffer.copy(), False)
+
+    def flush(self) -> Optional[AudioWindow]:
+        """Fin de dictée : valide le reliquat."""
+        if not len(self._buffer):
+            return None
+        return self._take(len(self._buffer))
+
+
+class Debouncer:
+    """
+    Exécute `action` `delay` secondes après le dernier touch().
+
+    Une seule exécution à la fois : un touch() pendant une exécution la laisse finir
+    et en planifie une nouvelle.
+    """
+
+    def __init__(self, delay: float, action: Callable[[], Awaitable[None]]) -> None:
+        self.delay = delay
+        self.action = action
+        self._timer: Optional[asyncio.Task] = None
+        self._running: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def touch(self) -> None:
+        self._dirty = True
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._fire_later())
+
+    async def _fire_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        await self._run()
+
+    async def _run(self) -> None:
+        if self._running is not None and not self._running.done():
+            # Exécution en cours non annulée par un nouveau touch()
+            await asyncio.shield(self._running)
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._running = asyncio.create_task(self.action())
+        await asyncio.shield(self._running)
+
+    async def flush(self) -> None:
+        """Exécution immédiate si des changements sont en attente (fin de dictée)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self._run()
+
+    async def close(self) -> None:
+        """
+        Annule l'attente et l'exécution en cours (client parti), et attend la fin des
+        annulations : slot du backend LLM rendu avant de quitter la session.
+        """
+        tasks = [task for task in (self._timer, self._running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,151 @@
+"""
+Registre de clients LLM — pool de connexions partagé par tout le process.
+
+Un client AsyncOpenAI (et son httpx.AsyncClient) par triplet (provider, base_url, api_key),
+créé à la première utilisation puis réutilisé par /process-generic, /structure
+et /process : keep-alive HTTP vers Ollama, pas de handshake TCP/TLS par requête,
+appels LLM sans bloquer la boucle d'événements.
+Fermeture propre via aclose_all() dans le lifespan FastAPI.
+Registre borné (LLM_REGISTRY_SIZE, base_url pouvant venir de la requête) : le client le moins
+récemment utilisé est retiré puis fermé après LLM_CLIENT_CLOSE_DELAY (appels en cours terminés).
+Event hooks httpx : tentatives et durées LLM relevées pour les métriques (services.metrics).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from services.metrics import HTTPX_ASYNC_HOOKS
+
+logger = logging.getLogger("ai-cortex.llm_clients")
+
+# 5 min pour tous les timeouts (Ollama lent en local) — connect, read, write, pool
+LLM_TIMEOUT = httpx.Timeout(
+    300.0,
+    connect=300.0,
+    read=300.0,
+    write=300.0,
+    pool=300.0,
+)
+
+# Limites du pool de connexions (par backend)
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "120"))
+
+LLM_POOL_LIMITS = httpx.Limits(
+    max_connections=LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+)
+
+# Clients gardés (un par provider / base_url / clé) et délai de fermeture d'un client retiré
+LLM_REGISTRY_SIZE = int(os.getenv("LLM_REGISTRY_SIZE", "64"))
+LLM_CLIENT_CLOSE_DELAY = float(os.getenv("LLM_CLIENT_CLOSE_DELAY", "600"))
+
+ClientKey = Tuple[str, str, str]
+
+_clients: "OrderedDict[ClientKey, AsyncOpenAI]" = OrderedDict()
+# Clients retirés du registre, pas encore fermés (fermés aussi par aclose_all)
+_retired: List[AsyncOpenAI] = []
+_closing: Set[asyncio.Task] = set()
+_evicted = 0
+_lock = threading.Lock()
+
+
+async def _close_later(client: AsyncOpenAI) -> None:
+    """Ferme un client retiré une fois ses appels en cours terminés."""
+    await asyncio.sleep(LLM_CLIENT_CLOSE_DELAY)
+    with _lock:
+        if client not in _retired:
+            return
+        _retired.remove(client)
+    try:
+        await client.close()
+    except Exception as e:  # noqa: BLE001
+        logger.warning("Error closing evicted async LLM client: %s", e)
+
+
+def _evict() -> None:
+    """Retire les clients les moins récemment utilisés au-delà de LLM_REGISTRY_SIZE (sous _lock)."""
+    global _evicted
+    while len(_clients) > LLM_REGISTRY_SIZE:
+        (provider, base_url, _), client = _clients.popitem(last=False)
+        _evicted += 1
+        _retired.append(client)
+        logger.info("Evicting pooled async %s client at %s (registry full)", provider, base_url)
+        try:
+            task = asyncio.get_running_loop().create_task(_close_later(client))
+        except RuntimeError:
+            continue  # hors boucle : fermé par aclose_all
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+
+def get_async_client(provider: str, base_url: str, api_key: Optional[str]) -> AsyncOpenAI:
+    """
+    Retourne le client AsyncOpenAI compatible partagé pour (provider, base_url, api_key).
+
+    - max_retries=0 : pas de retries automatiques côté SDK (instructor gère les siens).
+    - Timeout LLM_TIMEOUT, pool LLM_POOL_LIMITS avec keep-alive.
+    - Au plus LLM_REGISTRY_SIZE clients (LRU), voir _evict.
+    """
+    key: ClientKey = (provider, base_url, api_key or "")
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+        else:
+            logger.info(
+                "Creating pooled async %s client at %s (max_connections=%d, keepalive=%d)",
+                provider, base_url, LLM_POOL_MAX_CONNECTIONS, LLM_POOL_MAX_KEEPALIVE,
+            )
+            http_client = httpx.AsyncClient(
+                timeout=LLM_TIMEOUT, limits=LLM_POOL_LIMITS, event_hooks=HTTPX_ASYNC_HOOKS,
+            )
+            client = AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=http_client,
+                max_retries=0,
+            )
+            _clients[key] = client
+            _evict()
+    return client
+
+
+async def aclose_all() -> None:
+    """Ferme tous les clients du registre (arrêt de l'application)."""
+    with _lock:
+        clients = [*_clients.values(), *_retired]
+        _clients.clear()
+        _retired.clear()
+    for task in list(_closing):
+        task.cancel()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Error closing async LLM client: %s", e)
+    if clients:
+        logger.info("Closed %d pooled async LLM client(s)", len(clients))
+
+
+def pool_stats() -> Dict[str, object]:
+    """État du registre (exposé sur /health)."""
+    return {
+        "clients": len(_clients),
+        "max_clients": LLM_REGISTRY_SIZE,
+        "evicted": _evicted,
+        "max_connections": LLM_POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": LLM_POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": LLM_POOL_KEEPALIVE_EXPIRY,
+    }
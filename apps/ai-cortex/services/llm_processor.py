@@ -9,12 +9,23 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Literal
+import re
+from dataclasses import dataclass
+from typing import List, Literal, Tuple, Type, Union
 
-import instructor
-from openai import OpenAI
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ValidationError
 
-from domain.schemas import ConsultationModel
+from domain.schemas import ConsultationChunkModel, ConsultationModel
+from services import llm_clients, metrics
+from services.admission import BackendSaturated
+from services.chunking import map_chunks, merge_consultations, split_text
+from services.grammar import LLM_DECODING, constrained_create
+from services.llm_router import Backend, NoBackendAvailable, configure_pool, get_router, parse_backends
+from services.prompt_builder import compact_model, instructor_json_messages, json_mode_client
+from services.result_cache import get_result_cache, make_key
+from services.schema_compiler import schema_hash
+from services.usage_ledger import LLMUsage, get_usage_ledger
 
 logger = logging.getLogger("ai-cortex.llm_processor")
 
@@ -27,71 +38,279 @@ SYSTEM_PROMPT = (
     "medications (name, dosage, duration). Pas de markdown ni texte hors JSON."
 )
 
+# Morceau d'un texte long : pas de transcript à recopier (le texte complet est posé sur la fusion)
+CHUNK_SYSTEM_PROMPT = (
+    "Tu es un assistant médical expert. Extrais les entités cliniques de cet extrait de consultation. "
+    "Sois précis sur les codes CIM-10 si possible. "
+    "Réponds UNIQUEMENT par un JSON valide conforme au schéma : "
+    "patientId (id court si absent, ex. pat-001), "
+    "symptoms (liste de chaînes, vide si aucun), diagnosis (code, label, confidence 0–1, vide si aucun), "
+    "medications (name, dosage, duration). Pas de markdown ni texte hors JSON."
+)
+
 DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 MAX_RETRIES = int(os.getenv("INSTRUCTOR_MAX_RETRIES", "3"))
 
+# Hash du schéma de sortie (clé du cache de résultats)
+CONSULTATION_SCHEMA_HASH = schema_hash(ConsultationModel.model_json_schema())
+CONSULTATION_CHUNK_SCHEMA_HASH = schema_hash(ConsultationChunkModel.model_json_schema())
+
+
+# Pool de routage de /process : PROCESS_LLM_BACKENDS (même format que LLM_BACKENDS),
+# défaut OPENAI_BASE_URL seul avec LLM_MODEL.
+PROCESS_POOL = "process"
+configure_pool(
+    PROCESS_POOL,
+    parse_backends(os.getenv("PROCESS_LLM_BACKENDS"), "openai", DEFAULT_MODEL)
+    or [Backend(os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"), DEFAULT_MODEL, provider="openai")],
+)
+
+
+# Cascade (mode CASCADE) : petit modèle rapide d'abord, escalade vers LLM_MODEL (PRECISE)
+# si la sortie est invalide, peu confiante ou sans code CIM-10 plausible.
+# Pool du niveau rapide : CASCADE_FAST_BACKENDS (même format), défaut OPENAI_BASE_URL.
+CASCADE_FAST_MODEL = os.getenv("CASCADE_FAST_MODEL", "llama3.2:3b")
+CASCADE_FAST_MAX_RETRIES = int(os.getenv("CASCADE_FAST_MAX_RETRIES", "1"))
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.6"))
+CASCADE_FAST_POOL = "process-fast"
+configure_pool(
+    CASCADE_FAST_POOL,
+    parse_backends(os.getenv("CASCADE_FAST_BACKENDS"), "openai", CASCADE_FAST_MODEL)
+    or [Backend(os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"), CASCADE_FAST_MODEL, provider="openai")],
+)
+
+# Forme d'un code CIM-10 : lettre, deux chiffres, extension optionnelle (J11.1, I10, S72.001)
+_CIM10_RE = re.compile(r"^[A-Z]\d{2}(?:\.?[0-9A-Z]{1,4})?$")
+
+
+@dataclass(frozen=True)
+class _Tier:
+    """Niveau de modèle : pool de routage, modèle, température, retries instructor."""
+    pool: str
+    model: str
+    temperature: float
+    max_retries: int
+
 
-def _get_client() -> OpenAI:
+def _tier_for(mode: str) -> _Tier:
+    """FAST / PRECISE : même modèle (LLM_MODEL), température différente."""
+    return _Tier(
+        pool=PROCESS_POOL,
+        model=os.getenv("LLM_MODEL", DEFAULT_MODEL),
+        temperature=0.4 if mode == "FAST" else 0.1,
+        max_retries=MAX_RETRIES,
+    )
+
+
+def _fast_tier() -> _Tier:
+    return _Tier(
+        pool=CASCADE_FAST_POOL,
+        model=CASCADE_FAST_MODEL,
+        temperature=0.1,
+        max_retries=CASCADE_FAST_MAX_RETRIES,
+    )
+
+
+class CascadeDecision(BaseModel):
+    """Décision de la cascade (renvoyée dans la réponse de /process en mode CASCADE)."""
+    tier: Literal["fast", "precise"]
+    escalated: bool
+    reasons: List[str]
+    fast_model: str
+    model: str
+
+
+def escalation_reasons(consultation: ConsultationModel) -> List[str]:
+    """Raisons d'escalader une sortie du niveau rapide (liste vide : résultat accepté)."""
+    reasons: List[str] = []
+    confidences = [d.confidence for d in consultation.diagnosis]
+    if confidences and min(confidences) < CASCADE_MIN_CONFIDENCE:
+        reasons.append("low_confidence")
+    if not any(_CIM10_RE.match(d.code.strip().upper()) for d in consultation.diagnosis):
+        reasons.append("no_cim10_code")
+    return reasons
+
+
+def _api_key() -> str:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError(
             "OPENAI_API_KEY est requis. Définissez-la dans .env ou l'environnement."
         )
-    base = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    return OpenAI(
-        base_url=base,
-        api_key=api_key,
-    )
+    return api_key
+
+
+def _get_client(backend: Backend) -> AsyncOpenAI:
+    return llm_clients.get_async_client("openai", backend.base_url, backend.api_key or _api_key())
+
 
+def _patched_client(backend: Backend):
+    """Client AsyncOpenAI du nœud patché avec instructor (mode JSON).
 
-def _patched_client():
-    """Client OpenAI patché avec instructor ; retries sur parsing/validation."""
-    client = _get_client()
+    Les retries sur parsing/validation (MAX_RETRIES) sont passés à chaque create().
+    """
+    client = _get_client(backend)
     try:
-        return instructor.from_openai(
-            client,
-            mode=instructor.Mode.JSON,
-            max_retries=MAX_RETRIES,
-            retry_if_parsing_fails=True,
-            throw_error=True,
-        )
+        # Copie indentée du schéma d'instructor retirée (services.prompt_builder)
+        return json_mode_client(client)
     except Exception as e:
         logger.exception("init instructor client: %s", e)
         raise
 
 
-def structure_text(
+async def structure_text(
     text: str,
-    mode: Literal["FAST", "PRECISE"] = "FAST",
+    mode: Literal["FAST", "PRECISE", "CASCADE"] = "FAST",
 ) -> ConsultationModel:
+    """Extrait une Consultation structurée depuis du texte brut (voir structure_text_with_usage)."""
+    consultation, _ = await structure_text_with_usage(text, mode)
+    return consultation
+
+
+async def structure_text_with_usage(
+    text: str,
+    mode: Literal["FAST", "PRECISE", "CASCADE"] = "FAST",
+) -> Tuple[ConsultationModel, LLMUsage]:
     """
-    Extrait une Consultation structurée depuis du texte brut.
+    Extrait une Consultation structurée depuis du texte brut, avec l'usage en tokens.
 
     - FAST : temperature 0.4, réponse plus rapide.
     - PRECISE : temperature 0.1, focus CIM-10 et précision.
+    - CASCADE : voir structure_text_cascade.
 
-    Instructor gère les retries en cas de JSON malformé / validation Pydantic.
+    Instructor gère les retries en cas de JSON malformé / validation Pydantic
+    (LLM_DECODING=json_schema / gbnf : sortie contrainte par grammaire, reask seulement
+    sur une contrainte hors grammaire).
     Ne lève jamais d'erreur de parsing brute vers l'appelant.
+    Résultat servi depuis le cache de résultats (opt-in) pour un texte déjà structuré.
+    Appel routé sur le pool PROCESS_POOL (failover entre nœuds, admission par nœud) :
+    BackendSaturated / NoBackendAvailable remontent tels quels.
+    Usage : tokens cumulés sur les retries instructor (zéro si servi depuis le cache),
+    enregistré dans le registre d'usage.
+    Texte long (> CHUNK_MAX_CHARS) : structuré par morceaux en parallèle puis fusionné
+    (services.chunking), usage cumulé sur les morceaux.
+    """
+    if mode == "CASCADE":
+        consultation, usage, _ = await structure_text_cascade(text)
+        return consultation, usage
+    return await _structure_chunked(text, mode, _tier_for(mode))
+
+
+async def structure_text_cascade(text: str) -> Tuple[ConsultationModel, LLMUsage, CascadeDecision]:
+    """
+    Cascade de modèles : CASCADE_FAST_MODEL d'abord (CASCADE_FAST_MAX_RETRIES tentatives),
+    puis LLM_MODEL en PRECISE si la sortie rapide est invalide, si une confiance de diagnostic
+    est sous CASCADE_MIN_CONFIDENCE, ou si aucun code ne ressemble à un code CIM-10.
+    L'usage couvre les deux niveaux.
     """
-    patched = _patched_client()
-    temperature = 0.4 if mode == "FAST" else 0.1
-    model = os.getenv("LLM_MODEL", DEFAULT_MODEL)
+    precise = _tier_for("PRECISE")
+    fast = _fast_tier()
+    fast_usage = LLMUsage()
+    try:
+        consultation, fast_usage = await _structure_chunked(text, "CASCADE", fast)
+        reasons = escalation_reasons(consultation)
+    except (BackendSaturated, NoBackendAvailable) as e:
+        logger.info("cascade: fast tier unavailable (%s), escalating", e)
+        reasons = ["fast_unavailable"]
+    except RuntimeError as e:
+        logger.info("cascade: fast tier failed (%s), escalating", e.__cause__ or e)
+        reasons = ["fast_failed"]
+
+    if not reasons:
+        decision = CascadeDecision(tier="fast", escalated=False, reasons=[], fast_model=fast.model, model=fast.model)
+        metrics.count_cascade("fast", [])
+        return consultation, fast_usage, decision
+
+    consultation, precise_usage = await _structure_chunked(text, "PRECISE", precise)
+    decision = CascadeDecision(
+        tier="precise", escalated=True, reasons=reasons, fast_model=fast.model, model=precise.model,
+    )
+    metrics.count_cascade("precise", reasons)
+    return consultation, LLMUsage.total([fast_usage, precise_usage]), decision
+
 
+async def _structure_chunked(text: str, mode: str, tier: _Tier) -> Tuple[ConsultationModel, LLMUsage]:
+    """Un appel, ou map-reduce par morceaux pour un texte long."""
+    chunks = split_text(text)
+    if len(chunks) == 1:
+        return await _structure_single(text, mode, tier)
+
+    results = await map_chunks(chunks, lambda chunk: _structure_single(chunk, mode, tier, chunked=True))
+    # Seule la fusion est validée selon ConsultationModel, transcript = texte d'origine
+    merged = merge_consultations([part.model_dump() for part, _ in results], transcript=text)
     try:
-        response = patched.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Texte à analyser:\n\n{text}"},
-            ],
-            response_model=ConsultationModel,
+        consultation = ConsultationModel.model_validate(merged)
+    except ValidationError as e:
+        raise RuntimeError(f"Fusion des morceaux invalide: {e!s}") from e
+    logger.info("structure_text: %d chars structured in %d chunks", len(text), len(chunks))
+    return consultation, LLMUsage.total(usage for _, usage in results)
+
+
+async def _structure_single(
+    text: str, mode: str, tier: _Tier, chunked: bool = False,
+) -> Tuple[Union[ConsultationModel, ConsultationChunkModel], LLMUsage]:
+    """
+    Un appel de structuration (cache, routage, retries) — voir structure_text_with_usage.
+
+    chunked : morceau d'un texte long, ConsultationChunkModel (sans transcript) et CHUNK_SYSTEM_PROMPT.
+    """
+    temperature = tier.temperature
+    model = tier.model
+    response_model: Type[BaseModel] = ConsultationChunkModel if chunked else ConsultationModel
+    system_prompt = CHUNK_SYSTEM_PROMPT if chunked else SYSTEM_PROMPT
+    structure_hash = CONSULTATION_CHUNK_SCHEMA_HASH if chunked else CONSULTATION_SCHEMA_HASH
+
+    cache = get_result_cache()
+    cache_key = make_key(
+        "process", model, mode, temperature, system_prompt, structure_hash, text,
+    )
+    cached = await cache.aget(cache_key)
+    if cached is not None:
+        return response_model.model_validate(cached), LLMUsage()
+
+    _api_key()  # erreur de configuration (ValueError) avant tout appel
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Texte à analyser:\n\n{text}"},
+    ]
+
+    async def attempt(backend: Backend) -> BaseModel:
+        if LLM_DECODING != "instructor":
+            # Sortie contrainte par grammaire : forme garantie, reask seulement hors grammaire (services.grammar)
+            return await constrained_create(
+                _get_client(backend),
+                model=backend.model,
+                messages=messages,
+                response_model=response_model,
+                temperature=temperature,
+                max_retries=tier.max_retries,
+            )
+        patched = _patched_client(backend)
+        return await patched.chat.completions.create(
+            model=backend.model,
+            # Schéma compact minifié une seule fois dans le message système (services.prompt_builder)
+            messages=instructor_json_messages(messages, response_model),
+            response_model=compact_model(response_model),
             temperature=temperature,
+            max_retries=tier.max_retries,
         )
+
+    try:
+        with metrics.llm_call("process", "openai", model, mode, decoding=LLM_DECODING) as stats:
+            response = await get_router(tier.pool).execute(attempt)
+            stats.record_result(response)
+    except (BackendSaturated, NoBackendAvailable):
+        raise
     except Exception as e:  # instructor retries épuisées, timeout, etc.
+        metrics.count_error("process", "openai", model, e)
         logger.warning("structure_text failed after retries: %s", e)
         raise RuntimeError(
             "Structuration impossible après plusieurs tentatives. "
             "Vérifiez OPENAI_API_KEY et le modèle."
         ) from e
 
-    return response
+    usage = LLMUsage.from_stats(stats)
+    get_usage_ledger().record("process", "openai", model, mode, structure_hash, usage)
+    await cache.aset(cache_key, response.model_dump())
+    return response, usage
@@ -0,0 +1,403 @@
+"""
+Routage multi-backend LLM — répartition de charge, circuit breaker, failover.
+
+Plusieurs hôtes Ollama servent ensemble un même pool :
+- configuration LLM_BACKENDS (liste de base_url / modèle / poids),
+- sélection least-outstanding-requests (défaut) ou latence EWMA (LLM_ROUTING_STRATEGY=ewma),
+- sondes de santé périodiques (GET {base_url}/models),
+- circuit breaker : un nœud en échec répété est retiré pendant LLM_CB_COOLDOWN secondes,
+- en cas d'échec de connexion / timeout / 5xx / saturation, la requête est rejouée sur un autre nœud.
+
+Chaque tentative passe par le governor d'admission du nœud choisi (services.admission).
+Pools d'un seul nœud pour une base_url explicite : au plus LLM_REGISTRY_SIZE, le moins
+récemment utilisé sans appel en cours est retiré.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, TypeVar
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from services import metrics
+from services.admission import BackendGovernor, BackendSaturated, get_governor
+
+logger = logging.getLogger("ai-cortex.llm_router")
+
+LLM_ROUTING_STRATEGY = os.getenv("LLM_ROUTING_STRATEGY", "least_outstanding").lower()
+LLM_ROUTE_MAX_ATTEMPTS = int(os.getenv("LLM_ROUTE_MAX_ATTEMPTS", "3"))
+LLM_CB_FAILURE_THRESHOLD = int(os.getenv("LLM_CB_FAILURE_THRESHOLD", "3"))
+LLM_CB_COOLDOWN = float(os.getenv("LLM_CB_COOLDOWN", "30"))
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "15"))
+LLM_HEALTH_TIMEOUT = float(os.getenv("LLM_HEALTH_TIMEOUT", "5"))
+LLM_REGISTRY_SIZE = int(os.getenv("LLM_REGISTRY_SIZE", "64"))
+
+# Lissage de la latence par nœud (stratégie ewma)
+_EWMA_ALPHA = 0.3
+
+T = TypeVar("T")
+
+
+class NoBackendAvailable(Exception):
+    """Aucun nœud du pool n'est disponible (circuits ouverts / sondes en échec)."""
+
+    def __init__(self, pool: str) -> None:
+        self.pool = pool
+        super().__init__(f"No LLM backend available in pool '{pool}'")
+
+
+@dataclass
+class Backend:
+    """Un nœud LLM (base_url OpenAI compatible) et son état de routage."""
+
+    base_url: str
+    model: str
+    weight: float = 1.0
+    provider: str = "ollama"
+    api_key: Optional[str] = None
+    outstanding: int = 0
+    ewma_latency: float = 0.0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    circuit: Literal["closed", "open", "half_open"] = "closed"
+    opened_at: float = 0.0
+    successes: int = 0
+    failures: int = 0
+    _trial_in_flight: bool = field(default=False, repr=False)
+
+    def available(self, now: float) -> bool:
+        """Sélectionnable : sonde OK et circuit fermé, ou demi-ouvert sans essai en cours."""
+        if not self.healthy:
+            return False
+        if self.circuit == "open" and now - self.opened_at >= LLM_CB_COOLDOWN:
+            self.circuit = "half_open"
+        if self.circuit == "half_open":
+            return not self._trial_in_flight
+        return self.circuit == "closed"
+
+    def score(self) -> float:
+        load = (self.outstanding + 1) / max(self.weight, 1e-6)
+        if LLM_ROUTING_STRATEGY == "ewma":
+            # Latence inconnue → 0 : le nœud est essayé au moins une fois
+            return self.ewma_latency * load
+        return load
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.circuit != "closed":
+            logger.info("Circuit closed for %s", self.base_url)
+        self.circuit = "closed"
+        if self.ewma_latency:
+            self.ewma_latency += _EWMA_ALPHA * (latency - self.ewma_latency)
+        else:
+            self.ewma_latency = latency
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.circuit == "half_open" or self.consecutive_failures >= LLM_CB_FAILURE_THRESHOLD:
+            if self.circuit != "open":
+                logger.warning(
+                    "Circuit opened for %s (%d consecutive failures, cooldown %ss)",
+                    self.base_url, self.consecutive_failures, LLM_CB_COOLDOWN,
+                )
+            self.circuit = "open"
+            self.opened_at = time.monotonic()
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "circuit": self.circuit,
+            "outstanding": self.outstanding,
+            "ewma_latency": round(self.ewma_latency, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+@dataclass(frozen=True)
+class Lease:
+    """Nœud réservé par Router.lease : slot d'admission, et essai demi-ouvert s'il l'a pris."""
+
+    backend: Backend
+    governor: BackendGovernor
+    trial: bool = False
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Erreur imputable au nœud (connexion, timeout, 5xx) → failover et circuit breaker."""
+    seen: Set[int] = set()
+    current: Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, (APIConnectionError, APITimeoutError, httpx.TransportError)):
+            return True
+        if isinstance(current, APIStatusError) and current.status_code >= 500:
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+class Router:
+    """Pool de nœuds LLM : sélection, bail (lease) avec admission, failover."""
+
+    def __init__(self, name: str, backends: List[Backend]) -> None:
+        if not backends:
+            raise ValueError(f"LLM pool '{name}' has no backend")
+        self.name = name
+        self.backends = backends
+
+    def pick(self, exclude: Set[str]) -> Optional[Backend]:
+        """Nœud disponible de meilleur score (ex aequo départagés au hasard)."""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.base_url not in exclude and b.available(now)]
+        if not candidates:
+            return None
+        best = min(b.score() for b in candidates)
+        return random.choice([b for b in candidates if b.score() == best])
+
+    async def lease(self, exclude: Optional[Set[str]] = None) -> Lease:
+        """
+        Réserve un nœud : sélection puis slot d'admission.
+
+        Un nœud saturé est écarté au profit du suivant ; lève BackendSaturated si tous
+        le sont, NoBackendAvailable si aucun nœud n'est disponible.
+        Circuit demi-ouvert : l'essai est pris dès la sélection (avant l'attente d'admission),
+        le bail le porte (Lease.trial) et seul ce bail le rend.
+        """
+        tried = set(exclude or ())
+        saturated: Optional[BackendSaturated] = None
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                if saturated is not None:
+                    raise saturated
+                raise NoBackendAvailable(self.name)
+            tried.add(backend.base_url)
+            governor = get_governor(backend.base_url)
+            trial = backend.circuit == "half_open"
+            if trial:
+                backend._trial_in_flight = True
+            try:
+                await governor.acquire()
+            except BaseException as e:
+                if trial:
+                    backend._trial_in_flight = False
+                if isinstance(e, BackendSaturated):
+                    saturated = e
+                    continue
+                raise
+            backend.outstanding += 1
+            return Lease(backend, governor, trial)
+
+    def check_admission(self) -> Backend:
+        """
+        Admission sans réservation : nœud qui accepterait un appel maintenant.
+
+        Pour les réponses en flux, rejetées en 429/503 avant l'envoi des en-têtes, le bail
+        n'étant pris qu'au démarrage du flux. Lève BackendSaturated / NoBackendAvailable.
+        """
+        tried: Set[str] = set()
+        saturated: Optional[BackendSaturated] = None
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                if saturated is not None:
+                    raise saturated
+                raise NoBackendAvailable(self.name)
+            tried.add(backend.base_url)
+            try:
+                get_governor(backend.base_url).check()
+            except BackendSaturated as e:
+                saturated = e
+                continue
+            return backend
+
+    def release(self, lease: Lease, elapsed: float, failed: Optional[bool]) -> None:
+        """
+        Rend le nœud réservé et enregistre le résultat (latence / échec).
+
+        failed=None : appel annulé (client parti, morceau voisin en échec) — slot rendu,
+        aucun résultat imputé au nœud.
+        """
+        backend = lease.backend
+        backend.outstanding -= 1
+        if lease.trial:
+            backend._trial_in_flight = False
+        lease.governor.release(elapsed)
+        if failed is None:
+            return
+        if failed:
+            backend.record_failure()
+        else:
+            backend.record_success(elapsed)
+
+    async def execute(self, fn: Callable[[Backend], Awaitable[T]]) -> T:
+        """
+        Exécute fn(backend) sur le meilleur nœud, rejoue sur un autre en cas d'échec du nœud.
+
+        Les autres erreurs (validation, 4xx) sont relancées telles quelles sans failover.
+        """
+        tried: Set[str] = set()
+        last_exc: Optional[BaseException] = None
+        for _ in range(max(1, min(LLM_ROUTE_MAX_ATTEMPTS, len(self.backends)))):
+            try:
+                lease = await self.lease(tried)
+            except (BackendSaturated, NoBackendAvailable):
+                if last_exc is not None:
+                    raise last_exc
+                raise
+            backend = lease.backend
+            tried.add(backend.base_url)
+            # Retries comptés par nœud : le rejeu sur un autre nœud est un failover (services.metrics)
+            metrics.begin_backend_attempt(failover=last_exc is not None)
+            start = time.monotonic()
+            # None tant que l'appel n'a pas abouti : une annulation (BaseException) rend le slot
+            failed: Optional[bool] = None
+            try:
+                result = await fn(backend)
+                failed = False
+            except Exception as e:
+                failed = is_backend_failure(e)
+                if not failed:
+                    raise
+                logger.warning("[%s] backend %s failed: %s", self.name, backend.base_url, e)
+                last_exc = e
+                continue
+            finally:
+                self.release(lease, time.monotonic() - start, failed)
+            return result
+        assert last_exc is not None
+        raise last_exc
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        """Sonde de santé de chaque nœud (GET {base_url}/models)."""
+
+        async def probe_one(backend: Backend) -> None:
+            headers = {"Authorization": f"Bearer {backend.api_key}"} if backend.api_key else {}
+            try:
+                response = await client.get(f"{backend.base_url.rstrip('/')}/models", headers=headers)
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                logger.warning("[%s] backend %s is now %s", self.name, backend.base_url,
+                               "healthy" if healthy else "unhealthy")
+            backend.healthy = healthy
+
+        await asyncio.gather(*(probe_one(b) for b in self.backends))
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "strategy": LLM_ROUTING_STRATEGY,
+            "backends": [b.state() for b in self.backends],
+        }
+
+
+def parse_backends(
+    spec: Optional[str],
+    provider: str,
+    default_model: str,
+    api_key: Optional[str] = None,
+) -> List[Backend]:
+    """
+    Parse une configuration de pool.
+
+    - JSON : [{"base_url": "...", "model": "llama3", "weight": 2}, ...]
+    - compacte : "http://h1:11434/v1|llama3|2,http://h2:11434/v1|llama3"
+    """
+    if not spec or not spec.strip():
+        return []
+    spec = spec.strip()
+    entries: List[Dict[str, Any]] = []
+    if spec.startswith("["):
+        entries = json.loads(spec)
+    else:
+        for item in spec.split(","):
+            parts = [p.strip() for p in item.split("|")]
+            if not parts[0]:
+                continue
+            entry: Dict[str, Any] = {"base_url": parts[0]}
+            if len(parts) > 1 and parts[1]:
+                entry["model"] = parts[1]
+            if len(parts) > 2 and parts[2]:
+                entry["weight"] = float(parts[2])
+            entries.append(entry)
+    return [
+        Backend(
+            base_url=e["base_url"],
+            model=e.get("model") or default_model,
+            weight=float(e.get("weight", 1.0)),
+            provider=provider,
+            api_key=e.get("api_key", api_key),
+        )
+        for e in entries
+    ]
+
+
+_routers: Dict[str, Router] = {}
+# Pools d'un seul nœud (base_url de la requête), bornés à LLM_REGISTRY_SIZE
+_single_routers: "OrderedDict[str, Router]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def configure_pool(name: str, backends: List[Backend]) -> Router:
+    """Déclare (ou remplace) le pool `name`."""
+    with _lock:
+        router = Router(name, backends)
+        _routers[name] = router
+    logger.info("LLM pool '%s': %s", name, ", ".join(f"{b.base_url} ({b.model}, w={b.weight})" for b in backends))
+    return router
+
+
+def get_router(name: str) -> Router:
+    return _routers[name]
+
+
+def get_single_router(provider: str, base_url: str, model: str, api_key: Optional[str]) -> Router:
+    """Pool d'un seul nœud pour une base_url explicite (même circuit breaker / admission)."""
+    name = f"{provider}:{base_url}"
+    with _lock:
+        router = _single_routers.get(name)
+        if router is not None:
+            _single_routers.move_to_end(name)
+            return router
+        router = Router(name, [Backend(base_url, model, provider=provider, api_key=api_key)])
+        _single_routers[name] = router
+        excess = len(_single_routers) - LLM_REGISTRY_SIZE
+        if excess > 0:
+            # Un pool avec un appel en cours reste : son bail rend le nœud à la fin
+            idle = [n for n, r in _single_routers.items() if n != name and r.backends[0].outstanding == 0]
+            for n in idle[:excess]:
+                del _single_routers[n]
+    return router
+
+
+def routers_state() -> Dict[str, Any]:
+    """État des pools (exposé sur /health)."""
+    routers = {**_routers, **_single_routers}
+    return {name: router.state() for name, router in routers.items()}
+
+
+async def run_health_checks() -> None:
+    """Boucle de sondes de santé (tâche de fond démarrée dans le lifespan)."""
+    async with httpx.AsyncClient(timeout=LLM_HEALTH_TIMEOUT) as client:
+        while True:
+            for router in list(_routers.values()):
+                if len(router.backends) > 1:
+                    await router.probe(client)
+            await asyncio.sleep(LLM_HEALTH_INTERVAL)
@@ -0,0 +1,266 @@
+"""
+Métriques Prometheus — latences du chemin chaud et consommation LLM.
+
+Exposées sur GET /metrics (format texte Prometheus) :
+- aicortex_request_duration_seconds : latence de bout en bout par endpoint HTTP,
+- aicortex_llm_call_duration_seconds : durée des échanges HTTP avec le LLM (toutes tentatives),
+- aicortex_schema_build_duration_seconds : JSON Schema → modèle Pydantic,
+- aicortex_validation_duration_seconds : parsing + validation de la sortie LLM,
+- aicortex_llm_retries : tentatives supplémentaires par appel (retries instructor, nœud qui a répondu),
+- aicortex_llm_failovers_total : appels rejoués sur un autre nœud du pool (services.llm_router),
+- aicortex_llm_errors_total : erreurs LLM par classe (connection, timeout, api_key, other),
+- aicortex_llm_tokens_total : tokens prompt / completion.
+Labels LLM : endpoint, provider, model, mode.
+
+Les tentatives sont comptées par des event hooks httpx posés sur les clients poolés
+(services.llm_clients) et rattachées à l'appel en cours via une ContextVar ; Router.execute
+les remet à zéro à chaque nœud essayé (begin_backend_attempt) : un failover n'est pas un retry.
+prometheus_client est optionnel : sans lui les métriques sont des no-op et /metrics répond 503.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+import httpx
+from pydantic import ValidationError
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+    METRICS_ENABLED = True
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    METRICS_ENABLED = False
+
+# decoding : instructor (retries sur JSON invalide) | json_schema | gbnf (services.grammar)
+LLM_LABELS = ("endpoint", "provider", "model", "mode", "decoding")
+
+# Appels LLM : de la seconde (petit modèle, GPU) à plusieurs minutes (Ollama CPU)
+_LLM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+_RETRY_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+
+class _NoopMetric:
+    """Métrique inerte (prometheus_client absent)."""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+
+if METRICS_ENABLED:
+    REQUEST_DURATION = Histogram(
+        "aicortex_request_duration_seconds",
+        "Latence de bout en bout des requêtes HTTP (jusqu'à l'envoi des en-têtes pour les flux)",
+        ("endpoint", "method", "status"),
+        buckets=_LLM_BUCKETS,
+    )
+    LLM_CALL_DURATION = Histogram(
+        "aicortex_llm_call_duration_seconds",
+        "Durée des échanges HTTP avec le LLM pour un appel de structuration (toutes tentatives)",
+        LLM_LABELS,
+        buckets=_LLM_BUCKETS,
+    )
+    SCHEMA_BUILD_DURATION = Histogram(
+        "aicortex_schema_build_duration_seconds",
+        "Construction du modèle Pydantic depuis le JSON Schema (cache compris)",
+        ("endpoint",),
+        buckets=_FAST_BUCKETS,
+    )
+    VALIDATION_DURATION = Histogram(
+        "aicortex_validation_duration_seconds",
+        "Parsing et validation de la sortie LLM (après la dernière réponse HTTP)",
+        LLM_LABELS,
+        buckets=_FAST_BUCKETS,
+    )
+    LLM_RETRIES = Histogram(
+        "aicortex_llm_retries",
+        "Tentatives supplémentaires par appel de structuration (retries instructor, 0 en décodage contraint)",
+        LLM_LABELS,
+        buckets=_RETRY_BUCKETS,
+    )
+    LLM_FAILOVERS = Counter(
+        "aicortex_llm_failovers_total",
+        "Appels de structuration rejoués sur un autre nœud après un échec (connexion, timeout, 5xx)",
+        LLM_LABELS,
+    )
+    LLM_ERRORS = Counter(
+        "aicortex_llm_errors_total",
+        "Erreurs d'appel LLM par classe",
+        ("endpoint", "provider", "model", "error_class"),
+    )
+    LLM_TOKENS = Counter(
+        "aicortex_llm_tokens_total",
+        "Tokens consommés (usage de la complétion, retries compris)",
+        ("endpoint", "provider", "model", "kind"),
+    )
+    CASCADE_DECISIONS = Counter(
+        "aicortex_cascade_decisions_total",
+        "Décisions de la cascade de modèles (niveau retenu, raison d'escalade)",
+        ("tier", "reason"),
+    )
+else:
+    REQUEST_DURATION = LLM_CALL_DURATION = SCHEMA_BUILD_DURATION = _NoopMetric()  # type: ignore[assignment]
+    VALIDATION_DURATION = LLM_RETRIES = LLM_ERRORS = LLM_TOKENS = _NoopMetric()  # type: ignore[assignment]
+    LLM_FAILOVERS = _NoopMetric()  # type: ignore[assignment]
+    CASCADE_DECISIONS = _NoopMetric()  # type: ignore[assignment]
+
+
+def error_class(exc: BaseException) -> str:
+    """Classe d'erreur LLM (mêmes critères que _handle_llm_error dans main.py)."""
+    if isinstance(exc, ValidationError):
+        # Sortie toujours non conforme au schéma après les retries
+        return "validation"
+    err_msg = str(exc).lower()
+    if "connection" in err_msg or "connect" in err_msg or "refused" in err_msg:
+        return "connection"
+    if "timeout" in err_msg or "timed out" in err_msg:
+        return "timeout"
+    if "api_key" in err_msg or "openai_api_key" in err_msg:
+        return "api_key"
+    return "other"
+
+
+def count_error(endpoint: str, provider: str, model: str, exc: BaseException) -> str:
+    """Incrémente le compteur d'erreurs LLM ; retourne la classe d'erreur."""
+    cls = error_class(exc)
+    LLM_ERRORS.labels(endpoint, provider, model, cls).inc()
+    return cls
+
+
+def count_cascade(tier: str, reasons: List[str]) -> None:
+    """Compte une décision de cascade (une fois par raison d'escalade, "none" si acceptée)."""
+    for reason in reasons or ["none"]:
+        CASCADE_DECISIONS.labels(tier, reason).inc()
+
+
+@dataclass
+class CallStats:
+    """Mesures d'un appel de structuration, alimentées par les hooks httpx."""
+
+    # Requêtes HTTP vers le nœud courant (retries instructor + 1) ; nœuds abandonnés à part
+    attempts: int = 0
+    failovers: int = 0
+    llm_seconds: float = 0.0
+    last_response_at: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    _request_started: Optional[float] = None
+
+    def record_result(self, result: Any) -> None:
+        """Relève l'usage de la complétion (cumulé sur les retries par instructor)."""
+        usage = getattr(getattr(result, "_raw_response", None), "usage", None)
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens or 0
+            self.completion_tokens = usage.completion_tokens or 0
+
+
+_current_call: ContextVar[Optional[CallStats]] = ContextVar("aicortex_llm_call", default=None)
+
+
+def _on_request_start() -> None:
+    stats = _current_call.get()
+    if stats is not None:
+        stats.attempts += 1
+        stats._request_started = time.monotonic()
+
+
+def _on_response_end() -> None:
+    stats = _current_call.get()
+    if stats is not None and stats._request_started is not None:
+        now = time.monotonic()
+        stats.llm_seconds += now - stats._request_started
+        stats.last_response_at = now
+        stats._request_started = None
+
+
+def begin_backend_attempt(failover: bool) -> None:
+    """Nouveau nœud pour l'appel en cours (Router.execute) : tentatives comptées par nœud."""
+    stats = _current_call.get()
+    if stats is not None:
+        stats.attempts = 0
+        if failover:
+            stats.failovers += 1
+
+
+async def _aon_request(_request: httpx.Request) -> None:
+    _on_request_start()
+
+
+async def _aon_response(_response: httpx.Response) -> None:
+    _on_response_end()
+
+
+#: event_hooks pour httpx.AsyncClient
+HTTPX_ASYNC_HOOKS = {"request": [_aon_request], "response": [_aon_response]}
+
+
+@contextmanager
+def llm_call(
+    endpoint: str,
+    provider: str,
+    model: str,
+    mode: str,
+    streaming: bool = False,
+    decoding: str = "instructor",
+) -> Iterator[CallStats]:
+    """
+    Mesure un appel de structuration (router.execute / create_partial).
+
+    En streaming, la durée LLM est celle du flux complet (le hook httpx ne voit que les en-têtes)
+    et la validation est mesurée par l'appelant (observe_validation).
+    """
+    stats = CallStats()
+    token = _current_call.set(stats)
+    start = time.monotonic()
+    try:
+        yield stats
+    finally:
+        try:
+            _current_call.reset(token)
+        except ValueError:
+            # Générateur de flux fermé depuis un autre contexte (déconnexion client)
+            pass
+    # Succès uniquement : les échecs sont comptés par count_error
+    end = time.monotonic()
+    labels = (endpoint, provider, model, mode, decoding)
+    LLM_CALL_DURATION.labels(*labels).observe(end - start if streaming else stats.llm_seconds)
+    LLM_RETRIES.labels(*labels).observe(max(stats.attempts - 1, 0))
+    if stats.failovers:
+        LLM_FAILOVERS.labels(*labels).inc(stats.failovers)
+    if not streaming and stats.last_response_at is not None:
+        VALIDATION_DURATION.labels(*labels).observe(end - stats.last_response_at)
+    if stats.prompt_tokens:
+        LLM_TOKENS.labels(endpoint, provider, model, "prompt").inc(stats.prompt_tokens)
+    if stats.completion_tokens:
+        LLM_TOKENS.labels(endpoint, provider, model, "completion").inc(stats.completion_tokens)
+
+
+def observe_validation(
+    endpoint: str, provider: str, model: str, mode: str, seconds: float, decoding: str = "instructor",
+) -> None:
+    VALIDATION_DURATION.labels(endpoint, provider, model, mode, decoding).observe(seconds)
+
+
+def observe_schema_build(endpoint: str, seconds: float) -> None:
+    SCHEMA_BUILD_DURATION.labels(endpoint).observe(seconds)
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    REQUEST_DURATION.labels(endpoint, method, str(status)).observe(seconds)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition texte Prometheus (corps, content-type)."""
+    if not METRICS_ENABLED:
+        raise RuntimeError("prometheus_client non installé")
+    return generate_latest(), CONTENT_TYPE_LATEST
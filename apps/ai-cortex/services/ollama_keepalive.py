@@ -0,0 +1,90 @@
+"""
+Maintien en mémoire des modèles Ollama (keep_alive) — le cache KV du préfixe survit.
+
+Décharger le modèle (par défaut après 5 min d'inactivité) perd aussi le préfixe
+déjà préempli (prompt système + schéma). L'API OpenAI compatible (/v1) ne transmet
+pas keep_alive et remet le délai par défaut du serveur à chaque appel : le worker
+ré-épingle donc périodiquement chaque modèle actif via l'API native
+(POST {hôte}/api/generate sans prompt : charge le modèle sans rien générer).
+
+OLLAMA_KEEP_ALIVE : durée Ollama ("30m", "-1" = permanent ; "" / "off" = désactivé).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Union
+
+import httpx
+
+from services.llm_router import Backend
+
+logger = logging.getLogger("ai-cortex.ollama_keepalive")
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()
+OLLAMA_KEEP_ALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEP_ALIVE_INTERVAL", "240"))
+OLLAMA_KEEP_ALIVE_TIMEOUT = float(os.getenv("OLLAMA_KEEP_ALIVE_TIMEOUT", "120"))
+
+# Dernier résultat par (hôte, modèle), exposé sur /health
+_pinned: Dict[str, bool] = {}
+
+
+def keep_alive_enabled() -> bool:
+    return OLLAMA_KEEP_ALIVE.lower() not in ("", "off", "false", "0")
+
+
+def native_url(base_url: str) -> str:
+    """URL de l'API native Ollama depuis la base_url OpenAI compatible (…/v1)."""
+    url = base_url.rstrip("/")
+    return url[: -len("/v1")] if url.endswith("/v1") else url
+
+
+def _keep_alive_value(raw: str) -> Union[int, str]:
+    """Ollama attend un entier (secondes, -1) ou une durée ("30m")."""
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+async def pin_models(client: httpx.AsyncClient, backends: List[Backend]) -> None:
+    """Charge / maintient chaque (hôte, modèle) du pool avec OLLAMA_KEEP_ALIVE."""
+
+    async def pin_one(backend: Backend) -> None:
+        key = f"{native_url(backend.base_url)}|{backend.model}"
+        try:
+            response = await client.post(
+                f"{native_url(backend.base_url)}/api/generate",
+                json={"model": backend.model, "keep_alive": _keep_alive_value(OLLAMA_KEEP_ALIVE)},
+            )
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if ok != _pinned.get(key):
+            if ok:
+                logger.info("Pinned Ollama model %s at %s (keep_alive=%s)",
+                            backend.model, backend.base_url, OLLAMA_KEEP_ALIVE)
+            else:
+                logger.warning("Could not pin Ollama model %s at %s", backend.model, backend.base_url)
+        _pinned[key] = ok
+
+    await asyncio.gather(*(pin_one(b) for b in backends if b.healthy))
+
+
+async def run_keep_alive(backends: List[Backend]) -> None:
+    """Boucle d'épinglage (tâche de fond démarrée dans le lifespan)."""
+    async with httpx.AsyncClient(timeout=OLLAMA_KEEP_ALIVE_TIMEOUT) as client:
+        while True:
+            await pin_models(client, backends)
+            await asyncio.sleep(OLLAMA_KEEP_ALIVE_INTERVAL)
+
+
+def keep_alive_state() -> Dict[str, Any]:
+    """État de l'épinglage (exposé sur /health)."""
+    return {
+        "keep_alive": OLLAMA_KEEP_ALIVE if keep_alive_enabled() else None,
+        "interval": OLLAMA_KEEP_ALIVE_INTERVAL,
+        "pinned": dict(_pinned),
+    }
@@ -0,0 +1,299 @@
+"""
+Construction des prompts de structuration — schéma compact, une seule fois.
+
+En mode JSON (Ollama), instructor concatène au message système le JSON Schema du
+response_model, indenté (json.dumps indent=2) ; en TOOLS, il part dans `tools`.
+/process-generic le répétait en plus, indenté, dans le message utilisateur : le
+préremplissage (prefill) doublait sur Ollama.
+
+PROMPT_SCHEMA_MODE :
+- "dedup" (défaut) : schéma absent du message utilisateur ; en mode JSON, schéma minifié
+  ajouté au message système et copie indentée d'instructor retirée avant l'envoi
+  (instructor_json_messages / json_mode_client) — en TOOLS, seul `tools` le porte,
+- "inline" : schéma minifié aussi dans les messages de /process-generic, même en TOOLS
+  (en mode JSON, la copie d'instructor est retirée de la même façon),
+- "full" : comportement historique (schéma indenté dans le message utilisateur, plus
+  celui d'instructor).
+
+Le schéma exposé au LLM est compacté : sans title, ni description / default
+(sauf PROMPT_SCHEMA_DESCRIPTIONS / PROMPT_SCHEMA_DEFAULTS). Modèles compacts et
+schémas rendus sont mis en cache (par modèle / par hash de schéma).
+
+PROMPT_LAYOUT :
+- "prefix" (défaut) : contenu statique d'abord (prompt système, schéma, exemples few-shot),
+  texte variable en dernier — le préfixe identique d'un appel à l'autre est réutilisé
+  par le cache KV de llama.cpp / Ollama, seul le texte est préempli,
+- "legacy" : consigne + texte + schéma dans le message utilisateur (ancien ordre).
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import instructor
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+PROMPT_SCHEMA_MODE = os.getenv("PROMPT_SCHEMA_MODE", "dedup").lower()
+PROMPT_SCHEMA_DESCRIPTIONS = os.getenv("PROMPT_SCHEMA_DESCRIPTIONS", "false").lower() in ("1", "true", "yes")
+PROMPT_SCHEMA_DEFAULTS = os.getenv("PROMPT_SCHEMA_DEFAULTS", "false").lower() in ("1", "true", "yes")
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "prefix").lower()
+
+# Mots-clés dont la valeur est un sous-schéma / une liste / un dict de sous-schémas
+_SUBSCHEMA_KEYS = ("items", "additionalProperties", "not", "contains", "if", "then", "else")
+_SUBSCHEMA_LIST_KEYS = ("anyOf", "oneOf", "allOf", "prefixItems")
+_SUBSCHEMA_DICT_KEYS = ("properties", "$defs", "definitions", "patternProperties")
+
+
+def compact_schema(
+    schema: Any,
+    keep_descriptions: bool = PROMPT_SCHEMA_DESCRIPTIONS,
+    keep_defaults: bool = PROMPT_SCHEMA_DEFAULTS,
+) -> Any:
+    """
+    Copie du schéma sans annotations inutiles au LLM (title, $comment, examples,
+    description et default sauf demande). Les noms de propriétés ne sont jamais touchés.
+    """
+    if not isinstance(schema, dict):
+        return schema
+    dropped = {"title", "$comment", "examples"}
+    if not keep_descriptions:
+        dropped.add("description")
+    if not keep_defaults:
+        dropped.add("default")
+    out: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key in dropped:
+            continue
+        if key in _SUBSCHEMA_KEYS:
+            out[key] = compact_schema(value, keep_descriptions, keep_defaults)
+        elif key in _SUBSCHEMA_LIST_KEYS and isinstance(value, list):
+            out[key] = [compact_schema(v, keep_descriptions, keep_defaults) for v in value]
+        elif key in _SUBSCHEMA_DICT_KEYS and isinstance(value, dict):
+            out[key] = {k: compact_schema(v, keep_descriptions, keep_defaults) for k, v in value.items()}
+        else:
+            out[key] = value
+    return out
+
+
+def minify(schema: Any) -> str:
+    """JSON sans espaces (moins de tokens que indent=2)."""
+    return json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+
+
+class LRUCache:
+    """Petit cache LRU thread-safe (prompts, modèles compacts et relâchés, grammaires)."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_rendered_schemas = LRUCache(PROMPT_CACHE_SIZE)
+_compact_models = LRUCache(PROMPT_CACHE_SIZE)
+
+
+def rendered_schema(schema: Dict[str, Any], schema_id: str) -> str:
+    """Schéma compact minifié, mis en cache par hash de schéma."""
+    key: Tuple[str, bool, bool] = (schema_id, PROMPT_SCHEMA_DESCRIPTIONS, PROMPT_SCHEMA_DEFAULTS)
+    rendered = _rendered_schemas.get(key)
+    if rendered is None:
+        rendered = minify(compact_schema(schema))
+        _rendered_schemas.put(key, rendered)
+    return rendered
+
+
+def compact_model(model: type[BaseModel]) -> type[BaseModel]:
+    """
+    Sous-classe de `model` dont model_json_schema() est compacté.
+
+    C'est ce schéma qu'instructor injecte (JSON) ou envoie en `tools` (TOOLS) :
+    la validation reste celle de `model`.
+    """
+    if PROMPT_SCHEMA_MODE == "full":
+        return model
+    compact = _compact_models.get(model)
+    if compact is not None:
+        return compact
+
+    class Compact(model):  # type: ignore[valid-type, misc]
+        @classmethod
+        def model_json_schema(cls, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+            return compact_schema(super().model_json_schema(*args, **kwargs))
+
+    Compact.__name__ = Compact.__qualname__ = model.__name__
+    Compact.__doc__ = model.__doc__
+    _compact_models.put(model, Compact)
+    return Compact
+
+
+def _schema_text(schema: Dict[str, Any], schema_id: str) -> Optional[str]:
+    """Schéma à écrire dans le prompt (None en dedup : ajouté au message système à l'appel)."""
+    if PROMPT_SCHEMA_MODE == "full":
+        return json.dumps(schema, indent=2, ensure_ascii=False)
+    if PROMPT_SCHEMA_MODE == "inline":
+        return rendered_schema(schema, schema_id)
+    return None
+
+
+def _legacy_user_message(text: str, schema_str: Optional[str]) -> str:
+    if schema_str is None:
+        return (
+            f"Analyse le texte suivant et extrais les infos structurées selon le schéma JSON fourni.\n\n"
+            f"Texte:\n{text}\n\n"
+            f"Réponds UNIQUEMENT par un JSON valide selon ce schéma."
+        )
+    return (
+        f"Analyse le texte suivant et extrais les infos structurées selon le schéma JSON.\n\n"
+        f"Texte:\n{text}\n\n"
+        f"Schéma à respecter:\n{schema_str}\n\n"
+        f"Réponds UNIQUEMENT par un JSON valide selon ce schéma."
+    )
+
+
+def generic_messages(
+    system_prompt: str,
+    text: str,
+    schema: Dict[str, Any],
+    schema_id: str,
+    examples: Sequence[Tuple[str, Dict[str, Any]]] = (),
+    layout: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """
+    Messages de /process-generic selon PROMPT_LAYOUT et PROMPT_SCHEMA_MODE.
+
+    examples : paires (texte, sortie attendue) rendues en tours user / assistant.
+    """
+    layout = layout or PROMPT_LAYOUT
+    schema_str = _schema_text(schema, schema_id)
+    shots: List[Dict[str, str]] = []
+    for example_text, example_output in examples:
+        shots.append({"role": "user", "content": f"Texte:\n{example_text}"})
+        shots.append({"role": "assistant", "content": minify(example_output)})
+
+    if layout == "legacy":
+        return [
+            {"role": "system", "content": system_prompt},
+            *shots,
+            {"role": "user", "content": _legacy_user_message(text, schema_str)},
+        ]
+
+    # Préfixe statique : consignes et schéma dans le message système (en dedup, le schéma
+    # y est ajouté à l'appel), exemples, puis le texte seul en dernier message.
+    system = (
+        f"{system_prompt}\n\n"
+        f"Extrais les infos structurées du texte fourni selon le schéma JSON. "
+        f"Réponds UNIQUEMENT par un JSON valide selon ce schéma."
+    )
+    if schema_str is not None:
+        system += f"\n\nSchéma à respecter:\n{schema_str}"
+    return [
+        {"role": "system", "content": system},
+        *shots,
+        {"role": "user", "content": f"Texte:\n{text}"},
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Schéma unique en mode JSON (instructor)
+# -----------------------------------------------------------------------------
+# Message système réceptacle placé en tête : instructor y concatène son schéma indenté,
+# retiré avec lui avant l'envoi au LLM.
+INSTRUCTOR_SCHEMA_SLOT = "[instructor-schema]"
+
+
+def with_schema(messages: List[Dict[str, str]], schema: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Copie des messages, schéma compact minifié ajouté au message système (ou en tête)."""
+    suffix = f"\n\nRéponds par un objet JSON conforme à ce schéma :\n{minify(schema)}"
+    copied = [dict(m) for m in messages]
+    if copied and copied[0].get("role") == "system":
+        copied[0]["content"] = copied[0]["content"] + suffix
+    else:
+        copied.insert(0, {"role": "system", "content": suffix.strip()})
+    return copied
+
+
+def instructor_json_messages(
+    messages: List[Dict[str, str]],
+    model: Optional[type[BaseModel]],
+) -> List[Dict[str, str]]:
+    """
+    Messages pour instructor en mode JSON, schéma écrit une seule fois (minifié).
+
+    model : response_model dont le schéma compact est ajouté au message système
+    (None : schéma déjà dans les messages). Le réceptacle en tête reçoit la copie indentée
+    d'instructor ; le client de json_mode_client() le retire avant l'envoi.
+    PROMPT_SCHEMA_MODE=full : messages inchangés, le schéma d'instructor est conservé.
+    """
+    if PROMPT_SCHEMA_MODE == "full":
+        return [dict(m) for m in messages]
+    if model is not None:
+        copied = with_schema(messages, compact_model(model).model_json_schema())
+    else:
+        copied = [dict(m) for m in messages]
+    return [{"role": "system", "content": INSTRUCTOR_SCHEMA_SLOT}, *copied]
+
+
+def strip_instructor_schema(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Messages sans le réceptacle (ni le schéma qu'instructor y a concaténé)."""
+    if messages and str(messages[0].get("content") or "").startswith(INSTRUCTOR_SCHEMA_SLOT):
+        return list(messages[1:])
+    return messages
+
+
+def drop_instructor_schema(create: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Enveloppe de chat.completions.create : le réceptacle est retiré à chaque tentative
+    (reasks compris), sans modifier la liste de messages d'instructor.
+    """
+
+    @functools.wraps(create)
+    async def wrapped(*args: Any, **kwargs: Any) -> Any:
+        if "messages" in kwargs:
+            kwargs["messages"] = strip_instructor_schema(kwargs["messages"])
+        return await create(*args, **kwargs)
+
+    return wrapped
+
+
+def json_mode_client(client: AsyncOpenAI) -> instructor.AsyncInstructor:
+    """Client instructor en mode JSON qui n'envoie pas sa copie du schéma (voir instructor_json_messages)."""
+    patched = instructor.from_openai(client, mode=instructor.Mode.JSON)
+    patched.create_fn = instructor.patch(
+        create=drop_instructor_schema(client.chat.completions.create), mode=instructor.Mode.JSON,
+    )
+    return patched
+
+
+def prompt_cache_stats() -> Dict[str, Any]:
+    """État (exposé sur /health)."""
+    return {
+        "mode": PROMPT_SCHEMA_MODE,
+        "layout": PROMPT_LAYOUT,
+        "rendered_schemas": len(_rendered_schemas),
+        "compact_models": len(_compact_models),
+    }
@@ -0,0 +1,296 @@
+"""
+Cache de résultats adressé par contenu — structuration déterministe.
+
+Les mêmes transcriptions reviennent souvent (retries BullMQ, consultation rouverte) :
+le résultat structuré est mis en cache sous une clé dérivée de
+(endpoint, modèle, mode/température, prompt système, hash du schéma, hash du texte).
+
+Opt-in via RESULT_CACHE_BACKEND :
+- "none" (défaut) : désactivé
+- "memory" : LRU en mémoire avec TTL
+- "sqlite" : fichier SQLite sur disque (survit aux redémarrages)
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("ai-cortex.result_cache")
+
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "none").lower()
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "/tmp/ai-cortex-result-cache.sqlite3")
+
+
+def make_key(
+    endpoint: str,
+    model: str,
+    mode: Optional[str],
+    temperature: Optional[float],
+    system_prompt: str,
+    schema_hash: Optional[str],
+    text: str,
+) -> str:
+    """Clé de cache : sha256 des paramètres qui déterminent la sortie du LLM."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    parts = [endpoint, model, mode, temperature, prompt_hash, schema_hash, text_hash]
+    raw = json.dumps(parts, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(abc.ABC):
+    """Interface d'un backend de cache (valeurs JSON-sérialisables)."""
+
+    name = "base"
+    #: True si get/set font des I/O bloquantes (exécutées hors boucle d'événements).
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Valeur en cache, None si absente ou expirée."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Stocke une valeur (TTL et éviction propres au backend)."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Vide le cache."""
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """Nombre d'entrées stockées."""
+
+
+class MemoryBackend(CacheBackend):
+    """LRU en mémoire, borné en nombre d'entrées, avec expiration (TTL)."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend(CacheBackend):
+    """Stockage sur disque (SQLite, WAL) — persiste entre redémarrages."""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl: float) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS result_cache_accessed ON result_cache(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, payload, now + self.ttl, now),
+            )
+            # Purge : entrées expirées puis les moins récemment lues au-delà de la borne
+            self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                " SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache")
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Backends disponibles (extensible : register_backend("lmdb", factory) avant le premier appel)
+_BACKEND_FACTORIES: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": lambda: MemoryBackend(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL),
+    "sqlite": lambda: SQLiteBackend(RESULT_CACHE_PATH, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL),
+}
+
+
+def register_backend(name: str, factory: Callable[[], CacheBackend]) -> None:
+    """Enregistre un backend supplémentaire sélectionnable via RESULT_CACHE_BACKEND."""
+    _BACKEND_FACTORIES[name] = factory
+
+
+class ResultCache:
+    """Façade du cache : compteurs hit/miss, accès async hors boucle pour les backends bloquants."""
+
+    def __init__(self, backend: Optional[CacheBackend]) -> None:
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Result cache read failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Result cache write failed: %s", e)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if self.backend is not None and self.backend.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if self.backend is not None and self.backend.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"backend": "none"}
+        return {
+            "backend": self.backend.name,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": RESULT_CACHE_TTL,
+        }
+
+    def close(self) -> None:
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+
+def _create_cache() -> ResultCache:
+    if RESULT_CACHE_BACKEND in ("", "none", "off"):
+        return ResultCache(None)
+    factory = _BACKEND_FACTORIES.get(RESULT_CACHE_BACKEND)
+    if factory is None:
+        logger.warning("Unknown RESULT_CACHE_BACKEND=%s, result cache disabled", RESULT_CACHE_BACKEND)
+        return ResultCache(None)
+    logger.info("Result cache enabled (backend=%s, ttl=%ss)", RESULT_CACHE_BACKEND, RESULT_CACHE_TTL)
+    return ResultCache(factory())
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Instance unique du cache, créée à la première utilisation."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _create_cache()
+    return _cache
+
+
+def close_result_cache() -> None:
+    """Ferme le backend du cache s'il a été créé (arrêt de l'application)."""
+    if _cache is not None:
+        _cache.close()
@@ -0,0 +1,423 @@
+"""
+Compilation JSON Schema → modèle Pydantic dynamique, avec cache LRU.
+
+Les contraintes du schéma (bornes, longueurs, motifs, enum, nombre d'items) passent dans
+le modèle : une sortie LLM non conforme est rejetée par la validation, donc reposée au LLM
+par instructor dans le worker, au lieu d'être découverte côté NestJS (Zod).
+
+Le backend NestJS envoie le même schéma de consultation des milliers de fois par jour :
+le modèle généré (create_model + compilation pydantic-core) est mis en cache par hash
+canonique du schéma et réutilisé tant qu'il reste dans le cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Annotated, Any, Dict, List, Literal, Optional, Tuple, Union, get_args, get_origin
+
+from pydantic import BaseModel, Field, StringConstraints, TypeAdapter, create_model
+
+from services.prompt_builder import PROMPT_CACHE_SIZE, LRUCache
+
+logger = logging.getLogger("ai-cortex.schema_compiler")
+
+SCHEMA_MODEL_CACHE_SIZE = int(os.getenv("SCHEMA_MODEL_CACHE_SIZE", "256"))
+
+
+def schema_hash(schema: Any) -> str:
+    """Hash canonique (sha256) d'un schéma : indépendant de l'ordre des clés et de l'indentation."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _ModelCache:
+    """Cache LRU borné (hash du schéma, nom du modèle) → classe Pydantic, avec compteurs."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], type[BaseModel]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[type[BaseModel]]:
+        with self._lock:
+            model = self._entries.get(key)
+            if model is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return model
+
+    def put(self, key: Tuple[str, str], model: type[BaseModel]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = model
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_model_cache = _ModelCache(SCHEMA_MODEL_CACHE_SIZE)
+# Même structure pour les TypeAdapter compilés (valeur quelconque, pas seulement un modèle)
+_validator_cache = _ModelCache(SCHEMA_MODEL_CACHE_SIZE)
+
+
+def json_schema_to_pydantic_model(
+    schema: Dict[str, Any],
+    model_name: str = "DynamicResponse"
+) -> type[BaseModel]:
+    """
+    Convertit un JSON Schema en modèle Pydantic dynamique.
+    
+    CRITIQUE: Pas de hardcoding - construction dynamique uniquement.
+    Le modèle est mis en cache par (hash canonique du schéma, model_name).
+    
+    Args:
+        schema: JSON Schema (format OpenAPI3 ou standard)
+        model_name: Nom du modèle Pydantic à créer
+    
+    Returns:
+        Classe Pydantic dynamique
+    """
+    key = (schema_hash(schema), model_name)
+    model = _model_cache.get(key)
+    if model is None:
+        model = _build_model(schema, model_name)
+        _model_cache.put(key, model)
+    return model
+
+
+def schema_validator(schema: Dict[str, Any]) -> TypeAdapter:
+    """
+    Validateur compilé (TypeAdapter) d'un JSON Schema de racine quelconque — objet, array
+    (items imbriqués compris), scalaire —, mis en cache par hash canonique du schéma.
+    """
+    key = (schema_hash(schema), "TypeAdapter")
+    adapter = _validator_cache.get(key)
+    if adapter is None:
+        adapter = TypeAdapter(_Compiler(schema).annotation(schema, "Value"))
+        _validator_cache.put(key, adapter)  # type: ignore[arg-type]
+    return adapter
+
+
+def validator_cache_stats() -> Dict[str, int]:
+    """Compteurs du cache de validateurs (exposés sur /health)."""
+    return _validator_cache.stats()
+
+
+def model_cache_stats() -> Dict[str, int]:
+    """Compteurs du cache de modèles (exposés sur /health)."""
+    return _model_cache.stats()
+
+
+def clear_model_cache() -> None:
+    """Vide les caches de modèles et de validateurs et remet les compteurs à zéro."""
+    _model_cache.clear()
+    _validator_cache.clear()
+
+
+# Borné comme les modèles compacts : un modèle relâché par schéma dynamique streamé
+_relaxed_models = LRUCache(PROMPT_CACHE_SIZE)
+
+
+def _relax_annotation(annotation: Any) -> Any:
+    """Annotation sans contraintes : sous-modèles relâchés, Literal → type de base, Annotated retiré."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return relaxed_model(annotation)
+    origin = get_origin(annotation)
+    if origin is None:
+        return annotation
+    args = get_args(annotation)
+    if origin is Literal:
+        return Union[tuple({type(a) for a in args})] if args else Any
+    if hasattr(annotation, "__metadata__"):  # Annotated[T, contraintes...]
+        return _relax_annotation(args[0])
+    relaxed_args = tuple(_relax_annotation(a) for a in args)
+    if origin is Union:
+        return Union[relaxed_args]
+    if origin in (list, List):
+        return List[relaxed_args[0]] if relaxed_args else List[Any]
+    if origin in (dict, Dict):
+        return Dict[relaxed_args] if relaxed_args else Dict[str, Any]
+    return annotation
+
+
+def relaxed_model(model: type[BaseModel]) -> type[BaseModel]:
+    """
+    Copie de `model` sans contraintes (min_length, ge/le, enum...) ni champs requis.
+
+    Sert au streaming partiel : un objet en cours de génération (liste encore vide,
+    chaîne tronquée) ne doit pas échouer à la validation. L'objet final est revalidé
+    contre le modèle d'origine.
+    """
+    relaxed = _relaxed_models.get(model)
+    if relaxed is not None:
+        return relaxed
+    fields: Dict[str, tuple] = {}
+    for name, info in model.model_fields.items():
+        fields[name] = (
+            Optional[_relax_annotation(info.annotation)],
+            Field(default=None, description=info.description),
+        )
+    relaxed = create_model(f"Relaxed{model.__name__}", **fields)
+    _relaxed_models.put(model, relaxed)
+    return relaxed
+
+
+_TYPES: Dict[str, Any] = {"string": str, "integer": int, "number": float, "boolean": bool, "null": type(None)}
+
+
+def _literal(values: List[Any]) -> Any:
+    """enum / const → Literal (valeurs non hachables : pas de contrainte)."""
+    try:
+        return Literal[tuple(values)]  # type: ignore[misc]
+    except TypeError:
+        return Any
+
+
+def _union(options: List[Any]) -> Any:
+    unique: List[Any] = []
+    for option in options:
+        if option not in unique:
+            unique.append(option)
+    if Any in unique:
+        return Any
+    return unique[0] if len(unique) == 1 else Union[tuple(unique)]
+
+
+def _merge_all_of(schemas: List[Any]) -> Dict[str, Any]:
+    """allOf : fusion superficielle (propriétés et required cumulés)."""
+    merged: Dict[str, Any] = {}
+    for sub in schemas:
+        if not isinstance(sub, dict):
+            continue
+        for key, value in sub.items():
+            if key == "properties":
+                merged.setdefault("properties", {}).update(value)
+            elif key == "required":
+                merged["required"] = list(dict.fromkeys([*merged.get("required", []), *value]))
+            else:
+                merged.setdefault(key, value)
+    return merged
+
+
+class _Compiler:
+    """
+    Compilation d'un schéma racine en annotations Pydantic.
+
+    Contraintes (minimum / maximum / exclusive*, multipleOf, minLength / maxLength / pattern,
+    minItems / maxItems), enum / const, $ref vers $defs / definitions, anyOf / oneOf / allOf,
+    type multiple, nullable (OpenAPI 3) et default. Une référence récursive n'est pas suivie (Any).
+    """
+
+    def __init__(self, root: Dict[str, Any]) -> None:
+        self.defs: Dict[str, Any] = {**root.get("definitions", {}), **root.get("$defs", {})}
+        self.refs: Dict[str, Any] = {}
+        self.resolving: set = set()
+
+    def ref(self, ref: str) -> Any:
+        if ref in self.refs:
+            return self.refs[ref]
+        name = ref.rsplit("/", 1)[-1]
+        target = self.defs.get(name) if ref.startswith("#/") else None
+        if target is None or ref in self.resolving:
+            logger.debug("Unresolved or recursive $ref %s compiled as Any", ref)
+            return Any
+        self.resolving.add(ref)
+        try:
+            annotation = self.annotation(target, name)
+        finally:
+            self.resolving.discard(ref)
+        self.refs[ref] = annotation
+        return annotation
+
+    def annotation(self, schema: Any, name: str) -> Any:
+        """Annotation (type + contraintes) d'un sous-schéma."""
+        if not isinstance(schema, dict) or not schema:
+            return Any
+        if schema.get("nullable") is True:
+            return Optional[self.annotation({k: v for k, v in schema.items() if k != "nullable"}, name)]
+        if "$ref" in schema:
+            return self.ref(schema["$ref"])
+        if "const" in schema:
+            return _literal([schema["const"]])
+        if "enum" in schema:
+            return _literal(list(schema["enum"]))
+        for key in ("anyOf", "oneOf"):
+            if isinstance(schema.get(key), list):
+                return _union([self.annotation(sub, f"{name}{i}") for i, sub in enumerate(schema[key])])
+        if isinstance(schema.get("allOf"), list):
+            rest = {k: v for k, v in schema.items() if k != "allOf"}
+            return self.annotation(_merge_all_of([rest, *schema["allOf"]]), name)
+
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            return _union([self.annotation({**schema, "type": t}, name) for t in schema_type])
+        if schema_type == "object" or (schema_type is None and "properties" in schema):
+            return self.object(schema, name)
+        if schema_type == "array":
+            return self.array(schema, name)
+        if schema_type == "string":
+            return self.string(schema)
+        if schema_type in ("integer", "number"):
+            return self.number(schema, _TYPES[schema_type])
+        return _TYPES.get(schema_type, Any)
+
+    def string(self, schema: Dict[str, Any]) -> Any:
+        constraints = {
+            "min_length": schema.get("minLength"),
+            "max_length": schema.get("maxLength"),
+            "pattern": schema.get("pattern"),
+        }
+        constraints = {k: v for k, v in constraints.items() if v is not None}
+        if not constraints:
+            return str
+        annotation = Annotated[str, StringConstraints(**constraints)]
+        if "pattern" in constraints:
+            try:
+                TypeAdapter(annotation)
+            except Exception as e:  # noqa: BLE001 — motif non supporté par le moteur regex
+                logger.warning("Unsupported pattern %r ignored: %s", constraints["pattern"], e)
+                del constraints["pattern"]
+                return Annotated[str, StringConstraints(**constraints)] if constraints else str
+        return annotation
+
+    def number(self, schema: Dict[str, Any], base: type) -> Any:
+        constraints: Dict[str, Any] = {"multiple_of": schema.get("multipleOf")}
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+        exclusive_min, exclusive_max = schema.get("exclusiveMinimum"), schema.get("exclusiveMaximum")
+        # Draft 4 : exclusiveMinimum / exclusiveMaximum booléens portant sur minimum / maximum
+        if exclusive_min is True:
+            constraints["gt"] = minimum
+        else:
+            constraints["ge"] = minimum
+            constraints["gt"] = exclusive_min if not isinstance(exclusive_min, bool) else None
+        if exclusive_max is True:
+            constraints["lt"] = maximum
+        else:
+            constraints["le"] = maximum
+            constraints["lt"] = exclusive_max if not isinstance(exclusive_max, bool) else None
+        constraints = {k: v for k, v in constraints.items() if v is not None}
+        return Annotated[base, Field(**constraints)] if constraints else base
+
+    def array(self, schema: Dict[str, Any], name: str) -> Any:
+        items = schema.get("items")
+        item = self.annotation(items, f"{name}Item") if isinstance(items, dict) else Any
+        annotation = List[item]  # type: ignore[valid-type]
+        constraints = {"min_length": schema.get("minItems"), "max_length": schema.get("maxItems")}
+        constraints = {k: v for k, v in constraints.items() if v is not None}
+        return Annotated[annotation, Field(**constraints)] if constraints else annotation
+
+    def object(self, schema: Dict[str, Any], name: str) -> Any:
+        if schema.get("properties"):
+            return create_model(name, **self.fields(schema, name))
+        extra = schema.get("additionalProperties")
+        if isinstance(extra, dict) and extra:
+            return Dict[str, self.annotation(extra, f"{name}Value")]  # type: ignore[misc]
+        return Dict[str, Any]
+
+    def fields(self, schema: Dict[str, Any], model_name: str) -> Dict[str, tuple]:
+        """Champs du modèle d'un objet (requis, default, description)."""
+        fields: Dict[str, tuple] = {}
+        required_fields = set(schema.get("required", []))
+        for field_name, field_def in schema["properties"].items():
+            if not isinstance(field_def, dict):
+                field_def = {}
+            # Sous-modèles nommés {modèle}_{champ} (objet) / {modèle}_{champ}Item (items d'array)
+            annotation = self.annotation(field_def, f"{model_name}_{field_name}")
+            description = field_def.get("description") if isinstance(field_def.get("description"), str) else None
+            if field_name in required_fields:
+                info = Field(..., description=description or None)
+            elif "default" in field_def:
+                info = Field(default=field_def["default"], description=description or None)
+            elif field_def.get("type") == "array":
+                info = Field(default_factory=list, description=description or None)
+            else:
+                info = Field(default=None, description=description or None)
+            fields[field_name] = (annotation, info)
+        return fields
+
+
+def _build_model(
+    schema: Dict[str, Any],
+    model_name: str = "DynamicResponse"
+) -> type[BaseModel]:
+    """
+    Construit (sans cache) le modèle Pydantic dynamique d'un JSON Schema.
+
+    JSON Schema standard (objet avec "properties") : compilé avec ses contraintes
+    (voir _Compiler). Format alternatif (objet exemple sans "properties") : types déduits
+    des valeurs, sans contraintes.
+    """
+    fields: Dict[str, tuple] = {}
+
+    if isinstance(schema, dict):
+        if "properties" in schema:
+            fields = _Compiler(schema).fields(schema, model_name)
+
+        # Si c'est un objet simple sans "properties" (format alternatif)
+        elif all(isinstance(v, (dict, list, str, int, float, bool, type(None))) for v in schema.values()):
+            # Traiter comme un objet simple
+            for field_name, field_value in schema.items():
+                if field_value is None:
+                    fields[field_name] = (Optional[Any], Field(default=None))
+                elif isinstance(field_value, str):
+                    fields[field_name] = (str, Field(...))
+                elif isinstance(field_value, int):
+                    fields[field_name] = (int, Field(...))
+                elif isinstance(field_value, float):
+                    fields[field_name] = (float, Field(...))
+                elif isinstance(field_value, bool):
+                    fields[field_name] = (bool, Field(...))
+                elif isinstance(field_value, list):
+                    # Déterminer le type des éléments
+                    if field_value and isinstance(field_value[0], dict):
+                        # Liste d'objets
+                        sub_model = json_schema_to_pydantic_model(
+                            field_value[0],
+                            f"{model_name}_{field_name}Item"
+                        )
+                        fields[field_name] = (List[sub_model], Field(default_factory=list))
+                    else:
+                        # Liste simple
+                        fields[field_name] = (List[Any], Field(default_factory=list))
+                elif isinstance(field_value, dict):
+                    # Objet imbriqué
+                    sub_model = json_schema_to_pydantic_model(
+                        field_value,
+                        f"{model_name}_{field_name}"
+                    )
+                    fields[field_name] = (sub_model, Field(...))
+                else:
+                    fields[field_name] = (Any, Field(...))
+    
+    # Si aucun champ n'a été créé, créer un modèle générique
+    if not fields:
+        fields["data"] = (Dict[str, Any], Field(...))
+    
+    return create_model(model_name, **fields)
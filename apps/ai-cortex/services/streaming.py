@@ -0,0 +1,28 @@
+"""
+Événements de flux — NDJSON (défaut) ou Server-Sent Events (?format=sse).
+
+Partagé par les flux de structuration (main.py) et de transcription (transcribe.py) ;
+la dictée en direct (WebSocket) envoie les mêmes objets, un par message.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from pydantic_core import to_json
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+# Pas de mise en tampon par un proxy (nginx) : chaque événement part immédiatement
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def event_message(event: str, payload: Dict[str, Any]) -> str:
+    """Événement en un objet JSON (ligne NDJSON sans saut de ligne, message WebSocket)."""
+    return to_json({"event": event, **payload}).decode()
+
+
+def stream_event(fmt: str, event: str, payload: Dict[str, Any]) -> str:
+    """Sérialise un événement de stream (une ligne NDJSON ou un bloc SSE)."""
+    if fmt == "sse":
+        return f"event: {event}\ndata: {to_json(payload).decode()}\n\n"
+    return event_message(event, payload) + "\n"
@@ -0,0 +1,187 @@
+"""
+Pool de transcription — Whisper hors de la boucle asyncio, sur des workers dédiés.
+
+model.transcribe est un calcul CPU/GPU de plusieurs minutes : appelé dans un `async def`,
+il bloque toutes les routes du worker (/health compris). Ici :
+- un ThreadPoolExecutor dédié (WHISPER_WORKERS threads, distinct du pool par défaut d'asyncio),
+- une file bornée (WHISPER_MAX_QUEUE) : au-delà, rejet immédiat (429 + Retry-After),
+- des threads intra-op torch réglés par worker (WHISPER_TORCH_THREADS, défaut cœurs / workers)
+  pour que les transcriptions simultanées ne se disputent pas les mêmes cœurs,
+- l'annulation quand le client se déconnecte : un job en file est retiré, un job en cours
+  reçoit un threading.Event consulté avant la transcription puis entre deux segments
+  (faster-whisper ; un appel openai-whisper commencé va jusqu'au bout). /transcribe/stream
+  soumet une fenêtre par job : les fenêtres suivantes ne sont pas transcrites.
+État (running, queued, rejected, cancelled) exposé sur /health.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("ai-cortex.transcription_pool")
+
+WHISPER_WORKERS = max(1, int(os.getenv("WHISPER_WORKERS", "1")))
+WHISPER_MAX_QUEUE = int(os.getenv("WHISPER_MAX_QUEUE", "8"))
+# 0 : cœurs disponibles répartis entre les workers
+WHISPER_TORCH_THREADS = int(os.getenv("WHISPER_TORCH_THREADS", "0"))
+# Intervalle de vérification de la déconnexion du client pendant l'attente (s)
+WHISPER_DISCONNECT_POLL = float(os.getenv("WHISPER_DISCONNECT_POLL", "0.5"))
+
+_EWMA_ALPHA = 0.2
+
+
+class TranscriptionQueueFull(Exception):
+    """File de transcription pleine : requête rejetée sans être mise en file."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: int) -> None:
+        self.retry_after = retry_after
+        super().__init__(f"Transcription queue full, retry after {retry_after}s")
+
+
+class TranscriptionCancelled(Exception):
+    """Transcription abandonnée (client déconnecté)."""
+
+
+def torch_threads_per_worker(workers: int = WHISPER_WORKERS) -> int:
+    if WHISPER_TORCH_THREADS > 0:
+        return WHISPER_TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(threads: int) -> None:
+    """Initialisation d'un thread worker : threads intra-op torch (réglage OpenMP par thread)."""
+    try:
+        import torch
+    except ImportError:  # pragma: no cover - dépendance optionnelle
+        return
+    torch.set_num_threads(threads)
+
+
+class TranscriptionPool:
+    """Exécuteur dédié à Whisper avec file bornée et annulation."""
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.torch_threads = torch_threads_per_worker(workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="whisper",
+            initializer=_init_worker,
+            initargs=(self.torch_threads,),
+        )
+        self._lock = threading.Lock()
+        self.pending = 0  # soumis, non terminés (en file + en cours)
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.avg_job_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Estimation (s) du temps avant qu'un worker se libère pour un nouvel arrivant."""
+        waves = (self.pending + 1) / self.workers
+        return max(1, math.ceil(waves * (self.avg_job_seconds or 1.0)))
+
+    def check_admission(self) -> None:
+        """Lève TranscriptionQueueFull si un nouveau job dépasserait la file."""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise TranscriptionQueueFull(self.retry_after())
+
+    def has_idle_worker(self) -> bool:
+        """Au moins un worker libre (travail opportuniste : transcription provisoire)."""
+        return self.pending < self.workers
+
+    def _job(self, fn: Callable[..., Any], cancel: threading.Event, args: tuple, kwargs: dict) -> Any:
+        if cancel.is_set():
+            raise TranscriptionCancelled()
+        with self._lock:
+            self.running += 1
+        start = time.monotonic()
+        try:
+            return fn(*args, cancel=cancel, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.running -= 1
+                self.avg_job_seconds = (
+                    elapsed if not self.avg_job_seconds
+                    else (1 - _EWMA_ALPHA) * self.avg_job_seconds + _EWMA_ALPHA * elapsed
+                )
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Exécute fn(*args, cancel=<threading.Event>, **kwargs) sur un worker Whisper.
+
+        Lève TranscriptionQueueFull si la file est pleine, TranscriptionCancelled si
+        is_disconnected() devient vrai (ou si la tâche appelante est annulée) avant la fin.
+        """
+        self.check_admission()
+        cancel = threading.Event()
+        with self._lock:
+            self.pending += 1
+        future = self._executor.submit(self._job, fn, cancel, args, kwargs)
+        # Un job annulé en cours d'exécution occupe son worker jusqu'au bout : compté jusqu'à sa fin
+        future.add_done_callback(self._release)
+        waiter = asyncio.wrap_future(future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=WHISPER_DISCONNECT_POLL)
+                if done:
+                    break
+                if is_disconnected is not None and await is_disconnected():
+                    raise TranscriptionCancelled()
+            result = waiter.result()
+            self.completed += 1
+            return result
+        except (TranscriptionCancelled, asyncio.CancelledError):
+            # En file : retiré ; en cours : arrêt au prochain point de contrôle (segment suivant)
+            cancel.set()
+            future.cancel()
+            self.cancelled += 1
+            logger.info("Transcription cancelled (client disconnected)")
+            raise
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def state(self) -> Dict[str, Any]:
+        """État (exposé sur /health)."""
+        return {
+            "workers": self.workers,
+            "torch_threads_per_worker": self.torch_threads,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": max(self.pending - self.running, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "avg_job_seconds": round(self.avg_job_seconds, 2),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = TranscriptionPool(WHISPER_WORKERS, WHISPER_MAX_QUEUE)
+
+
+def get_transcription_pool() -> TranscriptionPool:
+    return _pool
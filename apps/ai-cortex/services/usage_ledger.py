@@ -0,0 +1,159 @@
+"""
+Comptabilité des tokens — usage par requête et registre agrégé par modèle.
+
+Chaque réponse de structuration porte son usage (tokens prompt / completion / total
+et nombre de retries instructor, qui multiplient les tokens consommés).
+Le registre cumule ces usages par (provider, modèle, endpoint, mode, schéma) et
+est exposé sur GET /usage, avec un coût estimé si LLM_PRICING est défini :
+    LLM_PRICING='{"gpt-4o-mini": {"prompt": 0.15, "completion": 0.60}}'  (USD / 1M tokens)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from services.metrics import CallStats
+
+logger = logging.getLogger("ai-cortex.usage_ledger")
+
+
+def _load_pricing(raw: Optional[str]) -> Dict[str, Dict[str, float]]:
+    if not raw:
+        return {}
+    try:
+        return {model: {k: float(v) for k, v in prices.items()} for model, prices in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logger.warning("Invalid LLM_PRICING ignored: %s", e)
+        return {}
+
+
+LLM_PRICING = _load_pricing(os.getenv("LLM_PRICING"))
+
+
+class LLMUsage(BaseModel):
+    """Usage d'un appel de structuration (retries compris)."""
+    prompt_tokens: int = Field(0, description="Tokens du prompt (cumulés sur les retries)")
+    completion_tokens: int = Field(0, description="Tokens générés (cumulés sur les retries)")
+    total_tokens: int = Field(0, description="prompt_tokens + completion_tokens")
+    retries: int = Field(0, description="Tentatives supplémentaires (retries instructor, failovers exclus)")
+
+    @classmethod
+    def from_stats(cls, stats: CallStats) -> "LLMUsage":
+        return cls(
+            prompt_tokens=stats.prompt_tokens,
+            completion_tokens=stats.completion_tokens,
+            total_tokens=stats.prompt_tokens + stats.completion_tokens,
+            retries=max(stats.attempts - 1, 0),
+        )
+
+    @classmethod
+    def total(cls, usages: Iterable["LLMUsage"]) -> "LLMUsage":
+        """Somme de plusieurs usages (lot, morceaux d'une transcription)."""
+        usages = list(usages)
+        return cls(
+            prompt_tokens=sum(u.prompt_tokens for u in usages),
+            completion_tokens=sum(u.completion_tokens for u in usages),
+            total_tokens=sum(u.total_tokens for u in usages),
+            retries=sum(u.retries for u in usages),
+        )
+
+    def headers(self) -> Dict[str, str]:
+        """En-têtes X-Usage-* (USAGE_HEADERS=true)."""
+        return {
+            "X-Usage-Prompt-Tokens": str(self.prompt_tokens),
+            "X-Usage-Completion-Tokens": str(self.completion_tokens),
+            "X-Usage-Total-Tokens": str(self.total_tokens),
+            "X-Usage-Retries": str(self.retries),
+        }
+
+
+LedgerKey = Tuple[str, str, str, str, str]
+
+
+class UsageLedger:
+    """Cumul des usages par (provider, modèle, endpoint, mode, schéma)."""
+
+    def __init__(self, pricing: Dict[str, Dict[str, float]]) -> None:
+        self.pricing = pricing
+        self.since = time.time()
+        self._entries: Dict[LedgerKey, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        endpoint: str,
+        provider: str,
+        model: str,
+        mode: str,
+        schema_id: Optional[str],
+        usage: LLMUsage,
+    ) -> None:
+        key: LedgerKey = (provider, model, endpoint, mode, (schema_id or "")[:12])
+        with self._lock:
+            entry = self._entries.setdefault(key, {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "retries": 0,
+            })
+            entry["requests"] += 1
+            entry["prompt_tokens"] += usage.prompt_tokens
+            entry["completion_tokens"] += usage.completion_tokens
+            entry["total_tokens"] += usage.total_tokens
+            entry["retries"] += usage.retries
+
+    def _cost(self, model: str, entry: Dict[str, Any]) -> Optional[float]:
+        prices = self.pricing.get(model)
+        if prices is None:
+            return None
+        return round(
+            (entry["prompt_tokens"] * prices.get("prompt", 0.0)
+             + entry["completion_tokens"] * prices.get("completion", 0.0)) / 1_000_000,
+            6,
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totaux par modèle et détail par endpoint / mode / schéma (trié par tokens)."""
+        with self._lock:
+            items = [(key, dict(entry)) for key, entry in self._entries.items()]
+        models: Dict[str, Dict[str, Any]] = {}
+        breakdown = []
+        for (provider, model, endpoint, mode, schema_id), entry in items:
+            totals = models.setdefault(f"{provider}:{model}", {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "retries": 0,
+            })
+            for field, value in entry.items():
+                totals[field] += value
+            cost = self._cost(model, entry)
+            breakdown.append({
+                "provider": provider,
+                "model": model,
+                "endpoint": endpoint,
+                "mode": mode,
+                "schema": schema_id or None,
+                **entry,
+                "avg_total_tokens": round(entry["total_tokens"] / entry["requests"], 1),
+                **({"cost_usd": cost} if cost is not None else {}),
+            })
+        for name, totals in models.items():
+            cost = self._cost(name.split(":", 1)[1], totals)
+            if cost is not None:
+                totals["cost_usd"] = cost
+        breakdown.sort(key=lambda e: e["total_tokens"], reverse=True)
+        return {"since": self.since, "models": models, "breakdown": breakdown}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.since = time.time()
+
+
+_ledger = UsageLedger(LLM_PRICING)
+
+
+def get_usage_ledger() -> UsageLedger:
+    return _ledger
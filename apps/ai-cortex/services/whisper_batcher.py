@@ -0,0 +1,252 @@
+"""
+Micro-batching Whisper — les clips courts de requêtes concurrentes décodés ensemble.
+
+Chaque /transcribe lançait son propre model.transcribe : dix notes vocales simultanées,
+dix passes d'encodeur de batch 1. Ici, les clips de ≤ 30 s (une fenêtre mel de Whisper)
+arrivant dans un délai de WHISPER_BATCH_WINDOW_MS sont regroupés par (modèle, langue)
+jusqu'à WHISPER_BATCH_MAX, puis décodés en une seule passe encodeur/décodeur
+(model.decode sur un tenseur mel [batch, n_mels, 3000]) sur un worker du pool ;
+les résultats sont redistribués aux requêtes.
+
+Décodage glouton (température 0) : un clip dont la sortie dépasse les seuils de repli de
+Whisper (compression > 2.4, logprob moyen < -1) est retranscrit seul par model.transcribe,
+avec le repli en température habituel. État (lots, taille moyenne) exposé sur /health.
+
+Client déconnecté : son clip est retiré du lot en attente ; un lot dont tous les clips sont
+abandonnés est annulé sur le pool (retiré de la file, ou arrêté avant les replis).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.asr_engines import ENGINES, parse_model_spec
+from services.audio_stream import SAMPLE_RATE
+from services.transcription_pool import (
+    WHISPER_DISCONNECT_POLL,
+    TranscriptionCancelled,
+    TranscriptionPool,
+    get_transcription_pool,
+)
+from services.whisper_registry import get_whisper_registry
+
+logger = logging.getLogger("ai-cortex.whisper_batcher")
+
+# 1 : désactivé (un model.transcribe par requête)
+WHISPER_BATCH_MAX = int(os.getenv("WHISPER_BATCH_MAX", "8"))
+WHISPER_BATCH_WINDOW_MS = float(os.getenv("WHISPER_BATCH_WINDOW_MS", "25"))
+
+# Une fenêtre mel de Whisper
+BATCH_MAX_SECONDS = 30.0
+
+# Seuils de repli de whisper.transcribe (valeurs par défaut)
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+_LOGPROB_THRESHOLD = -1.0
+_NO_SPEECH_THRESHOLD = 0.6
+
+# Pas des jetons d'horodatage de Whisper (s)
+_TIMESTAMP_STEP = 0.02
+
+BatchKey = Tuple[str, Optional[str]]
+
+
+def batchable(samples: np.ndarray, model_key: str) -> bool:
+    """Clip d'une seule fenêtre mel, moteur openai-whisper (faster-whisper : transcription directe)."""
+    return (
+        WHISPER_BATCH_MAX > 1
+        and len(samples) <= BATCH_MAX_SECONDS * SAMPLE_RATE
+        and ENGINES[parse_model_spec(model_key)[0]].batching
+    )
+
+
+def _segments(tokenizer: Any, tokens: List[int], duration: float) -> List[Dict[str, Any]]:
+    """Segments délimités par les jetons d'horodatage (comme whisper.transcribe)."""
+    begin = tokenizer.timestamp_begin
+    segments: List[Dict[str, Any]] = []
+    start = 0.0
+    current: List[int] = []
+    for token in tokens:
+        if token < begin:
+            current.append(token)
+            continue
+        time = (token - begin) * _TIMESTAMP_STEP
+        if current:
+            segments.append({"start": start, "end": min(time, duration), "text": tokenizer.decode(current)})
+            current = []
+        start = time
+    if current:
+        segments.append({"start": start, "end": duration, "text": tokenizer.decode(current)})
+    return [seg for seg in segments if seg["text"].strip()]
+
+
+def _needs_fallback(result: Any) -> bool:
+    if result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob < _LOGPROB_THRESHOLD:
+        return False  # silence : texte vide accepté
+    return result.compression_ratio > _COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < _LOGPROB_THRESHOLD
+
+
+def decode_batch(
+    model_name: str, clips: List[np.ndarray], language: Optional[str], cancel: threading.Event,
+) -> List[Dict[str, Any]]:
+    """
+    Transcrit des clips de ≤ 30 s en une passe (bloquant : exécuté sur un worker du pool).
+
+    Retourne, pour chaque clip, un dict au format de model.transcribe (text, segments, language).
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    loaded = get_whisper_registry().get(model_name)
+    model = loaded.model
+    if cancel.is_set():
+        raise TranscriptionCancelled()
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(clip)), model.dims.n_mels)
+        for clip in clips
+    ]).to(model.device)
+    options = whisper.DecodingOptions(
+        language=language, task="transcribe", without_timestamps=False, fp16=model.device.type == "cuda",
+    )
+    with torch.no_grad():
+        decoded = model.decode(mels, options)
+
+    if cancel.is_set():
+        raise TranscriptionCancelled()
+    outputs = []
+    for clip, result in zip(clips, decoded):
+        duration = len(clip) / SAMPLE_RATE
+        if _needs_fallback(result):
+            if cancel.is_set():
+                raise TranscriptionCancelled()
+            # Repli en température : transcription individuelle habituelle
+            outputs.append(loaded.transcribe(clip, language=language))
+            continue
+        silent = result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob < _LOGPROB_THRESHOLD
+        tokenizer = get_tokenizer(
+            model.is_multilingual,
+            num_languages=getattr(model, "num_languages", 99),
+            language=result.language,
+            task="transcribe",
+        )
+        segments = [] if silent else _segments(tokenizer, result.tokens, duration)
+        outputs.append({
+            "text": "" if silent else result.text,
+            "segments": segments,
+            "language": result.language,
+        })
+    return outputs
+
+
+class WhisperBatcher:
+    """Regroupe les clips courts concurrents par (modèle, langue) et les décode par lots."""
+
+    def __init__(self, pool: TranscriptionPool, max_batch: int, window_ms: float) -> None:
+        self.pool = pool
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._pending: Dict[BatchKey, List[Tuple[np.ndarray, asyncio.Future]]] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.clips = 0
+        self.cancelled = 0
+
+    async def transcribe(
+        self,
+        model_name: str,
+        samples: np.ndarray,
+        language: Optional[str],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Résultat au format model.transcribe pour un clip de ≤ 30 s.
+
+        Lève TranscriptionCancelled si is_disconnected() devient vrai (ou si la tâche appelante
+        est annulée) avant le résultat : le clip n'est plus attendu par son lot.
+        """
+        loop = asyncio.get_running_loop()
+        key = (model_name, language)
+        future: asyncio.Future = loop.create_future()
+        items = self._pending.setdefault(key, [])
+        items.append((samples, future))
+        if len(items) >= self.max_batch:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=WHISPER_DISCONNECT_POLL)
+                if done:
+                    return future.result()
+                if is_disconnected is not None and await is_disconnected():
+                    raise TranscriptionCancelled()
+        except (TranscriptionCancelled, asyncio.CancelledError):
+            future.cancel()
+            self.cancelled += 1
+            self._discard(key)
+            raise
+
+    def _discard(self, key: BatchKey) -> None:
+        """Lot en attente sans plus aucun clip attendu : abandonné avant d'être soumis."""
+        items = self._pending.get(key)
+        if items is not None and all(f.done() for _, f in items):
+            del self._pending[key]
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+    def _flush(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = [(s, f) for s, f in self._pending.pop(key, []) if not f.done()]
+        if items:
+            asyncio.get_running_loop().create_task(self._run(key, items))
+
+    async def _run(self, key: BatchKey, items: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        model_name, language = key
+
+        async def abandoned() -> bool:
+            # Tous les clients du lot partis : job retiré de la file ou arrêté (services.transcription_pool)
+            return all(f.cancelled() for _, f in items)
+
+        try:
+            results = await self.pool.run(
+                decode_batch, model_name, [s for s, _ in items], language, is_disconnected=abandoned,
+            )
+        except Exception as e:  # noqa: BLE001
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.clips += len(items)
+        if len(items) > 1:
+            logger.debug("Whisper batch of %d clips (%s)", len(items), model_name)
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def state(self) -> Dict[str, Any]:
+        """État (exposé sur /health)."""
+        return {
+            "max_batch": self.max_batch,
+            "window_ms": self.window * 1000,
+            "batches": self.batches,
+            "clips": self.clips,
+            "cancelled": self.cancelled,
+            "avg_batch_size": round(self.clips / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_batcher = WhisperBatcher(get_transcription_pool(), WHISPER_BATCH_MAX, WHISPER_BATCH_WINDOW_MS)
+
+
+def get_whisper_batcher() -> WhisperBatcher:
+    return _batcher
@@ -0,0 +1,191 @@
+"""
+Registre des modèles ASR — un modèle par moteur et nom, préchargé, budget mémoire LRU.
+
+L'ancien cache global ne gardait que le premier modèle chargé : une requête "small"
+recevait silencieusement "base", et la première requête payait tout le chargement.
+Ici :
+- cache par modèle, clé "moteur:nom" (whisper:base, faster-whisper:large-v3... ; services.asr_engines),
+- préchargement au démarrage (WHISPER_PRELOAD) dans le lifespan, hors chemin de requête,
+- budget mémoire (WHISPER_MEMORY_BUDGET_MB) : au-delà, éviction du moins récemment utilisé,
+- temps de chargement et taille résidente (paramètres + buffers) exposés sur /health.
+
+Les moteurs sont des dépendances optionnelles : moteur absent → /transcribe répond 503.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from services.asr_engines import ENGINES, WHISPER_ENGINE, ASRModel, engines_state, model_key, parse_model_spec
+from services.transcription_pool import torch_threads_per_worker
+
+logger = logging.getLogger("ai-cortex.whisper_registry")
+
+WHISPER_DEFAULT_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_PRELOAD = [m.strip() for m in os.getenv("WHISPER_PRELOAD", WHISPER_DEFAULT_MODEL).split(",") if m.strip()]
+WHISPER_MEMORY_BUDGET_MB = float(os.getenv("WHISPER_MEMORY_BUDGET_MB", "4096"))
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE") or None
+WHISPER_DOWNLOAD_ROOT = os.getenv("WHISPER_DOWNLOAD_ROOT") or None
+
+
+class WhisperUnavailable(RuntimeError):
+    """Moteur ASR non installé."""
+
+
+class UnknownWhisperModel(ValueError):
+    """Moteur ou nom de modèle inconnu."""
+
+
+@dataclass
+class LoadedModel:
+    """Un modèle résident et ses mesures."""
+
+    name: str
+    model: ASRModel
+    size_bytes: int
+    load_seconds: float
+    loaded_at: float
+    last_used: float
+    uses: int = 0
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "size_mb": round(self.size_bytes / 2**20, 1),
+            "load_seconds": round(self.load_seconds, 2),
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "uses": self.uses,
+        }
+
+
+class WhisperRegistry:
+    """Modèles ASR chargés, par clé "moteur:nom", avec éviction LRU sous budget mémoire."""
+
+    def __init__(self, budget_mb: float, device: Optional[str] = None) -> None:
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.device = device
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Un verrou de chargement par nom : deux requêtes "small" ne chargent qu'une fois
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.evictions = 0
+
+    def validate(self, spec: str) -> str:
+        """
+        Clé canonique "moteur:nom" de `spec` ; lève WhisperUnavailable / UnknownWhisperModel
+        sans charger le modèle.
+        """
+        try:
+            engine_name, name = parse_model_spec(spec)
+        except ValueError as e:
+            raise UnknownWhisperModel(str(e)) from e
+        engine = ENGINES[engine_name]
+        if not engine.available:
+            raise WhisperUnavailable(f"{engine_name} non installé")
+        if not engine.accepts(name):
+            raise UnknownWhisperModel(
+                f"Modèle {engine_name} inconnu: {name} (disponibles: {', '.join(engine.model_names())})"
+            )
+        return f"{engine_name}:{name}"
+
+    def get(self, spec: str) -> ASRModel:
+        """
+        Modèle `spec` ("moteur:nom" ou nom seul), chargé au besoin (bloquant : à appeler hors
+        boucle asyncio).
+
+        Lève UnknownWhisperModel / WhisperUnavailable.
+        """
+        try:
+            name = model_key(spec)
+        except ValueError as e:
+            raise UnknownWhisperModel(str(e)) from e
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                entry.last_used = time.time()
+                entry.uses += 1
+                return entry.model
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        self.validate(name)
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(name)
+            if entry is None:
+                entry = self._load(name)
+        with self._lock:
+            entry.uses += 1
+            entry.last_used = time.time()
+        return entry.model
+
+    def _load(self, key: str) -> LoadedModel:
+        engine_name, name = parse_model_spec(key)
+        engine = ENGINES[engine_name]
+        start = time.monotonic()
+        model = engine.load(name, self.device, WHISPER_DOWNLOAD_ROOT, torch_threads_per_worker())
+        entry = LoadedModel(
+            name=key,
+            model=ASRModel(key, engine, model),
+            size_bytes=engine.size_bytes(model, name),
+            load_seconds=time.monotonic() - start,
+            loaded_at=time.time(),
+            last_used=time.time(),
+        )
+        logger.info("Loaded ASR model %s in %.1fs (%.0f MB)",
+                    key, entry.load_seconds, entry.size_bytes / 2**20)
+        with self._lock:
+            self._models[key] = entry
+            self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep: str) -> None:
+        """Retire les modèles les moins récemment utilisés tant que le budget est dépassé."""
+        while self.resident_bytes() > self.budget_bytes and len(self._models) > 1:
+            name = next(n for n in self._models if n != keep)
+            evicted = self._models.pop(name)
+            self.evictions += 1
+            # Les transcriptions en cours gardent leur référence jusqu'à la fin
+            logger.info("Evicted ASR model %s (%.0f MB) to stay under %.0f MB",
+                        name, evicted.size_bytes / 2**20, self.budget_bytes / 2**20)
+
+    def resident_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._models.values())
+
+    def preload(self, names: List[str]) -> None:
+        """Charge les modèles listés (bloquant) ; un échec n'empêche pas les suivants."""
+        for name in names:
+            try:
+                self.get(name)
+            except WhisperUnavailable as e:
+                logger.info("Skipping preload of %s: %s", name, e)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Could not preload ASR model %s: %s", name, e)
+
+    def state(self) -> Dict[str, Any]:
+        """État (exposé sur /health)."""
+        with self._lock:
+            models = {name: entry.state() for name, entry in self._models.items()}
+            resident = self.resident_bytes()
+        return {
+            "engines": engines_state(),
+            "default_engine": WHISPER_ENGINE,
+            "device": self.device,
+            "preload": WHISPER_PRELOAD,
+            "budget_mb": round(self.budget_bytes / 2**20, 1),
+            "resident_mb": round(resident / 2**20, 1),
+            "evictions": self.evictions,
+            "models": models,
+        }
+
+
+_registry = WhisperRegistry(WHISPER_MEMORY_BUDGET_MB, WHISPER_DEVICE)
+
+
+def get_whisper_registry() -> WhisperRegistry:
+    return _registry
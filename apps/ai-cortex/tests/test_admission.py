@@ -0,0 +1,98 @@
+"""Governor d'admission : 429 file pleine, 503 attente trop longue, slots rendus, registre borné."""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from services import admission
+from services.admission import BackendGovernor, BackendSaturated, get_governor
+
+
+def test_slot_releases_and_tracks_call_time():
+    governor = BackendGovernor("test", max_concurrency=2, max_queue=0, max_queue_time=1)
+
+    async def scenario():
+        async with governor.slot():
+            assert governor.in_flight == 1
+        with pytest.raises(RuntimeError):
+            async with governor.slot():
+                raise RuntimeError("appel en échec")
+
+    asyncio.run(scenario())
+    assert governor.in_flight == 0
+    assert governor.admitted == 2
+
+
+def test_queue_full_is_rejected_with_429():
+    governor = BackendGovernor("test", max_concurrency=1, max_queue=1, max_queue_time=5)
+
+    async def scenario():
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+        assert governor.queued == 1
+        with pytest.raises(BackendSaturated) as excinfo:
+            await governor.acquire()
+        governor.release(1.0)
+        await waiter
+        governor.release(1.0)
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1
+    assert governor.rejected_queue_full == 1
+    assert governor.in_flight == 0 and governor.queued == 0
+
+
+def test_queue_timeout_is_rejected_with_503():
+    governor = BackendGovernor("test", max_concurrency=1, max_queue=4, max_queue_time=0.05)
+
+    async def scenario():
+        await governor.acquire()
+        with pytest.raises(BackendSaturated) as excinfo:
+            await governor.acquire()
+        governor.release(0.1)
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.reason == "queue_timeout"
+    assert governor.rejected_queue_timeout == 1
+    assert governor.in_flight == 0 and governor.queued == 0
+
+
+def test_cancelled_waiter_does_not_keep_the_slot():
+    governor = BackendGovernor("test", max_concurrency=1, max_queue=4, max_queue_time=5)
+
+    async def scenario():
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+        # Slot rendu au waiter et annulation dans le même tour de boucle
+        governor.release(0.1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiter.cancelled()
+        assert governor.in_flight == 0 and governor.queued == 0
+        # Le slot est de nouveau disponible
+        await asyncio.wait_for(governor.acquire(), timeout=1)
+        governor.release(0.1)
+
+    asyncio.run(scenario())
+
+
+def test_registry_evicts_idle_governors_only(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_REGISTRY_SIZE", 2)
+    monkeypatch.setattr(admission, "_governors", OrderedDict())
+    busy = get_governor("http://busy/v1")
+    busy.in_flight = 1
+    idle = get_governor("http://idle/v1")
+    for i in range(3):
+        get_governor(f"http://request-{i}/v1")
+    # Le governor occupé garde ses slots ; les inactifs les plus anciens sont retirés
+    assert list(admission._governors) == ["http://busy/v1", "http://request-2/v1"]
+    assert get_governor("http://busy/v1") is busy
+    assert get_governor("http://idle/v1") is not idle
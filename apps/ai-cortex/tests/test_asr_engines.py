@@ -0,0 +1,73 @@
+"""Moteurs ASR : modèles acceptés, format commun et annulation entre deux segments (faster-whisper)."""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from services import asr_engines
+from services.asr_engines import ENGINES, FasterWhisperEngine
+from services.transcription_pool import TranscriptionCancelled
+from services.whisper_registry import UnknownWhisperModel, WhisperRegistry
+
+
+class FakeFasterWhisperModel:
+    """Modèle faster-whisper : segments produits paresseusement, au fil du décodage."""
+
+    def __init__(self, texts, on_segment=None):
+        self.texts = texts
+        self.on_segment = on_segment
+        self.decoded = 0
+
+    def transcribe(self, audio, **kwargs):
+        def segments():
+            for i, text in enumerate(self.texts):
+                self.decoded += 1
+                yield SimpleNamespace(start=10.0 * i, end=10.0 * i + 9.5, text=text)
+                if self.on_segment is not None:
+                    self.on_segment(i)
+
+        return segments(), SimpleNamespace(language="fr")
+
+
+def test_faster_whisper_result_has_the_whisper_format():
+    model = FakeFasterWhisperModel([" Toux sèche", " depuis 5 jours."])
+    result = FasterWhisperEngine().transcribe(model, None, "fr", None, threading.Event())
+    assert result == {
+        "text": " Toux sèche depuis 5 jours.",
+        "segments": [
+            {"start": 0.0, "end": 9.5, "text": " Toux sèche"},
+            {"start": 10.0, "end": 19.5, "text": " depuis 5 jours."},
+        ],
+        "language": "fr",
+    }
+
+
+def test_faster_whisper_stops_at_the_next_segment_when_cancelled():
+    cancel = threading.Event()
+    # Client parti pendant le décodage du troisième segment : le quatrième n'est pas décodé
+    model = FakeFasterWhisperModel(["a", "b", "c", "d"], on_segment=lambda i: i == 1 and cancel.set())
+    with pytest.raises(TranscriptionCancelled):
+        FasterWhisperEngine().transcribe(model, None, "fr", None, cancel)
+    assert model.decoded == 3
+
+
+@pytest.fixture
+def faster_whisper(monkeypatch):
+    engine = ENGINES["faster-whisper"]
+    monkeypatch.setattr(engine, "_fw", SimpleNamespace(available_models=lambda: ["tiny", "small"]))
+    monkeypatch.setattr(asr_engines, "FASTER_WHISPER_EXTRA_MODELS", ["org/medical-ct2"])
+    return engine
+
+
+@pytest.mark.parametrize("name", ["org/other-ct2", "/srv/models/x", "../x", "small/.."])
+def test_arbitrary_repo_or_path_is_rejected(faster_whisper, name):
+    assert not faster_whisper.accepts(name)
+    with pytest.raises(UnknownWhisperModel):
+        WhisperRegistry(budget_mb=100).validate(f"faster-whisper:{name}")
+
+
+def test_known_and_allowlisted_models_are_accepted(faster_whisper):
+    registry = WhisperRegistry(budget_mb=100)
+    assert registry.validate("fw:small") == "faster-whisper:small"
+    assert registry.validate("faster-whisper:org/medical-ct2") == "faster-whisper:org/medical-ct2"
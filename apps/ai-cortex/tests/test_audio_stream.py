@@ -0,0 +1,84 @@
+"""Découpage de l'audio en fenêtres aux pauses (VAD) et horodatage des segments."""
+
+import numpy as np
+
+from services.audio_stream import SAMPLE_RATE, AudioWindow, is_silent, quietest_cut, shift_segments, vad_windows
+
+
+def _tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def _chunks(samples: np.ndarray, seconds: float = 1.0):
+    step = int(seconds * SAMPLE_RATE)
+    for i in range(0, len(samples), step):
+        yield samples[i:i + step]
+
+
+def test_silence_detection():
+    assert is_silent(_silence(1))
+    assert is_silent(_tone(1, amplitude=1e-4))
+    assert not is_silent(np.concatenate((_silence(0.9), _tone(0.1))))
+
+
+def test_cut_lands_in_the_pause():
+    samples = np.concatenate((_tone(4), _silence(1), _tone(4)))
+    cut = quietest_cut(samples, 2 * SAMPLE_RATE, 8 * SAMPLE_RATE)
+    assert 4 * SAMPLE_RATE <= cut <= 5 * SAMPLE_RATE
+
+
+def test_cut_without_pause_stays_within_bounds():
+    samples = _tone(10)
+    cut = quietest_cut(samples, 2 * SAMPLE_RATE, 8 * SAMPLE_RATE)
+    assert 2 * SAMPLE_RATE <= cut <= 8 * SAMPLE_RATE
+
+
+def test_windows_are_cut_at_pauses_and_cover_the_audio():
+    # Parole de 7 s séparées par des pauses d'une seconde
+    speech = [_tone(7), _silence(1), _tone(7), _silence(1), _tone(7)]
+    samples = np.concatenate(speech)
+    windows = list(vad_windows(_chunks(samples), window_s=10, min_window_s=4))
+
+    assert [w.index for w in windows] == list(range(len(windows)))
+    assert all(w.duration <= 10 for w in windows)
+    # Contiguës, sans perte ni recouvrement
+    assert windows[0].start == 0
+    for previous, current in zip(windows, windows[1:]):
+        assert abs(previous.start + previous.duration - current.start) < 1e-6
+    assert np.array_equal(np.concatenate([w.samples for w in windows]), samples)
+    # Coupes dans les pauses (7-8 s, 15-16 s), pas au milieu d'un mot
+    cuts = [w.start for w in windows[1:]]
+    assert all(7 <= cut <= 8 or 15 <= cut <= 16 for cut in cuts)
+
+
+def test_silent_windows_are_flagged():
+    samples = np.concatenate((_tone(6), _silence(14)))
+    windows = list(vad_windows(_chunks(samples), window_s=10, min_window_s=4))
+    assert not windows[0].silent
+    assert windows[-1].silent
+
+
+def test_short_tail_is_dropped():
+    # Fenêtres fixes (min = max) : deux de 10 s, reliquat de 50 ms ignoré
+    samples = np.concatenate((_tone(20), _tone(0.05)))
+    windows = list(vad_windows(_chunks(samples), window_s=10, min_window_s=10))
+    assert [(w.start, w.duration) for w in windows] == [(0.0, 10.0), (10.0, 10.0)]
+
+
+def test_segments_are_shifted_to_the_recording_time():
+    window = AudioWindow(index=2, start=20.0, samples=_silence(10), silent=False)
+    result = {"segments": [
+        {"start": 0.0, "end": 4.5, "text": " Toux sèche"},
+        {"start": 4.5, "end": 12.0, "text": "  "},
+        {"start": 5.0, "end": 12.0, "text": " depuis 5 jours."},
+    ]}
+    assert shift_segments(result, window) == [
+        {"start": 20.0, "end": 24.5, "text": "Toux sèche"},
+        # Fin bornée à la durée de la fenêtre
+        {"start": 25.0, "end": 30.0, "text": "depuis 5 jours."},
+    ]
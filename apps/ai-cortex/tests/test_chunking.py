@@ -0,0 +1,180 @@
+"""Découpage des longues transcriptions, structuration et fusion des morceaux, annulation sur échec."""
+
+import asyncio
+import json
+
+import pytest
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+from domain.schemas import ConsultationModel
+from services import grammar, llm_processor
+from services.admission import get_governor
+from services.chunking import map_chunks, merge_consultations, split_text
+from services.llm_router import Backend, Router
+
+
+def _sentences(count: int) -> str:
+    return " ".join(f"Phrase numéro {i} de la consultation." for i in range(count))
+
+
+# -----------------------------------------------------------------------------
+# split_text
+# -----------------------------------------------------------------------------
+def test_short_text_is_a_single_chunk():
+    text = "Toux sèche depuis 5 jours."
+    assert split_text(text, max_chars=100, overlap=20) == [text]
+
+
+def test_chunks_respect_max_chars_and_sentence_boundaries():
+    text = _sentences(40)
+    chunks = split_text(text, max_chars=200, overlap=50)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    # Aucune phrase coupée : chaque morceau commence et finit sur une phrase complète
+    assert all(chunk.startswith("Phrase") and chunk.endswith(".") for chunk in chunks)
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = _sentences(40)
+    chunks = split_text(text, max_chars=200, overlap=50)
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit("Phrase", 1)[1]
+        assert current.startswith("Phrase" + last_sentence)
+    for i in range(40):
+        assert any(f"numéro {i} " in chunk for chunk in chunks)
+
+
+def test_overlong_sentence_is_cut_between_words():
+    text = "mot " * 200
+    chunks = split_text(text.strip(), max_chars=100, overlap=0)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(set(chunk.split()) == {"mot"} for chunk in chunks)
+
+
+# -----------------------------------------------------------------------------
+# merge_consultations
+# -----------------------------------------------------------------------------
+def test_merge_deduplicates_and_keeps_the_best_entries():
+    parts = [
+        {
+            "patientId": "",
+            "symptoms": ["Toux", "fièvre"],
+            "diagnosis": [{"code": "J11.1", "label": "Grippe", "confidence": 0.6}],
+            "medications": [{"name": "Paracétamol", "dosage": "1g"}],
+        },
+        {
+            "patientId": "pat-001",
+            "symptoms": ["toux ", "Céphalées"],
+            "diagnosis": [
+                {"code": "j111", "label": "Grippe saisonnière", "confidence": 0.9},
+                {"code": "", "label": "Rhinite", "confidence": 0.4},
+            ],
+            "medications": [{"name": "paracétamol", "dosage": "1g", "duration": "5 jours"}],
+        },
+    ]
+    merged = merge_consultations(parts, transcript="texte complet")
+
+    assert merged["patientId"] == "pat-001"
+    assert merged["transcript"] == "texte complet"
+    assert merged["symptoms"] == ["Toux", "fièvre", "Céphalées"]
+    assert [d["confidence"] for d in merged["diagnosis"]] == [0.9, 0.4]
+    assert merged["medications"] == [{"name": "paracétamol", "dosage": "1g", "duration": "5 jours"}]
+    assert "alerts" not in merged
+
+
+def test_merge_unions_alerts_when_present():
+    parts = [{"alerts": ["Allergie pénicilline"]}, {"alerts": ["allergie pénicilline", "Grossesse"]}]
+    assert merge_consultations(parts, transcript="")["alerts"] == ["Allergie pénicilline", "Grossesse"]
+
+
+# -----------------------------------------------------------------------------
+# map_chunks
+# -----------------------------------------------------------------------------
+def test_map_chunks_keeps_order():
+    async def worker(chunk):
+        await asyncio.sleep(0.01 * (5 - int(chunk)))
+        return int(chunk)
+
+    assert asyncio.run(map_chunks([str(i) for i in range(5)], worker, max_concurrency=2)) == list(range(5))
+
+
+def test_failed_chunk_leaves_the_pool_usable():
+    router = Router("chunks", [Backend("http://chunking-test/v1", "m")])
+    governor = get_governor("http://chunking-test/v1")
+
+    async def structure(chunk):
+        if chunk == "bad":
+            await asyncio.sleep(0.01)
+            raise ValueError("sortie invalide")  # échec définitif (pas de failover)
+        await asyncio.sleep(3600)
+
+    async def ok(_backend):
+        return "ok"
+
+    async def scenario():
+        chunks = ["a", "b", "bad", "c", "d", "e"]
+        with pytest.raises(ValueError):
+            await map_chunks(chunks, lambda chunk: router.execute(lambda _b: structure(chunk)), max_concurrency=4)
+        assert governor.in_flight == 0
+        assert router.backends[0].outstanding == 0
+        # Requête suivante servie sans attendre
+        return await asyncio.wait_for(router.execute(ok), timeout=1)
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+# -----------------------------------------------------------------------------
+# Structuration par morceaux (/process)
+# -----------------------------------------------------------------------------
+class FakeClient:
+    """Client AsyncOpenAI minimal : une réponse JSON par morceau, requêtes enregistrées."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = kwargs["messages"][-1]["content"]
+        content = next(reply for chunk, reply in self.replies.items() if chunk in text)
+        return ChatCompletion(
+            id="test",
+            created=0,
+            model="m",
+            object="chat.completion",
+            choices=[Choice(index=0, finish_reason="stop", message=ChatCompletionMessage(role="assistant", content=content))],
+            usage=CompletionUsage(prompt_tokens=100, completion_tokens=10, total_tokens=110),
+        )
+
+
+def test_chunks_are_structured_without_transcript(monkeypatch):
+    chunks = ["Toux sèche depuis 5 jours.", "Grippe probable, paracétamol 1g 5 jours."]
+    client = FakeClient({
+        chunks[0]: json.dumps({"patientId": "pat-001", "symptoms": ["toux sèche"]}),
+        chunks[1]: json.dumps({
+            "patientId": "pat-001",
+            "diagnosis": [{"code": "J11.1", "label": "Grippe", "confidence": 0.8}],
+            "medications": [{"name": "Paracétamol", "dosage": "1g", "duration": "5 jours"}],
+        }),
+    })
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm_processor, "LLM_DECODING", "json_schema")
+    monkeypatch.setattr(grammar, "LLM_DECODING", "json_schema")
+    monkeypatch.setattr(llm_processor, "_get_client", lambda _backend: client)
+    monkeypatch.setattr(llm_processor, "split_text", lambda _text: chunks)
+    text = " ".join(chunks)
+
+    consultation, usage = asyncio.run(llm_processor.structure_text_with_usage(text, "PRECISE"))
+
+    for call in client.calls:
+        assert "transcript" not in json.dumps(call["response_format"])
+        assert "transcript" not in call["messages"][0]["content"]
+    assert isinstance(consultation, ConsultationModel)
+    assert consultation.transcript == text
+    assert consultation.symptoms == ["toux sèche"]
+    assert [d.code for d in consultation.diagnosis] == ["J11.1"]
+    assert usage.prompt_tokens == 200
@@ -0,0 +1,183 @@
+"""Décodage contraint : grammaire GBNF dérivée du schéma et boucle de reask."""
+
+import asyncio
+import json
+import re
+from typing import List, Literal, Optional
+
+import pytest
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from pydantic import BaseModel, Field, ValidationError
+
+from services.grammar import constrained_create, grammar_for, schema_to_gbnf
+from services.prompt_builder import compact_model, minify
+
+_TOKEN = re.compile(r'\s*("(?:[^"\\]|\\.)*"|\[(?:[^\]\\]|\\.)*\]|[a-zA-Z0-9-]+|[()|?*+])')
+
+
+def _rules(grammar: str) -> dict:
+    return dict(line.split(" ::= ", 1) for line in grammar.strip().splitlines())
+
+
+def _to_regex(grammar: str) -> str:
+    """Grammaire GBNF non récursive → expression régulière équivalente (pour les tests)."""
+    rules = _rules(grammar)
+
+    def expand(name: str, depth: int = 0) -> str:
+        assert depth < 20, f"règle récursive : {name}"
+        out = []
+        body = rules[name]
+        pos = 0
+        while pos < len(body.rstrip()):
+            match = _TOKEN.match(body, pos)
+            assert match, f"syntaxe GBNF inattendue : {body[pos:]!r}"
+            token = match.group(1)
+            pos = match.end()
+            if token.startswith('"'):
+                text = re.sub(r"\\(.)", lambda m: {"n": "\n", "r": "\r", "t": "\t"}.get(m[1], m[1]), token[1:-1])
+                out.append(re.escape(text))
+            elif token.startswith("["):
+                out.append(token)
+            elif token == "(":
+                out.append("(?:")
+            elif token in ")|?*+":
+                out.append(token)
+            else:
+                out.append(f"(?:{expand(token, depth + 1)})")
+        return "".join(out)
+
+    return expand("root")
+
+
+def _accepts(grammar: str, text: str) -> bool:
+    return re.fullmatch(_to_regex(grammar), text) is not None
+
+
+class Diagnosis(BaseModel):
+    code: str
+    severity: Literal["low", "high"]
+    confidence: Optional[float] = None
+
+
+class Consultation(BaseModel):
+    patientId: str
+    symptoms: List[str] = Field(min_length=1, max_length=3)
+    diagnosis: List[Diagnosis]
+    followUp: bool = False
+
+
+# -----------------------------------------------------------------------------
+# schema_to_gbnf
+# -----------------------------------------------------------------------------
+def test_grammar_accepts_conforming_json():
+    grammar = grammar_for(Consultation)
+    value = {
+        "patientId": "pat-001",
+        "symptoms": ["toux", "fièvre \"38,5\""],
+        "diagnosis": [{"code": "J20", "severity": "low", "confidence": 0.8}, {"code": "R05", "severity": "high"}],
+        "followUp": True,
+    }
+    assert _accepts(grammar, json.dumps(value, ensure_ascii=False))
+    assert _accepts(grammar, json.dumps(value, ensure_ascii=False, indent=2))
+    # Propriété optionnelle absente, nullable à null
+    value = {"patientId": "p", "symptoms": ["toux"], "diagnosis": [{"code": "J20", "severity": "low", "confidence": None}]}
+    assert _accepts(grammar, json.dumps(value))
+
+
+@pytest.mark.parametrize("value", [
+    {"symptoms": ["toux"], "diagnosis": []},  # requise absente
+    {"patientId": "p", "symptoms": [], "diagnosis": []},  # minItems
+    {"patientId": "p", "symptoms": ["toux"], "diagnosis": [{"code": "J20", "severity": "medium"}]},  # enum
+    {"patientId": 1, "symptoms": ["toux"], "diagnosis": []},  # type
+    {"patientId": "p", "symptoms": ["toux"], "diagnosis": [], "extra": 1},  # propriété inconnue
+])
+def test_grammar_rejects_non_conforming_json(value):
+    assert not _accepts(grammar_for(Consultation), json.dumps(value))
+
+
+def test_grammar_defines_every_rule_it_uses():
+    grammar = grammar_for(Consultation)
+    rules = _rules(grammar)
+    used = {token for body in rules.values() for token in _TOKEN.findall(body) if re.fullmatch(r"[a-zA-Z0-9-]+", token)}
+    assert used <= set(rules)
+    # Primitives non utilisées absentes
+    assert "object" not in rules and "array" not in rules and "integer" not in rules
+
+
+def test_recursive_ref_is_a_self_referencing_rule():
+    schema = {
+        "$defs": {"Node": {"type": "object", "properties": {"children": {"type": "array", "items": {"$ref": "#/$defs/Node"}}}, "required": ["children"]}},
+        "$ref": "#/$defs/Node",
+    }
+    rules = _rules(schema_to_gbnf(schema))
+    assert rules["root"] == "def-node"
+    assert "def-node" in rules["def-node-children"]
+
+
+def test_grammar_is_cached_per_model():
+    assert grammar_for(Consultation) is grammar_for(Consultation)
+
+
+# -----------------------------------------------------------------------------
+# constrained_create
+# -----------------------------------------------------------------------------
+class FakeClient:
+    def __init__(self, replies):
+        self.replies = iter(replies)
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return ChatCompletion(
+            id="test",
+            created=0,
+            model="m",
+            object="chat.completion",
+            choices=[Choice(index=0, finish_reason="stop", message=ChatCompletionMessage(role="assistant", content=next(self.replies)))],
+            usage=CompletionUsage(prompt_tokens=100, completion_tokens=10, total_tokens=110),
+        )
+
+
+VALID = json.dumps({"patientId": "p", "symptoms": ["toux"], "diagnosis": []})
+# Forme correcte, contrainte hors grammaire violée (maxItems non exprimé en GBNF)
+OUT_OF_GRAMMAR = json.dumps({"patientId": "p", "symptoms": ["a", "b", "c", "d"], "diagnosis": []})
+
+
+def _create(client, max_retries=2, decoding="gbnf"):
+    return asyncio.run(constrained_create(
+        client, model="m", messages=[{"role": "system", "content": "Consigne"}, {"role": "user", "content": "Texte"}],
+        response_model=Consultation, temperature=0, decoding=decoding, max_retries=max_retries,
+    ))
+
+
+def test_constrained_create_sends_the_grammar_and_the_schema_once():
+    client = FakeClient([VALID])
+    result = _create(client)
+    call = client.calls[0]
+    assert call["extra_body"]["grammar"].startswith("root ::=")
+    schema = minify(compact_model(Consultation).model_json_schema())
+    assert sum(m["content"].count(schema) for m in call["messages"]) == 1
+    assert result.patientId == "p"
+
+
+def test_constrained_create_reasks_with_errors_and_sums_usage():
+    client = FakeClient([OUT_OF_GRAMMAR, VALID])
+    result = _create(client, decoding="json_schema")
+    assert len(client.calls) == 2
+    assert client.calls[0]["response_format"]["type"] == "json_schema"
+    reask = client.calls[1]["messages"]
+    assert reask[-2] == {"role": "assistant", "content": OUT_OF_GRAMMAR}
+    assert "symptoms" in reask[-1]["content"]
+    assert result._raw_response.usage.prompt_tokens == 200
+    assert result._raw_response.usage.completion_tokens == 20
+
+
+def test_constrained_create_gives_up_after_max_retries():
+    client = FakeClient([OUT_OF_GRAMMAR, OUT_OF_GRAMMAR])
+    with pytest.raises(ValidationError):
+        _create(client, max_retries=2)
+    assert len(client.calls) == 2
@@ -0,0 +1,53 @@
+"""Dictée en direct : structuration différée (Debouncer) et libération du backend LLM."""
+
+import asyncio
+
+from services.admission import get_governor
+from services.live_dictation import Debouncer
+from services.llm_router import Backend, Router
+
+
+def test_debouncer_runs_once_after_the_last_touch():
+    runs = []
+
+    async def action():
+        runs.append(len(runs))
+
+    async def scenario():
+        debouncer = Debouncer(0.02, action)
+        for _ in range(5):
+            debouncer.touch()
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.1)
+        # Rien de nouveau : flush n'exécute pas une seconde fois
+        await debouncer.flush()
+        await debouncer.close()
+
+    asyncio.run(scenario())
+    assert runs == [0]
+
+
+def test_close_during_a_run_frees_the_backend_slot():
+    router = Router("live", [Backend("http://live-test/v1", "m")])
+    governor = get_governor("http://live-test/v1")
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def hang(_backend):
+            running.set()
+            await asyncio.sleep(3600)
+
+        async def structure():
+            await router.execute(hang)
+
+        debouncer = Debouncer(0.01, structure)
+        debouncer.touch()
+        await asyncio.wait_for(running.wait(), timeout=1)
+        assert governor.in_flight == 1
+        # Client parti pendant la structuration
+        await debouncer.close()
+        assert governor.in_flight == 0
+        assert router.backends[0].outstanding == 0
+
+    asyncio.run(scenario())
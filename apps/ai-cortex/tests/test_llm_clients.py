@@ -0,0 +1,50 @@
+"""Registre de clients LLM : réutilisation, taille bornée et fermeture différée des clients retirés."""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from services import llm_clients
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_REGISTRY_SIZE", 2)
+    monkeypatch.setattr(llm_clients, "LLM_CLIENT_CLOSE_DELAY", 0.01)
+    monkeypatch.setattr(llm_clients, "_clients", OrderedDict())
+    monkeypatch.setattr(llm_clients, "_retired", [])
+    return llm_clients
+
+
+def test_clients_are_reused_and_bounded(registry):
+    async def scenario():
+        first = registry.get_async_client("openai", "http://a/v1", "k")
+        assert registry.get_async_client("openai", "http://a/v1", "k") is first
+        second = registry.get_async_client("openai", "http://b/v1", "k")
+        # a utilisé en dernier : b est retiré au profit de c
+        registry.get_async_client("openai", "http://a/v1", "k")
+        registry.get_async_client("openai", "http://c/v1", "k")
+        assert [key[1] for key in registry._clients] == ["http://a/v1", "http://c/v1"]
+        assert registry._retired == [second]
+        assert not second.is_closed()
+        # Fermé après LLM_CLIENT_CLOSE_DELAY (appels en cours terminés)
+        await asyncio.sleep(0.05)
+        assert second.is_closed()
+        assert registry._retired == []
+        await registry.aclose_all()
+        assert first.is_closed()
+
+    asyncio.run(scenario())
+
+
+def test_aclose_all_closes_retired_clients(registry, monkeypatch):
+    monkeypatch.setattr(registry, "LLM_CLIENT_CLOSE_DELAY", 3600)
+
+    async def scenario():
+        clients = [registry.get_async_client("ollama", f"http://{i}/v1", "ollama") for i in range(3)]
+        await registry.aclose_all()
+        return clients
+
+    assert all(client.is_closed() for client in asyncio.run(scenario()))
+    assert not registry._closing
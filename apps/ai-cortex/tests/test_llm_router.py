@@ -0,0 +1,220 @@
+"""Router : slots d'admission rendus sur succès, erreur, failover et annulation ; essai demi-ouvert unique."""
+
+import asyncio
+import itertools
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+from services.admission import BackendSaturated, get_governor
+from services import llm_router, metrics
+from services.llm_router import Backend, Router, get_single_router
+from services.usage_ledger import LLMUsage
+
+_ids = itertools.count()
+
+
+def _router(nodes: int = 1) -> Router:
+    # base_url unique par test : les governors sont globaux au processus
+    run = next(_ids)
+    return Router(f"test-{run}", [Backend(f"http://router-{run}-{i}/v1", "m") for i in range(nodes)])
+
+
+def _in_flight(router: Router) -> int:
+    return sum(get_governor(b.base_url).in_flight for b in router.backends)
+
+
+def _outstanding(router: Router) -> int:
+    return sum(b.outstanding for b in router.backends)
+
+
+def test_release_on_success():
+    router = _router()
+
+    async def ok(backend):
+        return backend.base_url
+
+    assert asyncio.run(router.execute(ok)) == router.backends[0].base_url
+    assert _in_flight(router) == 0
+    assert _outstanding(router) == 0
+    assert router.backends[0].successes == 1
+
+
+def test_release_on_client_error_without_failover():
+    router = _router(nodes=2)
+    calls = []
+
+    async def invalid(backend):
+        calls.append(backend.base_url)
+        raise ValueError("sortie invalide")
+
+    with pytest.raises(ValueError):
+        asyncio.run(router.execute(invalid))
+    assert len(calls) == 1
+    assert _in_flight(router) == 0
+    assert _outstanding(router) == 0
+
+
+def test_failover_releases_failed_backend():
+    router = _router(nodes=2)
+    calls = []
+
+    async def first_down(backend):
+        calls.append(backend.base_url)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connexion refusée")
+        return backend.base_url
+
+    assert asyncio.run(router.execute(first_down)) == calls[1]
+    assert calls[0] != calls[1]
+    assert _in_flight(router) == 0
+    assert _outstanding(router) == 0
+    assert sum(b.failures for b in router.backends) == 1
+
+
+def test_cancelled_calls_give_back_their_slots():
+    router = _router()
+    backend = router.backends[0]
+    governor = get_governor(backend.base_url)
+    started = 0
+
+    async def hang(_backend):
+        nonlocal started
+        started += 1
+        await asyncio.sleep(3600)
+
+    async def ok(_backend):
+        return "ok"
+
+    async def scenario():
+        tasks = [asyncio.create_task(router.execute(hang)) for _ in range(governor.max_concurrency)]
+        while started < governor.max_concurrency:
+            await asyncio.sleep(0)
+        assert governor.in_flight == governor.max_concurrency
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert governor.in_flight == 0
+        assert backend.outstanding == 0
+        # Annulation : ni succès ni échec imputé au nœud
+        assert backend.failures == 0 and backend.circuit == "closed"
+        # Les slots rendus servent la requête suivante sans attente
+        return await asyncio.wait_for(router.execute(ok), timeout=1)
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_cancelled_half_open_trial_allows_a_new_trial():
+    router = _router()
+    backend = router.backends[0]
+    backend.circuit = "half_open"
+
+    async def hang(_backend):
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        task = asyncio.create_task(router.execute(hang))
+        await asyncio.sleep(0.01)
+        assert backend._trial_in_flight
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert not backend._trial_in_flight
+    assert backend.available(0.0)
+
+
+def test_half_open_trial_is_taken_before_waiting_for_admission():
+    router = _router()
+    backend = router.backends[0]
+    governor = get_governor(backend.base_url)
+    backend.circuit = "half_open"
+
+    async def scenario():
+        # Slots occupés : l'essai attend son admission
+        for _ in range(governor.max_concurrency):
+            await governor.acquire()
+        trial = asyncio.create_task(router.lease())
+        await asyncio.sleep(0.01)
+        # Un second appel ne part pas en essai concurrent pendant cette attente
+        assert backend._trial_in_flight
+        assert router.pick(set()) is None
+        governor.release(0.0)
+        lease = await trial
+        assert lease.trial
+        router.release(lease, 0.0, None)
+        for _ in range(governor.max_concurrency - 1):
+            governor.release(0.0)
+
+    asyncio.run(scenario())
+    assert not backend._trial_in_flight
+
+
+def test_saturated_half_open_trial_is_given_back():
+    router = _router()
+    backend = router.backends[0]
+    governor = get_governor(backend.base_url)
+    backend.circuit = "half_open"
+
+    async def scenario():
+        governor.in_flight += governor.max_concurrency + governor.max_queue
+        try:
+            with pytest.raises(BackendSaturated):
+                await router.lease()
+        finally:
+            governor.in_flight -= governor.max_concurrency + governor.max_queue
+
+    asyncio.run(scenario())
+    assert not backend._trial_in_flight
+    assert backend.available(0.0)
+
+
+def test_only_the_trial_lease_ends_the_trial():
+    router = _router()
+    backend = router.backends[0]
+
+    async def scenario():
+        # Appel parti circuit fermé, terminé pendant l'essai demi-ouvert d'un autre appel
+        regular = await router.lease()
+        backend.circuit = "half_open"
+        trial = await router.lease()
+        router.release(regular, 0.0, None)
+        assert backend._trial_in_flight
+        assert router.pick(set()) is None
+        router.release(trial, 0.0, None)
+
+    asyncio.run(scenario())
+    assert not backend._trial_in_flight
+
+
+def test_single_backend_routers_are_bounded(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_REGISTRY_SIZE", 2)
+    monkeypatch.setattr(llm_router, "_single_routers", OrderedDict())
+    busy = get_single_router("openai", "http://busy/v1", "m", None)
+    busy.backends[0].outstanding = 1
+    for i in range(3):
+        get_single_router("openai", f"http://request-{i}/v1", "m", None)
+    assert list(llm_router._single_routers) == ["openai:http://busy/v1", "openai:http://request-2/v1"]
+    assert get_single_router("openai", "http://busy/v1", "m", None) is busy
+    assert set(llm_router.routers_state()) >= {"openai:http://busy/v1", "openai:http://request-2/v1"}
+
+
+def test_failover_is_not_counted_as_a_retry():
+    router = _router(nodes=2)
+    calls = []
+
+    async def first_down(backend):
+        calls.append(backend.base_url)
+        # Requêtes HTTP vues par les hooks httpx des clients poolés
+        metrics._on_request_start()
+        if len(calls) == 1:
+            raise httpx.ConnectError("connexion refusée")
+        metrics._on_response_end()
+        return backend.base_url
+
+    with metrics.llm_call("process", "openai", "m", "FAST") as stats:
+        asyncio.run(router.execute(first_down))
+    assert stats.attempts == 1
+    assert stats.failovers == 1
+    assert LLMUsage.from_stats(stats).retries == 0
@@ -0,0 +1,111 @@
+"""Prompts de structuration : schéma compact, envoyé une seule fois (minifié) en mode JSON."""
+
+import asyncio
+import json
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+import main
+from services.prompt_builder import INSTRUCTOR_SCHEMA_SLOT, compact_model, compact_schema, minify
+
+SCHEMA = {
+    "title": "Consultation",
+    "type": "object",
+    "$comment": "interne",
+    "properties": {
+        "title": {"type": "string", "title": "Title", "description": "Propriété nommée title"},
+        "items": {
+            "type": "array",
+            "items": {"$ref": "#/$defs/Item"},
+            "default": [],
+            "examples": [[]],
+        },
+        "status": {"anyOf": [{"type": "string", "title": "S"}, {"type": "null"}]},
+    },
+    "$defs": {"Item": {"title": "Item", "type": "object", "properties": {"code": {"type": "string", "description": "CIM-10"}}}},
+    "required": ["title"],
+}
+
+
+# -----------------------------------------------------------------------------
+# compact_schema
+# -----------------------------------------------------------------------------
+def test_compact_schema_drops_annotations_but_not_property_names():
+    compact = compact_schema(SCHEMA, keep_descriptions=False, keep_defaults=False)
+    assert compact == {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "items": {"type": "array", "items": {"$ref": "#/$defs/Item"}},
+            "status": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+        },
+        "$defs": {"Item": {"type": "object", "properties": {"code": {"type": "string"}}}},
+        "required": ["title"],
+    }
+    # Copie : le schéma d'origine est intact
+    assert SCHEMA["title"] == "Consultation"
+
+
+def test_compact_schema_keeps_descriptions_and_defaults_on_demand():
+    compact = compact_schema(SCHEMA, keep_descriptions=True, keep_defaults=True)
+    assert compact["properties"]["title"]["description"] == "Propriété nommée title"
+    assert compact["properties"]["items"]["default"] == []
+    assert "examples" not in compact["properties"]["items"]
+
+
+def test_minify_has_no_whitespace():
+    assert minify({"a": [1, 2], "b": "é"}) == '{"a":[1,2],"b":"é"}'
+
+
+# -----------------------------------------------------------------------------
+# Mode JSON : une seule copie du schéma
+# -----------------------------------------------------------------------------
+def _completion(content: str) -> ChatCompletion:
+    return ChatCompletion(
+        id="test",
+        created=0,
+        model="m",
+        object="chat.completion",
+        choices=[Choice(index=0, finish_reason="stop", message=ChatCompletionMessage(role="assistant", content=content))],
+    )
+
+
+def _sent_messages(call: main._LLMCall, replies):
+    sent = []
+    replies = iter(replies)
+
+    async def create(**kwargs):
+        sent.append(kwargs["messages"])
+        return _completion(next(replies))
+
+    client = AsyncOpenAI(base_url="http://prompt-test/v1", api_key="x")
+    client.chat.completions.create = create
+    patched = main._patched_client(client, provider="ollama")
+    asyncio.run(patched.chat.completions.create(**call.create_params()))
+    return sent
+
+
+def test_json_mode_sends_the_schema_once_minified(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "ollama")
+    call = main._plan_structure("Toux sèche depuis 5 jours.")
+    payload = {
+        "patientId": "pat-001",
+        "transcript": "Toux sèche depuis 5 jours.",
+        "symptoms": ["toux sèche"],
+        "diagnosis": [{"code": "R05", "label": "Toux", "confidence": 0.8}],
+    }
+    # Première sortie invalide : le reask d'instructor ne doit pas réintroduire le schéma
+    sent = _sent_messages(call, [json.dumps({"patientId": "pat-001"}), json.dumps(payload)])
+
+    schema = minify(compact_model(main.ConsultationStructure).model_json_schema())
+    assert len(sent) == 2
+    for messages in sent:
+        prompt = "\n".join(m["content"] for m in messages)
+        assert prompt.count(schema) == 1
+        assert messages[0]["role"] == "system" and schema in messages[0]["content"]
+        assert INSTRUCTOR_SCHEMA_SLOT not in prompt
+        assert "json_schema" not in prompt  # consigne d'instructor et sa copie indentée
+    # Le préfixe statique (message système) est identique d'une tentative à l'autre
+    assert sent[0][0] == sent[1][0]
@@ -0,0 +1,36 @@
+"""Cache de résultats : interface des backends, LRU mémoire."""
+
+import pytest
+
+from services.result_cache import CacheBackend, MemoryBackend
+
+
+def test_backend_must_implement_the_interface():
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_memory_backend_evicts_the_least_recently_used_entry():
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    backend.set("a", {"v": 1})
+    backend.set("b", {"v": 2})
+    assert backend.get("a") == {"v": 1}
+    backend.set("c", {"v": 3})
+    assert backend.get("b") is None
+    assert backend.size() == 2
+
+
+def test_memory_backend_returns_copies_and_expires_entries():
+    backend = MemoryBackend(max_entries=8, ttl=-1)
+    value = {"symptoms": ["toux"]}
+    backend.set("k", value)
+    assert backend.get("k") is None
+
+    backend.ttl = 60
+    backend.set("k", value)
+    backend.get("k")["symptoms"].append("fièvre")
+    assert backend.get("k") == {"symptoms": ["toux"]}
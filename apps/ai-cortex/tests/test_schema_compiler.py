@@ -0,0 +1,119 @@
+"""Compilation JSON Schema → modèle Pydantic : contraintes, cache et modèles relâchés."""
+
+from typing import List
+
+import pytest
+from pydantic import BaseModel, Field
+
+from services import schema_compiler
+from services.prompt_builder import LRUCache
+from services.schema_compiler import json_schema_to_pydantic_model, relaxed_model, schema_validator
+
+
+class Item(BaseModel):
+    code: str = Field(min_length=3)
+    confidence: float = Field(ge=0, le=1)
+
+
+class Consultation(BaseModel):
+    patientId: str
+    items: List[Item] = Field(min_length=1)
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "patientId": {"type": "string", "minLength": 3, "maxLength": 12, "pattern": "^pat-[0-9]+$"},
+        "age": {"type": "integer", "minimum": 0, "exclusiveMaximum": 130},
+        "temperature": {"type": "number", "minimum": 34, "maximum": 43, "multipleOf": 0.1},
+        "severity": {"enum": ["low", "high"]},
+        "kind": {"const": "consultation"},
+        "symptoms": {"type": "array", "items": {"type": "string", "minLength": 2}, "minItems": 1, "maxItems": 3},
+        "diagnosis": {"type": "array", "items": {"$ref": "#/$defs/Diagnosis"}},
+        "note": {"type": "string", "nullable": True},
+        "followUp": {"type": "boolean", "default": False},
+    },
+    "required": ["patientId", "symptoms"],
+    "$defs": {
+        "Diagnosis": {
+            "type": "object",
+            "properties": {
+                "code": {"type": "string"},
+                "confidence": {"anyOf": [{"type": "number", "minimum": 0, "maximum": 1}, {"type": "null"}]},
+            },
+            "required": ["code"],
+        },
+    },
+}
+VALID = {"patientId": "pat-001", "symptoms": ["toux"]}
+
+
+# -----------------------------------------------------------------------------
+# Contraintes JSON Schema
+# -----------------------------------------------------------------------------
+def test_valid_payload_passes_and_gets_defaults():
+    model = json_schema_to_pydantic_model(SCHEMA, "Constrained")
+    value = model.model_validate({
+        **VALID, "age": 45, "temperature": 37.2, "severity": "low", "kind": "consultation",
+        "diagnosis": [{"code": "J20", "confidence": None}],
+    })
+    assert value.followUp is False
+    assert value.note is None
+    assert value.diagnosis[0].code == "J20"
+
+
+@pytest.mark.parametrize("override", [
+    {"patientId": "pa"},  # minLength
+    {"patientId": "pat-0000000001"},  # maxLength
+    {"patientId": "abc-001"},  # pattern
+    {"age": -1},  # minimum
+    {"age": 130},  # exclusiveMaximum
+    {"temperature": 37.25},  # multipleOf
+    {"severity": "medium"},  # enum
+    {"kind": "visite"},  # const
+    {"symptoms": []},  # minItems
+    {"symptoms": ["a", "bb", "cc", "dd"]},  # maxItems et minLength des items
+    {"diagnosis": [{"code": "J20", "confidence": 1.5}]},  # $ref + anyOf
+])
+def test_constraints_are_enforced(override):
+    model = json_schema_to_pydantic_model(SCHEMA, "Constrained")
+    with pytest.raises(ValueError):
+        model.model_validate({**VALID, **override})
+
+
+def test_model_is_cached_by_schema_content():
+    reordered = dict(reversed(list(SCHEMA.items())))
+    assert json_schema_to_pydantic_model(reordered, "Constrained") is json_schema_to_pydantic_model(SCHEMA, "Constrained")
+
+
+def test_validator_accepts_any_root():
+    validator = schema_validator({"type": "array", "items": {"type": "integer", "maximum": 5}, "maxItems": 2})
+    assert validator.validate_python([1, 5]) == [1, 5]
+    with pytest.raises(ValueError):
+        validator.validate_python([1, 6])
+    with pytest.raises(ValueError):
+        validator.validate_python([1, 2, 3])
+
+
+# -----------------------------------------------------------------------------
+# Modèles relâchés (streaming partiel)
+# -----------------------------------------------------------------------------
+def test_relaxed_model_accepts_partial_objects():
+    relaxed = relaxed_model(Consultation)
+    partial = relaxed.model_validate({"items": [{"code": "J1"}]})
+    assert partial.patientId is None
+    assert partial.items[0].code == "J1"
+    with pytest.raises(ValueError):
+        Consultation.model_validate(partial.model_dump())
+
+
+def test_relaxed_model_is_cached():
+    assert relaxed_model(Consultation) is relaxed_model(Consultation)
+
+
+def test_relaxed_model_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(schema_compiler, "_relaxed_models", LRUCache(2))
+    models = [type(f"M{i}", (BaseModel,), {"__annotations__": {"x": int}}) for i in range(5)]
+    for model in models:
+        relaxed_model(model)
+    assert len(schema_compiler._relaxed_models) == 2
@@ -0,0 +1,41 @@
+"""Réponses en flux : admission avant les en-têtes, slot réservé seulement au démarrage du corps."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from services.admission import get_governor
+
+
+def _governor(call):
+    return get_governor(call.router().backends[0].base_url)
+
+
+def test_stream_reserves_no_slot_until_the_body_starts():
+    call = main._plan_structure("Toux sèche depuis 5 jours.")
+    governor = _governor(call)
+    before = governor.admitted
+
+    response = asyncio.run(main._streaming_response(call, "ndjson"))
+
+    # Client parti avant que Starlette n'itère le corps : aucun slot à rendre
+    assert governor.in_flight == 0
+    assert governor.admitted == before
+    asyncio.run(response.body_iterator.aclose())
+    assert governor.in_flight == 0
+
+
+def test_saturated_backend_is_rejected_before_the_stream_opens():
+    call = main._plan_structure("Toux sèche depuis 5 jours.")
+    governor = _governor(call)
+    saved = governor.in_flight
+    governor.in_flight = governor.max_concurrency + governor.max_queue
+    try:
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(main._streaming_response(call, "ndjson"))
+    finally:
+        governor.in_flight = saved
+    assert excinfo.value.status_code == 429
+    assert "Retry-After" in excinfo.value.headers
@@ -0,0 +1,97 @@
+"""Micro-batching Whisper : regroupement des clips et abandon quand les clients se déconnectent."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from services import transcription_pool, whisper_batcher
+from services.transcription_pool import TranscriptionCancelled, TranscriptionPool
+from services.whisper_batcher import WhisperBatcher
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """decode_batch factice : attend la fin du test ou l'annulation du job."""
+    monkeypatch.setattr(transcription_pool, "WHISPER_DISCONNECT_POLL", 0.01)
+    monkeypatch.setattr(whisper_batcher, "WHISPER_DISCONNECT_POLL", 0.01)
+    state = {"batches": [], "release": threading.Event(), "stopped": threading.Event()}
+
+    def decode_batch(model_name, clips, language, cancel):
+        state["batches"].append(len(clips))
+        while not state["release"].wait(0.005):
+            if cancel.is_set():
+                state["stopped"].set()
+                raise TranscriptionCancelled()
+        return [{"text": f"clip {i}", "segments": [], "language": language} for i in range(len(clips))]
+
+    monkeypatch.setattr(whisper_batcher, "decode_batch", decode_batch)
+    return state
+
+
+def _clip():
+    return np.zeros(16000, dtype=np.float32)
+
+
+def _client(disconnected):
+    async def is_disconnected():
+        return disconnected.is_set()
+
+    return is_disconnected
+
+
+def test_concurrent_clips_are_decoded_in_one_batch(decoded):
+    batcher = WhisperBatcher(TranscriptionPool(workers=1, max_queue=4), max_batch=8, window_ms=20)
+    decoded["release"].set()
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.transcribe("whisper:base", _clip(), "fr") for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert [r["text"] for r in results] == ["clip 0", "clip 1", "clip 2"]
+    assert decoded["batches"] == [3]
+
+
+def test_clip_abandoned_before_the_flush_is_not_decoded(decoded):
+    batcher = WhisperBatcher(TranscriptionPool(workers=1, max_queue=4), max_batch=8, window_ms=200)
+    gone = threading.Event()
+    gone.set()
+
+    async def scenario():
+        with pytest.raises(TranscriptionCancelled):
+            await batcher.transcribe("whisper:base", _clip(), "fr", is_disconnected=_client(gone))
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    assert decoded["batches"] == []
+    assert batcher.state()["cancelled"] == 1
+
+
+def test_batch_is_cancelled_once_every_client_is_gone(decoded):
+    pool = TranscriptionPool(workers=1, max_queue=4)
+    batcher = WhisperBatcher(pool, max_batch=2, window_ms=20)
+    first, second = threading.Event(), threading.Event()
+
+    async def scenario():
+        tasks = [
+            asyncio.create_task(batcher.transcribe("whisper:base", _clip(), "fr", is_disconnected=_client(gone)))
+            for gone in (first, second)
+        ]
+        while not decoded["batches"]:
+            await asyncio.sleep(0.01)
+        # Un seul client parti : le lot continue pour l'autre
+        first.set()
+        await asyncio.sleep(0.1)
+        assert not decoded["stopped"].is_set()
+        second.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, TranscriptionCancelled) for r in results)
+        # Le worker est rendu : job arrêté sans attendre la fin du décodage
+        assert await asyncio.to_thread(decoded["stopped"].wait, 2)
+        while pool.pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert pool.cancelled == 1
+    assert decoded["batches"] == [2]
@@ -1,32 +1,70 @@
 """
 Endpoint de transcription audio avec Whisper
 Pour BaseVitale AI Cortex
+
+Routes exposées via `router` (incluses par main.py) ; `app` reste utilisable seul
+(uvicorn transcribe:app). Modèles servis par services.whisper_registry.
 """
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import base64
-import io
-import whisper
-from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.datastructures import UploadFile
+from starlette.requests import ClientDisconnect
+import asyncio
+import binascii
+import json
+import logging
+import threading
+from collections import deque
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Deque, Literal, Tuple
+
+from services.audio_input import UploadTooLarge, discard, spool_base64, spool_file, spool_stream
+from services.audio_decode import get_decode_cache, iter_audio
+from services.audio_stream import WHISPER_STREAM_PARALLEL, AudioDecodeError, AudioWindow, shift_segments, vad_windows
+from services.asr_engines import ASRModel
+from services.live_dictation import WHISPER_LIVE_DEBOUNCE_S, Debouncer, Encoding, LiveAudioBuffer, to_float32
+from services.streaming import STREAM_HEADERS, STREAM_MEDIA_TYPES, event_message, stream_event
+
+from services.transcription_pool import (
+    TranscriptionCancelled,
+    TranscriptionQueueFull,
+    get_transcription_pool,
+)
+
+from services.whisper_batcher import batchable, get_whisper_batcher
+
+from services.whisper_registry import (
+    WHISPER_DEFAULT_MODEL,
+    WHISPER_PRELOAD,
+    UnknownWhisperModel,
+    WhisperUnavailable,
+    get_whisper_registry,
+)
+
+logger = logging.getLogger("ai-cortex.transcribe")
+
+router = APIRouter()
+
 
-app = FastAPI()
+def load_whisper_model(model_name: Optional[str] = None) -> ASRModel:
+    """Modèle ASR `model_name` ("moteur:nom" ou nom seul ; registre : chargé une fois par clé)"""
+    return get_whisper_registry().get(model_name or WHISPER_DEFAULT_MODEL)
 
-# Modèle Whisper (chargé au démarrage)
-whisper_model = None
 
-def load_whisper_model(model_name: str = "base"):
-    """Charger le modèle Whisper"""
-    global whisper_model
-    if whisper_model is None:
-        whisper_model = whisper.load_model(model_name)
-    return whisper_model
+async def preload_whisper_models() -> None:
+    """Préchargement des modèles WHISPER_PRELOAD hors boucle (lifespan)"""
+    await asyncio.to_thread(get_whisper_registry().preload, WHISPER_PRELOAD)
+
 
 class TranscribeRequest(BaseModel):
     """Requête de transcription"""
     audio: str  # Base64 encoded audio
     filename: str
     language: Optional[str] = "fr"
-    model: Optional[str] = "base"
+    model: Optional[str] = None  # défaut : WHISPER_MODEL ; moteur en préfixe : "faster-whisper:small"
 
 class TranscribeResponse(BaseModel):
     """Réponse de transcription"""
@@ -34,32 +72,141 @@ class TranscribeResponse(BaseModel):
     segments: Optional[List[Dict[str, Any]]] = None
     language: Optional[str] = None
     duration: Optional[float] = None
+    model: Optional[str] = None
+
+def _transcribe_sync(model_name: str, audio: Any, language: Optional[str], cancel: threading.Event) -> Dict[str, Any]:
+    """
+    Chargement éventuel du modèle + transcription (bloquant : exécuté sur un worker du pool).
+
+    `cancel` est consulté après le chargement, puis entre deux segments avec faster-whisper ;
+    un appel openai-whisper commencé va jusqu'au bout.
+    """
+    # Modèle demandé (préchargé au démarrage ou chargé une fois puis conservé)
+    model = load_whisper_model(model_name)
+    if cancel.is_set():
+        raise TranscriptionCancelled()
+    return model.transcribe(audio, language=language, cancel=cancel)
+
+
+def _upload_bodies() -> Dict[str, Any]:
+    """Corps acceptés par /transcribe (documentation OpenAPI : le corps est lu selon le Content-Type)"""
+    fields = {
+        "language": {"type": "string", "default": "fr"},
+        "model": {"type": "string"},
+    }
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": TranscribeRequest.model_json_schema()},
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}, **fields},
+                        "required": ["file"],
+                    }
+                },
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
+
 
-@app.post("/transcribe", response_model=TranscribeResponse)
-async def transcribe_audio(request: TranscribeRequest) -> TranscribeResponse:
+async def _receive_audio(
+    http_request: Request, filename: Optional[str], language: Optional[str], model: Optional[str],
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Audio de la requête écrit dans un fichier temporaire, selon le Content-Type :
+    JSON base64 (historique), multipart (champ `file`), sinon corps binaire brut.
+
+    Retourne (chemin, langue, modèle) ; paramètres de requête utilisés par défaut,
+    langue vide = détection automatique.
+    """
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "application/json":
+        try:
+            request = TranscribeRequest.model_validate_json(await http_request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors()) from e
+        path = await spool_base64(request.audio, request.filename)
+        return path, request.language or None, request.model or model
+    if content_type == "multipart/form-data":
+        form = await http_request.form(max_files=1)
+        try:
+            upload = form.get("file")
+            if not isinstance(upload, UploadFile):
+                raise HTTPException(status_code=422, detail="Champ multipart 'file' manquant")
+            path = await spool_file(upload.file, upload.filename or filename)
+            return path, form.get("language") or language or None, form.get("model") or model
+        finally:
+            await form.close()
+    # application/octet-stream, audio/* : corps écrit au fil de la réception
+    return await spool_stream(http_request.stream(), filename), language or None, model
+
+
+def _http_error(e: Exception) -> HTTPException:
+    """Erreur de réception / transcription → HTTPException"""
+    if isinstance(e, UploadTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, binascii.Error):
+        return HTTPException(status_code=422, detail=f"Audio base64 invalide: {e}")
+    if isinstance(e, AudioDecodeError):
+        return HTTPException(status_code=422, detail=str(e))
+    if isinstance(e, TranscriptionQueueFull):
+        return HTTPException(
+            status_code=e.status_code,
+            detail=f"Transcription saturée. Réessayez dans {e.retry_after}s.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if isinstance(e, (TranscriptionCancelled, ClientDisconnect)):
+        # Client parti : la réponse ne sera pas lue
+        return HTTPException(status_code=499, detail="Transcription annulée")
+    if isinstance(e, UnknownWhisperModel):
+        return HTTPException(status_code=400, detail=str(e))
+    if isinstance(e, WhisperUnavailable):
+        return HTTPException(status_code=503, detail=str(e))
+    return HTTPException(status_code=500, detail=f"Erreur lors de la transcription: {str(e)}")
+
+
+@router.post("/transcribe", response_model=TranscribeResponse, openapi_extra=_upload_bodies())
+async def transcribe_audio(
+    http_request: Request,
+    filename: Optional[str] = Query(None, description="Nom du fichier (corps binaire : extension utile au décodage ; .pcm : PCM s16le mono 16 kHz)"),
+    language: Optional[str] = Query("fr", description="Langue (corps binaire ou multipart)"),
+    model: Optional[str] = Query(None, description="Modèle (défaut : WHISPER_MODEL) ; moteur en préfixe : faster-whisper:small"),
+) -> TranscribeResponse:
     """
     Transcrire un fichier audio avec Whisper
     
-    Args:
-        request: Requête avec audio en base64
+    Corps accepté :
+    - application/json : TranscribeRequest (audio en base64, historique),
+    - multipart/form-data : champ `file` (+ `language`, `model`),
+    - application/octet-stream / audio/* : audio brut (paramètres en query).
         
     Returns:
         Transcription avec segments et métadonnées
     """
+    path: Optional[str] = None
     try:
-        # Décoder l'audio base64
-        audio_data = base64.b64decode(request.audio)
-        audio_file = io.BytesIO(audio_data)
+        path, language, model = await _receive_audio(http_request, filename, language, model)
         
-        # Charger le modèle Whisper
-        model = load_whisper_model(request.model)
-        
-        # Transcrire
-        result = model.transcribe(
-            audio_file,
-            language=request.language,
-            task="transcribe",
-        )
+        model_name = get_whisper_registry().validate(model or WHISPER_DEFAULT_MODEL)
+        # Décodage en processus ; audio déjà reçu (nouvel essai, autre modèle) : cache par contenu
+        samples = await asyncio.to_thread(get_decode_cache().load, path)
+        if batchable(samples, model_name):
+            # Clip court : décodé avec les clips concurrents (micro-batching ; retiré du lot si le client part)
+            result = await get_whisper_batcher().transcribe(
+                model_name, samples, language, is_disconnected=http_request.is_disconnected,
+            )
+        else:
+            # Transcrire hors boucle, sur le pool Whisper (abandon si le client se déconnecte)
+            result = await get_transcription_pool().run(
+                _transcribe_sync,
+                model_name,
+                samples,
+                language,
+                is_disconnected=http_request.is_disconnected,
+            )
         
         # Formater les segments
         segments = [
@@ -76,10 +223,318 @@ async def transcribe_audio(request: TranscribeRequest) -> TranscribeResponse:
             segments=segments,
             language=result.get("language"),
             duration=sum(seg["end"] - seg["start"] for seg in result.get("segments", [])),
+            model=model_name,
         )
         
+    except (HTTPException, RequestValidationError):
+        raise
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la transcription: {str(e)}"
-        )
+        raise _http_error(e) from e
+    finally:
+        discard(path)
+
+
+# -----------------------------------------------------------------------------
+# Streaming – POST /transcribe/stream
+# Fenêtres coupées aux pauses (services.audio_stream), transcrites au fil du décodage
+# (en parallèle sur le pool si WHISPER_STREAM_PARALLEL ≠ 1) et renvoyées dans l'ordre.
+# Événements : segment (horodatage depuis le début de l'enregistrement), done, error.
+# -----------------------------------------------------------------------------
+def _transcribe_window(
+    model_name: str, samples: Any, language: Optional[str], prompt: Optional[str], cancel: threading.Event,
+) -> Dict[str, Any]:
+    """Transcription d'une fenêtre (bloquant : exécuté sur un worker du pool ; `cancel` comme _transcribe_sync)"""
+    model = load_whisper_model(model_name)
+    if cancel.is_set():
+        raise TranscriptionCancelled()
+    return model.transcribe(samples, language=language, initial_prompt=prompt, cancel=cancel)
+
+
+async def _stream_transcription(path: str, model_name: str, language: Optional[str], fmt: str) -> AsyncIterator[str]:
+    """
+    Génère les événements de transcription d'un fichier audio, fenêtre par fenêtre.
+
+    Jusqu'à `parallel` fenêtres en cours sur le pool ; sans langue imposée, la première
+    fenêtre est transcrite seule et sa langue détectée vaut pour les suivantes.
+    Le fichier temporaire est supprimé à la fin du flux (ou à la déconnexion).
+    """
+    pool = get_transcription_pool()
+    parallel = WHISPER_STREAM_PARALLEL or pool.workers
+    windows = vad_windows(iter_audio(path))
+    pending: Deque[Tuple[AudioWindow, Optional[asyncio.Task]]] = deque()
+    texts: List[str] = []
+    prompt: Optional[str] = None
+    duration = 0.0
+    count = 0
+    exhausted = False
+    try:
+        while True:
+            limit = parallel if language else 1
+            while not exhausted and sum(task is not None for _, task in pending) < limit:
+                window = await asyncio.to_thread(next, windows, None)
+                if window is None:
+                    exhausted = True
+                    break
+                duration = window.start + window.duration
+                count += 1
+                task = None if window.silent else asyncio.create_task(pool.run(
+                    _transcribe_window,
+                    model_name,
+                    window.samples,
+                    language,
+                    # Séquentiel : le texte précédent sert d'amorce (continuité des phrases)
+                    prompt if parallel == 1 else None,
+                ))
+                pending.append((window, task))
+            if not pending:
+                break
+            # Retiré de la file une fois terminé : annulé dans le finally en cas de déconnexion
+            window, task = pending[0]
+            result = await task if task is not None else None
+            pending.popleft()
+            if result is None:
+                continue
+            language = language or result.get("language")
+            segments = shift_segments(result, window)
+            for segment in segments:
+                yield stream_event(fmt, "segment", {"data": segment, "window": window.index})
+            if segments:
+                prompt = result.get("text", "").strip()
+                texts.append(prompt)
+    except Exception as e:  # noqa: BLE001
+        error = _http_error(e)
+        yield stream_event(fmt, "error", {"status_code": error.status_code, "detail": str(error.detail)})
+        return
+    finally:
+        for _, task in pending:
+            if task is not None:
+                task.cancel()
+        try:
+            windows.close()
+        except ValueError:
+            # Lecture en cours dans un thread (déconnexion) : décodeur fermé à la collecte du générateur
+            pass
+        discard(path)
+
+    yield stream_event(fmt, "done", {"data": {
+        "text": " ".join(texts),
+        "language": language,
+        "duration": round(duration, 2),
+        "model": model_name,
+        "windows": count,
+    }})
+
+
+@router.post("/transcribe/stream", openapi_extra=_upload_bodies())
+async def transcribe_stream(
+    http_request: Request,
+    filename: Optional[str] = Query(None, description="Nom du fichier (corps binaire : extension utile au décodage ; .pcm : PCM s16le mono 16 kHz)"),
+    language: Optional[str] = Query("fr", description="Langue (corps binaire ou multipart)"),
+    model: Optional[str] = Query(None, description="Modèle (défaut : WHISPER_MODEL) ; moteur en préfixe : faster-whisper:small"),
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+) -> StreamingResponse:
+    """
+    /transcribe en streaming : segments émis fenêtre par fenêtre, premiers mots en quelques secondes.
+
+    Mêmes corps que /transcribe ; ?format=ndjson|sse.
+    Modèle inconnu, file pleine ou audio trop volumineux : erreur HTTP avant l'ouverture du flux.
+    """
+    path: Optional[str] = None
+    try:
+        path, language, model = await _receive_audio(http_request, filename, language, model)
+        model_name = get_whisper_registry().validate(model or WHISPER_DEFAULT_MODEL)
+        get_transcription_pool().check_admission()
+    except (HTTPException, RequestValidationError):
+        discard(path)
+        raise
+    except Exception as e:
+        discard(path)
+        raise _http_error(e) from e
+    return StreamingResponse(
+        _stream_transcription(path, model_name, language, stream_format),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers=dict(STREAM_HEADERS),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Dictée en direct – WS /transcribe/live (route déclarée dans main.py : structuration)
+# Trames PCM → fenêtres validées aux pauses (services.live_dictation), transcrites dans
+# l'ordre ; reliquat retranscrit à titre provisoire ; structuration différée (debounce)
+# de la transcription validée.
+# Messages : partial, segment, structure, done, error (mêmes objets que les flux NDJSON).
+# -----------------------------------------------------------------------------
+async def live_dictation(
+    websocket: WebSocket,
+    structure: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+    model: Optional[str] = None,
+    language: Optional[str] = "fr",
+    sample_rate: int = 16000,
+    encoding: Encoding = "pcm_s16le",
+) -> None:
+    """
+    Session de dictée sur une WebSocket.
+
+    Client → serveur : trames binaires PCM mono (`encoding`, `sample_rate`), puis le message
+    texte {"type": "stop"} pour terminer (le reliquat est transcrit et la structuration finale
+    attendue avant l'événement done).
+    Serveur → client :
+    - partial : transcription provisoire du reliquat non validé (remplacée par la suivante),
+    - segment : segment validé, horodaté depuis le début de la dictée,
+    - structure : ConsultationStructure de la transcription validée jusque-là (si `structure`),
+    - done : transcription complète (+ dernière structure), puis fermeture,
+    - error : erreur de transcription ou de structuration.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(event: str, payload: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_text(event_message(event, payload))
+
+    async def send_error(e: Exception, source: str) -> None:
+        error = e if isinstance(e, HTTPException) else _http_error(e)
+        await send("error", {"source": source, "status_code": error.status_code, "detail": str(error.detail)})
+
+    pool = get_transcription_pool()
+    language = language or None
+    try:
+        model_name = get_whisper_registry().validate(model or WHISPER_DEFAULT_MODEL)
+        pool.check_admission()
+    except Exception as e:  # noqa: BLE001
+        await send_error(e, "transcription")
+        # 1013 : réessayer plus tard ; 1008 : requête refusée
+        await websocket.close(code=1013 if isinstance(e, (TranscriptionQueueFull, WhisperUnavailable)) else 1008)
+        return
+
+    audio = LiveAudioBuffer()
+    commits: "asyncio.Queue[Optional[AudioWindow]]" = asyncio.Queue()
+    texts: List[str] = []
+    structured: Dict[str, Any] = {}
+
+    async def transcribe(window: AudioWindow) -> Dict[str, Any]:
+        prompt = texts[-1] if texts else None
+        return await pool.run(_transcribe_window, model_name, window.samples, language, prompt)
+
+    async def commit_windows() -> None:
+        """Fenêtres validées, transcrites une à une dans l'ordre (texte précédent en amorce)."""
+        nonlocal language
+        while True:
+            window = await commits.get()
+            if window is None:
+                return
+            if window.silent:
+                continue
+            while True:
+                try:
+                    result = await transcribe(window)
+                    break
+                except TranscriptionQueueFull as e:
+                    # Une fenêtre validée n'est jamais abandonnée : attente d'un worker
+                    await asyncio.sleep(min(e.retry_after, 5))
+            language = language or result.get("language")
+            segments = shift_segments(result, window)
+            for segment in segments:
+                await send("segment", {"data": segment, "window": window.index})
+            if segments:
+                texts.append(result.get("text", "").strip())
+                if debouncer is not None:
+                    debouncer.touch()
+
+    async def transcribe_partial(window: AudioWindow) -> None:
+        try:
+            result = await transcribe(window)
+        except TranscriptionQueueFull:
+            return
+        text = result.get("text", "").strip()
+        if text:
+            await send("partial", {"data": {"start": round(window.start, 2), "text": text}})
+
+    async def structure_transcript() -> None:
+        text = " ".join(texts)
+        if not text or text == structured.get("transcript_source"):
+            return
+        try:
+            data = await structure(text)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("[/transcribe/live] Structuring failed: %s", e)
+            await send_error(e, "structure")
+            return
+        structured.update(data=data, transcript_source=text)
+        await send("structure", {"data": data, "segments": len(texts)})
+
+    debouncer = Debouncer(WHISPER_LIVE_DEBOUNCE_S, structure_transcript) if structure is not None else None
+    committer = asyncio.create_task(commit_windows())
+    partial_task: Optional[asyncio.Task] = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if committer.done():
+                committer.result()  # erreur de transcription : remontée ici
+            if message.get("bytes"):
+                for window in audio.feed(to_float32(message["bytes"], encoding, sample_rate)):
+                    commits.put_nowait(window)
+                # Provisoire : seulement si rien n'attend d'être validé et qu'un worker est libre
+                if (
+                    audio.partial_due()
+                    and (partial_task is None or partial_task.done())
+                    and commits.empty()
+                    and pool.has_idle_worker()
+                ):
+                    window = audio.partial()
+                    if window is not None:
+                        partial_task = asyncio.create_task(transcribe_partial(window))
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if isinstance(control, dict) and control.get("type") == "stop":
+                    break
+
+        window = audio.flush()
+        if window is not None:
+            commits.put_nowait(window)
+        commits.put_nowait(None)
+        await committer
+        if partial_task is not None:
+            partial_task.cancel()
+        if debouncer is not None:
+            await debouncer.flush()
+        await send("done", {"data": {
+            "text": " ".join(texts),
+            "language": language,
+            "duration": round(audio.duration, 2),
+            "model": model_name,
+            "structure": structured.get("data"),
+        }})
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("[/transcribe/live] Client disconnected after %.1fs of audio", audio.duration)
+    except Exception as e:  # noqa: BLE001
+        logger.warning("[/transcribe/live] Session failed: %s", e)
+        try:
+            await send_error(e, "transcription")
+            await websocket.close(code=1011)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+    finally:
+        committer.cancel()
+        if partial_task is not None:
+            partial_task.cancel()
+        if debouncer is not None:
+            await debouncer.close()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Application autonome : démarre une fois les modèles Whisper préchargés"""
+    await preload_whisper_models()
+    yield
+    get_transcription_pool().shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(router)